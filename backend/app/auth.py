@@ -1,22 +1,107 @@
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import models, schemas
-from .database import get_db
+from . import cache, config, hashing, models, schemas
+from .database import AsyncSessionLocal, get_async_db
 
 SECRET_KEY = "CHANGE_ME_TO_SOMETHING_SECURE"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+# "purpose" claim of tickets that only open a leaderboard stream
+STREAM_TICKET_PURPOSE = "leaderboard-stream"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+pwd_context = hashing.pwd_context
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, for handlers that do not need the ORM User."""
+
+    id: int
+    username: str
+    is_active: bool
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            is_active=user.is_active,
+            token_version=user.token_version or 0,
+        )
+
+
+class RevocationCache:
+    """In-memory view of users whose tokens may be revoked.
+
+    Only users with a bumped token_version or is_active=False are kept, so the
+    map stays small. It is reloaded from the DB at most every
+    ``refresh_seconds``; tokens are trusted in between. One request runs
+    each reload while concurrent ones keep reading the current snapshot.
+    """
+
+    def __init__(self, refresh_seconds: float) -> None:
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[int, bool]] = {}
+        self._loaded_at: Optional[float] = None
+        self._flights = cache.SingleFlight()
+
+    def is_stale(self) -> bool:
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at >= self.refresh_seconds
+        )
+
+    async def ensure_fresh(self) -> None:
+        if not self.is_stale():
+            return
+        # Only the very first load makes concurrent callers wait for it
+        if self._loaded_at is not None and len(self._flights):
+            return
+        await self._flights.run("revocations", self.refresh)
+
+    async def refresh(self) -> None:
+        # Always read the primary: a lagging replica would bring back
+        # versions that a logout-all has already bumped.
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.User.id, models.User.token_version, models.User.is_active).where(
+                    or_(models.User.token_version > 0, models.User.is_active.is_(False))
+                )
+            )
+            rows = result.all()
+        entries = {row.id: (row.token_version, row.is_active) for row in rows}
+        with self._lock:
+            # A revocation made through this process while the query ran is
+            # newer than the rows; versions only go up, so keep the higher.
+            for user_id, entry in self._entries.items():
+                if entry[0] > entries.get(user_id, (0, True))[0]:
+                    entries[user_id] = entry
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+
+    def update(self, user_id: int, token_version: int, is_active: bool) -> None:
+        with self._lock:
+            self._entries[user_id] = (token_version, is_active)
+
+    def lookup(self, user_id: int) -> Tuple[int, bool]:
+        return self._entries.get(user_id, (0, True))
+
+
+revocation_cache = RevocationCache(config.AUTH_REVOCATION_REFRESH_SECONDS)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -27,6 +112,34 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def hash_password_pooled(password: str) -> str:
+    try:
+        return await hashing.pool.run(hashing.hash_password, password)
+    except hashing.HashPoolSaturated:
+        raise _hashing_busy()
+
+
+async def verify_password_pooled(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    # Returns (valid, new_hash); new_hash is set when the stored hash uses
+    # outdated parameters and should be replaced.
+    try:
+        return await hashing.pool.run(
+            hashing.verify_and_update, plain_password, hashed_password
+        )
+    except hashing.HashPoolSaturated:
+        raise _hashing_busy()
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -35,27 +148,116 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> models.User:
-    credentials_exception = HTTPException(
+def token_claims(user: models.User) -> dict:
+    return {
+        "sub": str(user.id),
+        "username": user.username,
+        "active": user.is_active,
+        "ver": user.token_version or 0,
+    }
+
+
+def create_stream_ticket(principal: Principal) -> str:
+    claims = {
+        "sub": str(principal.id),
+        "username": principal.username,
+        "active": principal.is_active,
+        "ver": principal.token_version,
+        "purpose": STREAM_TICKET_PURPOSE,
+    }
+    return create_access_token(
+        claims, timedelta(seconds=config.LEADERBOARD_STREAM_TICKET_SECONDS)
+    )
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _decode_token(
+    token: str, purpose: Optional[str] = None
+) -> Tuple[schemas.TokenData, dict]:
+    # Access tokens carry no purpose; a ticket is only good for its own
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         sub = payload.get("sub")
-        if sub is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(user_id=int(sub))
+        if sub is None or payload.get("purpose") != purpose:
+            raise _credentials_exception()
+        return schemas.TokenData(user_id=int(sub)), payload
     except (JWTError, ValueError):
-        raise credentials_exception
+        raise _credentials_exception()
 
-    user = db.query(models.User).filter(models.User.id == token_data.user_id).first()
+
+async def _load_user(
+    db: AsyncSession, token_data: schemas.TokenData, payload: dict
+) -> models.User:
+    user = await db.get(models.User, token_data.user_id)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    # Tokens minted before the "ver" claim existed are treated as version 0
+    if payload.get("ver", 0) < (user.token_version or 0):
+        raise _credentials_exception()
     return user
 
+
+def token_user_id(token: str) -> int:
+    """The user a validly signed, unexpired token names; revocation is not
+    checked, so callers still resolve the principal."""
+    token_data, _ = _decode_token(token)
+    return token_data.user_id
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> models.User:
+    token_data, payload = _decode_token(token)
+    return await _load_user(db, token_data, payload)
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    return await principal_from_token(token, db)
+
+
+async def get_current_admin(
+    current_user: Principal = Depends(get_current_principal),
+) -> Principal:
+    if current_user.username not in config.ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not an admin")
+    return current_user
+
+
+async def principal_from_token(
+    token: str, db: AsyncSession, purpose: Optional[str] = None
+) -> Principal:
+    token_data, payload = _decode_token(token, purpose)
+
+    stateless = config.AUTH_STATELESS and "ver" in payload and "username" in payload
+    if not stateless:
+        return Principal.from_user(await _load_user(db, token_data, payload))
+
+    await revocation_cache.ensure_fresh()
+    current_version, is_active = revocation_cache.lookup(token_data.user_id)
+    if not is_active or not payload.get("active", True):
+        raise HTTPException(status_code=400, detail="Inactive user")
+    if payload["ver"] < current_version:
+        raise _credentials_exception()
+    return Principal(
+        id=token_data.user_id,
+        username=payload["username"],
+        is_active=True,
+        token_version=payload["ver"],
+    )
+
+
+async def revoke_tokens(db: AsyncSession, user: models.User) -> None:
+    user.token_version = (user.token_version or 0) + 1
+    await db.commit()
+    revocation_cache.update(user.id, user.token_version, user.is_active)
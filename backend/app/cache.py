@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from . import config
+
+_MISSING = object()
+
+
+class TaggedLRUCache:
+    """Bounded LRU cache with a TTL and tag-based invalidation.
+
+    Every entry carries a set of tags; ``invalidate_tag`` drops only the
+    entries carrying that tag, so writes can evict precisely what they touched.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, frozenset]]" = OrderedDict()
+        self._keys_by_tag: Dict[Hashable, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value, _ = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        tags: Iterable[Hashable] = (),
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            tag_set = frozenset(tags)
+            self._entries[key] = (self._clock() + ttl, value, tag_set)
+            for tag in tag_set:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_tag(self, tag: Hashable) -> int:
+        with self._lock:
+            keys = self._keys_by_tag.get(tag)
+            if not keys:
+                return 0
+            keys = list(keys)
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+class SingleFlight:
+    """Collapses concurrent computations of the same key into one.
+
+    The first caller for a key runs ``compute``; callers arriving while it
+    runs wait for its result instead of repeating the work. If the first
+    caller fails or is cancelled, a waiting caller takes over.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.shared = 0
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                continue
+            self.shared += 1
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+        except BaseException:
+            # Waiters retry rather than all inheriting one caller's error
+            future.cancel()
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(result)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+leaderboard_cache = TaggedLRUCache(
+    maxsize=config.LEADERBOARD_CACHE_SIZE,
+    ttl_seconds=config.LEADERBOARD_CACHE_TTL_SECONDS,
+)
+leaderboard_flights = SingleFlight()
+
+stats_cache = TaggedLRUCache(
+    maxsize=config.STATS_CACHE_SIZE,
+    ttl_seconds=config.STATS_CACHE_TTL_SECONDS,
+)
+stats_flights = SingleFlight()
+
+
+def points_tag(user_id: int) -> Tuple[str, int]:
+    return ("points", user_id)
+
+
+def friends_tag(user_id: int) -> Tuple[str, int]:
+    return ("friends", user_id)
@@ -0,0 +1,127 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import config, models
+
+COUNTER_NAME = "task_catalog"
+
+
+@dataclass(frozen=True)
+class TaskInfo:
+    id: int
+    name: str
+    code: str
+    description: Optional[str]
+    points: int
+    is_active: bool
+
+
+@dataclass(frozen=True)
+class TaskCatalog:
+    version: int
+    tasks: Tuple[TaskInfo, ...]
+    by_id: Mapping[int, TaskInfo] = field(repr=False)
+    by_code: Mapping[str, TaskInfo] = field(repr=False)
+    active: Tuple[TaskInfo, ...] = field(repr=False)
+
+    @classmethod
+    def build(cls, version: int, tasks: Tuple[TaskInfo, ...]) -> "TaskCatalog":
+        return cls(
+            version=version,
+            tasks=tasks,
+            by_id=MappingProxyType({t.id: t for t in tasks}),
+            by_code=MappingProxyType({t.code: t for t in tasks}),
+            active=tuple(t for t in tasks if t.is_active),
+        )
+
+    def get_active(self, task_id: int) -> Optional[TaskInfo]:
+        task = self.by_id.get(task_id)
+        return task if task is not None and task.is_active else None
+
+
+_EMPTY = TaskCatalog.build(-1, ())
+
+_lock = threading.Lock()
+_current: TaskCatalog = _EMPTY
+_checked_at: Optional[float] = None
+
+
+def _version_select():
+    return select(models.VersionCounter.value).where(
+        models.VersionCounter.name == COUNTER_NAME
+    )
+
+
+def load(db: Session) -> TaskCatalog:
+    """Read the tasks table into a fresh snapshot and install it."""
+    global _current, _checked_at
+    version = db.execute(_version_select()).scalar() or 0
+    rows = db.execute(select(models.Task).order_by(models.Task.id)).scalars()
+    snapshot = TaskCatalog.build(
+        version,
+        tuple(
+            TaskInfo(
+                id=t.id,
+                name=t.name,
+                code=t.code,
+                description=t.description,
+                points=t.points,
+                is_active=t.is_active,
+            )
+            for t in rows
+        ),
+    )
+    with _lock:
+        _current = snapshot
+        _checked_at = time.monotonic()
+    return snapshot
+
+
+def current() -> TaskCatalog:
+    return _current
+
+
+async def get(db: AsyncSession) -> TaskCatalog:
+    # Between checks the snapshot is served without touching the DB; after
+    # that a single-row version read decides whether to reload.
+    global _checked_at
+    snapshot = _current
+    if (
+        _checked_at is not None
+        and time.monotonic() - _checked_at < config.TASK_CATALOG_CHECK_SECONDS
+    ):
+        return snapshot
+    version = (await db.execute(_version_select())).scalar() or 0
+    # The counter only goes up; a lagging read replica may report an older
+    # version, which must not roll the snapshot back.
+    if version > snapshot.version:
+        return await db.run_sync(load)
+    _checked_at = time.monotonic()
+    return snapshot
+
+
+def invalidate() -> None:
+    """Force the next get() to re-check the version counter."""
+    global _checked_at
+    _checked_at = None
+
+
+def bump_version(db: Session) -> None:
+    """Record a change to the tasks table; call in the same transaction.
+
+    Other processes pick the change up on their next version check; in this
+    process call invalidate() once the transaction has committed.
+    """
+    counter = db.get(models.VersionCounter, COUNTER_NAME)
+    if counter is None:
+        db.add(models.VersionCounter(name=COUNTER_NAME, value=1))
+    else:
+        counter.value = models.VersionCounter.value + 1
+    db.flush()
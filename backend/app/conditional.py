@@ -0,0 +1,76 @@
+import hashlib
+from typing import Iterable
+
+from fastapi import Request, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+
+def make_etag(*parts: object) -> str:
+    digest = hashlib.blake2b(
+        "|".join(str(p) for p in parts).encode(), digest_size=12
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates: Iterable[str] = header.split(",")
+    return _opaque(etag) in {_opaque(c) for c in candidates}
+
+
+def cache_headers(etag: str) -> dict:
+    # Clients may keep the body but must revalidate before reusing it
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag))
+
+
+def user_log_version_query(user_id: int):
+    return select(models.User.log_version).where(models.User.id == user_id)
+
+
+async def user_log_version(db: AsyncSession, user_id: int) -> int:
+    return (await db.execute(user_log_version_query(user_id))).scalar() or 0
+
+
+async def circle_signature(db: AsyncSession, user_id: int) -> tuple:
+    """Validator inputs for a leaderboard: the friend set and members' writes.
+
+    Log versions only grow and friendships are never removed, so the sum of
+    versions plus the friendship count and newest id change on every
+    relevant write. The cost is O(friends) index lookups, not a log scan.
+    """
+    row = (await db.execute(circle_signature_query(user_id))).one()
+    return tuple(row)
+
+
+def circle_signature_query(user_id: int):
+    friendship = models.Friendship
+    friends = select(friendship.friend_id).where(friendship.user_id == user_id)
+    in_circle = (models.User.id == user_id) | models.User.id.in_(friends)
+    return select(
+        select(func.count(friendship.id))
+        .where(friendship.user_id == user_id)
+        .scalar_subquery(),
+        select(func.coalesce(func.max(friendship.id), 0))
+        .where(friendship.user_id == user_id)
+        .scalar_subquery(),
+        select(func.coalesce(func.sum(models.User.log_version), 0))
+        .where(in_circle)
+        .scalar_subquery(),
+    )
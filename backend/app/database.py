@@ -1,13 +1,116 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
+from . import config, metrics
+
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+
+
+def _normalize_url(url: str) -> str:
+    # Hosting providers commonly hand out the legacy "postgres://" scheme
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={int(config.SQLITE_MMAP_SIZE)}")
+        # Negative cache_size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{int(config.SQLITE_CACHE_SIZE_KIB)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+    finally:
+        cursor.close()
+
+
+def dialect_insert(dialect_name: str):
+    """Return the INSERT construct supporting ON CONFLICT for this dialect, if any."""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
+
+
+def _async_url(url: str) -> str:
+    # Same database, async driver: aiosqlite locally, asyncpg in production
+    url_obj = make_url(_normalize_url(url))
+    backend = url_obj.get_backend_name()
+    if backend == "sqlite":
+        return url_obj.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend == "postgresql":
+        return url_obj.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    return url_obj.render_as_string(hide_password=False)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def _engine_options(url: str) -> dict:
+    backend = make_url(url).get_backend_name()
+    options: dict = {
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+        "pool_recycle": config.DB_POOL_RECYCLE_SECONDS,
+    }
+
+    if backend == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        database = make_url(url).database
+        if not database or database == ":memory:":
+            # Every pooled connection would otherwise get its own empty DB
+            options["poolclass"] = StaticPool
+        else:
+            options.update(
+                pool_size=config.DB_POOL_SIZE,
+                max_overflow=config.DB_MAX_OVERFLOW,
+                pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+            )
+    else:
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+        )
+    return options
+
+
+def create_db_engine(url: str) -> Engine:
+    url = _normalize_url(url)
+    db_engine = create_engine(url, **_engine_options(url))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    if config.METRICS_ENABLED:
+        metrics.instrument_engine(db_engine)
+    return db_engine
+
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    url = _async_url(url)
+    options = _engine_options(url)
+    # aiosqlite runs every connection on its own thread already
+    options.pop("connect_args", None)
+    db_engine = create_async_engine(url, **options)
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    if config.METRICS_ENABLED:
+        metrics.instrument_engine(db_engine.sync_engine)
+    return db_engine
+
+
+# The sync engine serves startup, CLIs and maintenance jobs; request
+# handlers go through the async engine below.
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_db_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
@@ -19,3 +122,7 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,251 @@
+import asyncio
+import heapq
+import random
+import time
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+
+from . import config, models
+from .database import AsyncSessionLocal
+
+
+def edges_query():
+    # In (user_id, friend_id) unique-index order, so the full load arrives
+    # grouped and sorted without a sort step
+    friendship = models.Friendship
+    return select(friendship.id, friendship.user_id, friendship.friend_id).order_by(
+        friendship.user_id, friendship.friend_id
+    )
+
+
+def new_edges_query(after_id: int):
+    friendship = models.Friendship
+    return select(friendship.id, friendship.user_id, friendship.friend_id).where(
+        friendship.id > after_id
+    )
+
+
+def _csr(edges: Iterable[Tuple[int, int]]) -> Tuple[array, array]:
+    """offsets/targets arrays from (user_id, friend_id) pairs sorted by both."""
+    offsets = array("l", [0])
+    targets = array("i")
+    current = 0
+    for user_id, friend_id in edges:
+        while current < user_id:
+            offsets.append(len(targets))
+            current += 1
+        targets.append(friend_id)
+    offsets.append(len(targets))
+    return offsets, targets
+
+
+class FriendGraph:
+    """The friendship graph in compressed sparse row form.
+
+    ``targets[offsets[u]:offsets[u + 1]]`` are u's friend ids, sorted; user
+    ids index ``offsets`` directly, as they are dense. That is 4 bytes per
+    edge and 8 per user instead of a Python set per user. Edges added since
+    the arrays were built sit in a small per-user overlay and are merged in
+    by compact(). Friendships are never removed, so edges only accumulate,
+    and ones added by other processes are read incrementally by id every
+    ``refresh_seconds``. A lower id can commit after a higher one, so each
+    read starts ``rescan_ids`` below the highest id seen, and the graph is
+    reloaded in full every ``reload_seconds`` to pick up any straggler.
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: float,
+        compact_edges: int,
+        rescan_ids: int = 0,
+        reload_seconds: float = float("inf"),
+    ) -> None:
+        self.refresh_seconds = refresh_seconds
+        self.compact_edges = compact_edges
+        self.rescan_ids = rescan_ids
+        self.reload_seconds = reload_seconds
+        self._offsets = array("l", [0, 0])
+        self._targets = array("i")
+        self._overlay: Dict[int, Set[int]] = {}
+        self._overlay_edges = 0
+        self._loaded_through = 0
+        self._checked_at: Optional[float] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._compacting = False
+
+    @property
+    def edges(self) -> int:
+        return len(self._targets) + self._overlay_edges
+
+    @property
+    def overlay_edges(self) -> int:
+        return self._overlay_edges
+
+    def load_sorted(self, edges: Iterable[Tuple[int, int]]) -> None:
+        """Replace the graph with (user_id, friend_id) pairs sorted by both."""
+        self._offsets, self._targets = _csr(edges)
+        self._overlay = {}
+        self._overlay_edges = 0
+
+    def _base(self, user_id: int) -> Sequence[int]:
+        offsets = self._offsets
+        if user_id + 1 >= len(offsets):
+            return ()
+        return self._targets[offsets[user_id]:offsets[user_id + 1]]
+
+    def friends(self, user_id: int) -> List[int]:
+        base = self._base(user_id)
+        extra = self._overlay.get(user_id)
+        if not extra:
+            return list(base)
+        return sorted(set(base) | extra)
+
+    def has_edge(self, user_id: int, friend_id: int) -> bool:
+        extra = self._overlay.get(user_id)
+        if extra and friend_id in extra:
+            return True
+        offsets = self._offsets
+        if user_id + 1 >= len(offsets):
+            return False
+        lo, hi = offsets[user_id], offsets[user_id + 1]
+        targets = self._targets
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if targets[mid] < friend_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < offsets[user_id + 1] and targets[lo] == friend_id
+
+    def add(self, user_id: int, friend_id: int) -> None:
+        if self._checked_at is None or self.has_edge(user_id, friend_id):
+            return  # not loaded yet: the load reads it
+        self._overlay.setdefault(user_id, set()).add(friend_id)
+        self._overlay_edges += 1
+        if self._overlay_edges >= self.compact_edges and not self._compacting:
+            self._compacting = True
+            asyncio.get_running_loop().create_task(self.compact())
+
+    async def compact(self) -> None:
+        """Merge the overlay into the arrays, off the event loop."""
+        self._compacting = True
+        try:
+            # Not while a reload replaces the arrays and overlay
+            async with self._lock:
+                pending = {user_id: set(friends) for user_id, friends in self._overlay.items()}
+                offsets, targets = await asyncio.to_thread(
+                    _merged, self._offsets, self._targets, pending
+                )
+                # Edges added while merging stay in the overlay
+                self._offsets, self._targets = offsets, targets
+                for user_id, merged in pending.items():
+                    left = self._overlay[user_id] - merged
+                    self._overlay_edges -= len(merged)
+                    if left:
+                        self._overlay[user_id] = left
+                    else:
+                        del self._overlay[user_id]
+        finally:
+            self._compacting = False
+
+    def _is_current(self) -> bool:
+        return (
+            self._checked_at is not None
+            and time.monotonic() - self._checked_at < self.refresh_seconds
+        )
+
+    async def ensure_current(self) -> None:
+        if self._is_current():
+            return
+        async with self._lock:
+            if self._is_current():
+                return
+            started = time.monotonic()
+            # Always the primary: a lagging replica would hold edges back
+            async with AsyncSessionLocal() as db:
+                if self._loaded_at is None or started - self._loaded_at >= self.reload_seconds:
+                    rows = (await db.execute(edges_query())).all()
+                    await asyncio.to_thread(self.load_sorted, ((r[1], r[2]) for r in rows))
+                    self._loaded_at = started
+                    self._loaded_through = 0
+                else:
+                    after = self._loaded_through - self.rescan_ids
+                    rows = (await db.execute(new_edges_query(after))).all()
+                    for row in rows:
+                        self.add(row.user_id, row.friend_id)
+            if rows:
+                self._loaded_through = max(self._loaded_through, max(r.id for r in rows))
+            self._checked_at = time.monotonic()
+
+    def suggestions(
+        self, user_id: int, limit: int, max_friends: int, max_fanout: int
+    ) -> List[Tuple[int, int]]:
+        """Up to ``limit`` (user_id, mutual friends) pairs, most mutual first.
+
+        A candidate's count is how many of the user's friends have them as
+        a friend. At most ``max_friends`` friends, and ``max_fanout`` of each
+        one's friends, are walked (sampled, stable per user), so the work is
+        bounded by their product whatever the degrees; counts are then
+        lower bounds.
+        """
+        rng = random.Random(user_id)
+        counts: Counter = Counter()
+        for friend_id in self._sample(user_id, max_friends, rng):
+            counts.update(self._sample(friend_id, max_fanout, rng))
+        counts.pop(user_id, None)
+        # Drop existing friends by whichever side is smaller
+        degree = self._degree(user_id)
+        if degree <= len(counts):
+            for friend_id in self.friends(user_id):
+                counts.pop(friend_id, None)
+        else:
+            for candidate in [c for c in counts if self.has_edge(user_id, c)]:
+                del counts[candidate]
+        return heapq.nlargest(limit, counts.items(), key=lambda item: (item[1], -item[0]))
+
+    def _degree(self, user_id: int) -> int:
+        extra = len(self._overlay.get(user_id, ()))
+        offsets = self._offsets
+        if user_id + 1 >= len(offsets):
+            return extra
+        return offsets[user_id + 1] - offsets[user_id] + extra
+
+    def _sample(self, user_id: int, k: int, rng: random.Random) -> Sequence[int]:
+        """All of a user's friends, or k of them picked without copying the rest."""
+        if self._degree(user_id) <= k:
+            return self.friends(user_id)
+        if user_id in self._overlay:
+            return rng.sample(self.friends(user_id), k)
+        lo = self._offsets[user_id]
+        targets = self._targets
+        return [targets[lo + i] for i in rng.sample(range(self._degree(user_id)), k)]
+
+
+def _merged(
+    offsets: array, targets: array, pending: Dict[int, Set[int]]
+) -> Tuple[array, array]:
+    def edges() -> Iterable[Tuple[int, int]]:
+        last = max(len(offsets) - 2, max(pending, default=0))
+        for user_id in range(last + 1):
+            base = (
+                targets[offsets[user_id]:offsets[user_id + 1]]
+                if user_id + 1 < len(offsets)
+                else ()
+            )
+            extra = pending.get(user_id)
+            for friend_id in sorted(set(base) | extra) if extra else base:
+                yield user_id, friend_id
+
+    return _csr(edges())
+
+
+friend_graph = FriendGraph(
+    refresh_seconds=config.FRIEND_GRAPH_REFRESH_SECONDS,
+    compact_edges=config.FRIEND_GRAPH_COMPACT_EDGES,
+    rescan_ids=config.FRIEND_GRAPH_RESCAN_IDS,
+    reload_seconds=config.FRIEND_GRAPH_RELOAD_SECONDS,
+)
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from passlib.context import CryptContext
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class HashPoolSaturated(Exception):
+    pass
+
+
+def scheme_settings(
+    pbkdf2_rounds: int = config.PBKDF2_ROUNDS,
+    bcrypt_rounds: int = config.BCRYPT_ROUNDS,
+    argon2_time_cost: int = config.ARGON2_TIME_COST,
+    argon2_memory_cost: int = config.ARGON2_MEMORY_COST_KIB,
+    argon2_parallelism: int = config.ARGON2_PARALLELISM,
+) -> Dict[str, Any]:
+    # Pinning min/max to the default makes needs_update() true for any hash
+    # made with other parameters, so a config change rehashes on next login.
+    settings: Dict[str, Any] = {}
+    for scheme, rounds in (("pbkdf2_sha256", pbkdf2_rounds), ("bcrypt", bcrypt_rounds)):
+        settings[f"{scheme}__default_rounds"] = rounds
+        settings[f"{scheme}__min_rounds"] = rounds
+        settings[f"{scheme}__max_rounds"] = rounds
+    settings["argon2__time_cost"] = argon2_time_cost
+    settings["argon2__memory_cost"] = argon2_memory_cost
+    settings["argon2__parallelism"] = argon2_parallelism
+    return settings
+
+
+def available_schemes(schemes: Sequence[str]) -> List[str]:
+    usable = []
+    for scheme in schemes:
+        try:
+            CryptContext(schemes=[scheme]).hash("probe")
+        except Exception as exc:  # missing backend or a broken one
+            logger.warning("password scheme %s unavailable: %s", scheme, exc)
+            continue
+        usable.append(scheme)
+    return usable
+
+
+def build_context(schemes: Sequence[str], **params: int) -> CryptContext:
+    usable = available_schemes(schemes) or ["pbkdf2_sha256"]
+    settings = {
+        key: value
+        for key, value in scheme_settings(**params).items()
+        if key.split("__", 1)[0] in usable
+    }
+    return CryptContext(schemes=usable, deprecated="auto", **settings)
+
+
+pwd_context = build_context(config.PASSWORD_SCHEMES)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class HashPool:
+    """Bounded executor for password hashing.
+
+    At most ``max_pending`` calls may be queued or running; beyond that
+    ``run`` raises HashPoolSaturated so the endpoint can shed load instead of
+    letting a login burst starve everything else.
+    """
+
+    def __init__(self, kind: str, workers: int, max_pending: int) -> None:
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="hash"
+                )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashPoolSaturated()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pool = HashPool(
+    kind=config.HASH_POOL_KIND,
+    workers=config.HASH_POOL_WORKERS,
+    max_pending=config.HASH_POOL_MAX_PENDING,
+)
@@ -1,12 +1,13 @@
 from sqlalchemy.orm import Session
 
-from . import models
+from . import catalog, migrations, models, rollup, streaks
 from .database import Base, engine
 
 
 def init_db() -> None:
     # Create tables
     Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
 
     # Seed default tasks if not present
     from .database import SessionLocal
@@ -36,7 +37,17 @@ def init_db() -> None:
                 ),
             ]
             db.add_all(tasks)
+            catalog.bump_version(db)
             db.commit()
+
+        # Databases created before the rollup and streaks existed need them
+        # backfilled once
+        if rollup.is_empty_with_logs(db):
+            rollup.rebuild()
+        if streaks.is_empty_with_logs(db):
+            streaks.rebuild()
+
+        catalog.load(db)
     finally:
         db.close()
 
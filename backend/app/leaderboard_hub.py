@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from datetime import date as date_type
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+
+from . import models
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+Period = Tuple[date_type, date_type]
+
+# Bounded per-connection buffer; a subscriber that falls this far behind is
+# sent a fresh snapshot instead of the backlog.
+QUEUE_SIZE = 32
+
+
+class Subscription:
+    __slots__ = ("owner_id", "range_key", "period", "members", "queue", "needs_resync")
+
+    def __init__(self, owner_id: int, range_key: str, period: Period, members: Iterable[int]):
+        self.owner_id = owner_id
+        self.range_key = range_key
+        self.period = period
+        self.members: Set[int] = set(members)
+        self.queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.needs_resync = False
+
+    def covers(self, day: date_type) -> bool:
+        return self.period[0] <= day <= self.period[1]
+
+    def offer(self, message: dict) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.needs_resync = True
+
+
+class LeaderboardHub:
+    """Fan-out of leaderboard deltas to live subscribers in this process.
+
+    Subscriptions are indexed by every member of their circle, so a points
+    change only touches the subscribers that display that user. Totals are
+    read once per distinct period, not once per subscriber.
+
+    Publishes for a user run one at a time: changes that arrive while a
+    read is in flight are coalesced into the next read, so a slow read can
+    never overwrite a newer total that a later write already sent.
+    """
+
+    def __init__(self) -> None:
+        self._by_member: Dict[int, Set[Subscription]] = {}
+        self._by_owner: Dict[int, Set[Subscription]] = {}
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        # Per user, periods and new-member announcements awaiting the next read
+        self._pending: Dict[int, Set[Period]] = {}
+        self._pending_joins: Dict[int, List[Tuple[List[Subscription], str]]] = {}
+        self._publishing: Set[int] = set()
+        self.messages_sent = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subs) for subs in self._by_owner.values())
+
+    def subscribe(
+        self, owner_id: int, range_key: str, period: Period, members: Iterable[int]
+    ) -> Subscription:
+        sub = Subscription(owner_id, range_key, period, members)
+        self._by_owner.setdefault(owner_id, set()).add(sub)
+        for member in sub.members:
+            self._by_member.setdefault(member, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._discard(self._by_owner, sub.owner_id, sub)
+        for member in sub.members:
+            self._discard(self._by_member, member, sub)
+
+    @staticmethod
+    def _discard(index: Dict[int, Set[Subscription]], key: int, sub: Subscription) -> None:
+        subs = index.get(key)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del index[key]
+
+    def broadcast(
+        self,
+        user_id: int,
+        totals: Dict[Period, int],
+        username: Optional[str] = None,
+        subscribers: Optional[Iterable[Subscription]] = None,
+    ) -> int:
+        sent = 0
+        targets = subscribers if subscribers is not None else self._by_member.get(user_id, ())
+        for sub in list(targets):
+            total = totals.get(sub.period)
+            if total is None:
+                continue
+            message = {"type": "delta", "user_id": user_id, "total_points": total}
+            if username is not None:
+                message["username"] = username
+            sub.offer(message)
+            sent += 1
+        self.messages_sent += sent
+        return sent
+
+    def notify_points(self, changed_dates: Dict[int, Set[date_type]]) -> None:
+        """Schedule deltas for users whose points changed on the given dates."""
+        for user_id, days in changed_dates.items():
+            periods = {
+                sub.period
+                for sub in self._by_member.get(user_id, ())
+                if any(sub.covers(day) for day in days)
+            }
+            if periods:
+                self._pending.setdefault(user_id, set()).update(periods)
+                self._schedule(user_id)
+
+    def notify_friend_added(self, owner_id: int, friend_id: int, username: str) -> None:
+        subs = list(self._by_owner.get(owner_id, ()))
+        if not subs:
+            return
+        for sub in subs:
+            sub.members.add(friend_id)
+            self._by_member.setdefault(friend_id, set()).add(sub)
+        self._pending_joins.setdefault(friend_id, []).append((subs, username))
+        self._schedule(friend_id)
+
+    def _schedule(self, user_id: int) -> None:
+        if user_id not in self._publishing:
+            self._publishing.add(user_id)
+            self._spawn(self._publish(user_id))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _totals(self, user_id: int, periods: Iterable[Period]) -> Dict[Period, int]:
+        udp = models.UserDailyPoints
+        totals: Dict[Period, int] = {}
+        async with AsyncSessionLocal() as db:
+            for start, end in periods:
+                totals[(start, end)] = (
+                    await db.execute(
+                        select(func.coalesce(func.sum(udp.points), 0)).where(
+                            udp.user_id == user_id, udp.date >= start, udp.date <= end
+                        )
+                    )
+                ).scalar()
+        return totals
+
+    async def _publish(self, user_id: int) -> None:
+        try:
+            while user_id in self._pending or user_id in self._pending_joins:
+                periods = self._pending.pop(user_id, set())
+                joins = self._pending_joins.pop(user_id, [])
+                joined: Set[Subscription] = set()
+                for subs, _ in joins:
+                    joined.update(subs)
+                    periods.update(sub.period for sub in subs)
+                totals = await self._totals(user_id, periods)
+                for subs, username in joins:
+                    self.broadcast(user_id, totals, username=username, subscribers=subs)
+                others = [s for s in self._by_member.get(user_id, ()) if s not in joined]
+                self.broadcast(user_id, totals, subscribers=others)
+        except Exception:
+            logger.exception("leaderboard delta publish failed")
+            self._pending.pop(user_id, None)
+            self._pending_joins.pop(user_id, None)
+        finally:
+            self._publishing.discard(user_id)
+
+
+hub = LeaderboardHub()
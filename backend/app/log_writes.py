@@ -0,0 +1,260 @@
+from dataclasses import dataclass
+from datetime import date as date_type, datetime
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from . import cache, models, rollup, snapshots, streaks
+from .catalog import TaskCatalog, TaskInfo
+from .database import dialect_insert
+from .leaderboard_hub import hub
+from .ranking import global_ranks
+
+LOGS = models.DailyTaskLog.__table__
+
+# Keeps the (user_id, task_id, date) IN (...) list well under SQLite's
+# bound-parameter limit.
+_KEY_CHUNK = 300
+
+LogKey = Tuple[int, int, date_type]
+
+
+@dataclass(frozen=True)
+class LogWrite:
+    user_id: int
+    task_id: int
+    date: date_type
+    completed: bool
+
+    @property
+    def key(self) -> LogKey:
+        return (self.user_id, self.task_id, self.date)
+
+
+@dataclass(frozen=True)
+class LogWriteResult:
+    id: Optional[int]
+    task: Optional[TaskInfo]
+    date: date_type
+    completed: bool
+    points_awarded: int
+    error: Optional[str] = None
+
+
+@dataclass
+class WriteOutcome:
+    results: List[LogWriteResult]
+    # Dates whose points changed, per user, for cache invalidation and
+    # live leaderboard updates by the caller
+    changed_dates: Dict[int, Set[date_type]]
+    # Net points change per (user, date), as applied to the rollup
+    points_deltas: Dict[Tuple[int, date_type], int]
+
+    @property
+    def changed_users(self) -> Set[int]:
+        return set(self.changed_dates)
+
+
+def existing_query(keys: List[LogKey]):
+    # A row-value IN list is not index-assisted on SQLite (it scans the
+    # table), so probe the (user_id, date) index and let the caller drop the
+    # other tasks logged on those days.
+    return select(
+        LOGS.c.user_id,
+        LOGS.c.task_id,
+        LOGS.c.date,
+        LOGS.c.points_awarded,
+        LOGS.c.completed,
+    ).where(
+        LOGS.c.user_id.in_(sorted({key[0] for key in keys})),
+        LOGS.c.date.in_(sorted({key[2] for key in keys})),
+    )
+
+
+def _load_existing(db: Session, keys: List[LogKey]) -> Dict[LogKey, Tuple[int, bool]]:
+    existing: Dict[LogKey, Tuple[int, bool]] = {}
+    for start in range(0, len(keys), _KEY_CHUNK):
+        chunk = keys[start:start + _KEY_CHUNK]
+        wanted = set(chunk)
+        for row in db.execute(existing_query(chunk)):
+            key = (row.user_id, row.task_id, row.date)
+            if key in wanted:
+                existing[key] = (row.points_awarded, row.completed)
+    return existing
+
+
+def _upsert_native(db: Session, insert_for_dialect, values: List[dict]) -> Dict[LogKey, int]:
+    ids: Dict[LogKey, int] = {}
+    stmt = insert_for_dialect(LOGS)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LOGS.c.user_id, LOGS.c.task_id, LOGS.c.date],
+        set_={
+            "completed": stmt.excluded.completed,
+            "points_awarded": stmt.excluded.points_awarded,
+            "updated_at": stmt.excluded.updated_at,
+            "log_version": stmt.excluded.log_version,
+        },
+    ).returning(LOGS.c.id, LOGS.c.user_id, LOGS.c.task_id, LOGS.c.date)
+    for start in range(0, len(values), _KEY_CHUNK):
+        for row in db.execute(stmt.values(values[start:start + _KEY_CHUNK])):
+            ids[(row.user_id, row.task_id, row.date)] = row.id
+    return ids
+
+
+def _upsert_orm(db: Session, values: List[dict]) -> Dict[LogKey, int]:
+    logs: Dict[LogKey, models.DailyTaskLog] = {}
+    for value in values:
+        key = (value["user_id"], value["task_id"], value["date"])
+        log = (
+            db.query(models.DailyTaskLog)
+            .filter(
+                models.DailyTaskLog.user_id == key[0],
+                models.DailyTaskLog.task_id == key[1],
+                models.DailyTaskLog.date == key[2],
+            )
+            .first()
+        )
+        if log is None:
+            log = models.DailyTaskLog(**value)
+            db.add(log)
+        else:
+            log.completed = value["completed"]
+            log.points_awarded = value["points_awarded"]
+            log.log_version = value["log_version"]
+        logs[key] = log
+    db.flush()
+    return {key: log.id for key, log in logs.items()}
+
+
+def lock_users(db: Session, user_ids: Set[int]) -> None:
+    """Row-lock the users, in id order so writers covering several users
+    cannot deadlock. A no-op on SQLite, where the first write locks the
+    database instead."""
+    users = models.User.__table__
+    db.execute(
+        select(users.c.id)
+        .where(users.c.id.in_(sorted(user_ids)))
+        .order_by(users.c.id)
+        .with_for_update()
+    )
+
+
+def bump_log_versions(db: Session, user_ids: Set[int]) -> None:
+    users = models.User.__table__
+    lock_users(db, user_ids)
+    db.execute(
+        update(users)
+        .where(users.c.id.in_(user_ids))
+        .values(log_version=users.c.log_version + 1)
+    )
+
+
+def after_commit(outcome: WriteOutcome) -> None:
+    """Bring this process's leaderboard cache, live streams and rank indexes
+    up to date with committed log changes."""
+    for user_id in outcome.changed_users:
+        cache.leaderboard_cache.invalidate_tag(cache.points_tag(user_id))
+    hub.notify_points(outcome.changed_dates)
+    global_ranks.apply(outcome.points_deltas)
+
+
+def log_versions(db: Session, user_ids: Set[int]) -> Dict[int, int]:
+    users = models.User.__table__
+    rows = db.execute(select(users.c.id, users.c.log_version).where(users.c.id.in_(user_ids)))
+    return {row.id: row.log_version for row in rows}
+
+
+def write_logs(db: Session, writes: Sequence[LogWrite], tasks: TaskCatalog) -> WriteOutcome:
+    """Upsert many daily logs and their rollup rows in the caller's transaction.
+
+    Task points come from the catalog snapshot, the logs are written with one
+    INSERT ... ON CONFLICT per chunk, and results line up with ``writes``.
+    The caller commits.
+    """
+    # Later writes to the same key win, like sequential single upserts would
+    final: Dict[LogKey, LogWrite] = {}
+    for w in writes:
+        if tasks.get_active(w.task_id) is not None:
+            final.pop(w.key, None)
+            final[w.key] = w
+
+    # Lock the writers before reading what their logs held: deltas computed
+    # from a read that a concurrent write could still change would both be
+    # applied to the rollup and the streaks.
+    written_users = {w.user_id for w in final.values()}
+    versions: Dict[int, int] = {}
+    if written_users:
+        bump_log_versions(db, written_users)
+        versions = log_versions(db, written_users)
+    existing = _load_existing(db, list(final))
+    now = datetime.utcnow()
+    values = []
+    for key, w in final.items():
+        values.append(
+            {
+                "user_id": w.user_id,
+                "task_id": w.task_id,
+                "date": w.date,
+                "completed": w.completed,
+                "points_awarded": tasks.by_id[w.task_id].points if w.completed else 0,
+                "created_at": now,
+                "updated_at": now,
+                "log_version": versions[w.user_id],
+            }
+        )
+
+    ids: Dict[LogKey, int] = {}
+    if values:
+        insert_for_dialect = dialect_insert(db.get_bind().dialect.name)
+        if insert_for_dialect is not None:
+            ids = _upsert_native(db, insert_for_dialect, values)
+        else:
+            ids = _upsert_orm(db, values)
+
+    deltas: Dict[Tuple[int, date_type], List[int]] = {}
+    changed_dates: Dict[int, Set[date_type]] = {}
+    day_changes: List[streaks.DayChange] = []
+    for value in values:
+        key = (value["user_id"], value["task_id"], value["date"])
+        old_points, old_completed = existing.get(key, (0, False))
+        if value["completed"] != old_completed:
+            day_changes.append(key + (value["completed"],))
+        delta = deltas.setdefault((value["user_id"], value["date"]), [0, 0])
+        delta[0] += value["points_awarded"] - old_points
+        delta[1] += int(value["completed"]) - int(old_completed)
+        if value["points_awarded"] != old_points:
+            changed_dates.setdefault(value["user_id"], set()).add(value["date"])
+    for (user_id, log_date), (points_delta, completed_delta) in deltas.items():
+        completed_count = rollup.apply_log_change(
+            db, user_id, log_date, points_delta, completed_delta
+        )
+        # The day counts towards the per-user streak while any task is done
+        if (completed_count > 0) != (completed_count - completed_delta > 0):
+            day_changes.append((user_id, streaks.ANY_TASK, log_date, completed_count > 0))
+    streaks.apply_changes(db, day_changes)
+    snapshots.mark_dirty(db, {log_date for (_, log_date), d in deltas.items() if d[0]})
+
+    results: List[LogWriteResult] = []
+    for w in writes:
+        task = tasks.get_active(w.task_id)
+        if task is None:
+            results.append(
+                LogWriteResult(None, None, w.date, w.completed, 0, error="Task not found")
+            )
+            continue
+        winner = final[w.key]
+        results.append(
+            LogWriteResult(
+                id=ids[w.key],
+                task=task,
+                date=winner.date,
+                completed=winner.completed,
+                points_awarded=task.points if winner.completed else 0,
+            )
+        )
+    return WriteOutcome(
+        results=results,
+        changed_dates=changed_dates,
+        points_deltas={key: d[0] for key, d in deltas.items() if d[0]},
+    )
@@ -1,16 +1,92 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from . import cache, config, hashing, metrics, pagination, reprice
+from .database import async_engine, engine
+from .friend_graph import friend_graph
 from .init_data import init_db
+from .leaderboard_hub import hub
+from .replicas import replicas
+from .user_index import user_index
+from .routers import admin as admin_router
 from .routers import auth as auth_router
 from .routers import friends as friends_router
 from .routers import leaderboard as leaderboard_router
 from .routers import logs as logs_router
 from .routers import stats as stats_router
 from .routers import tasks as tasks_router
+from .routers import users as users_router
+from .warmup import warmer
 
 
-def create_app() -> FastAPI:
+def _pool_checked_out() -> dict:
+    return {
+        (("engine", name),): getattr(db_engine.pool, "checkedout", lambda: 0)()
+        for name, db_engine in (("sync", engine), ("async", async_engine.sync_engine))
+    }
+
+
+metrics.registry.gauge(
+    "leaderboard_cache",
+    "Leaderboard cache size and counters.",
+    lambda: metrics.labelled(cache.leaderboard_cache.stats().items(), "stat"),
+)
+metrics.registry.gauge(
+    "stats_cache",
+    "Stats overview cache size and counters.",
+    lambda: metrics.labelled(cache.stats_cache.stats().items(), "stat"),
+)
+metrics.registry.gauge(
+    "cache_shared_computations",
+    "Cache misses answered by another request's in-flight computation.",
+    lambda: metrics.labelled(
+        [("leaderboard", cache.leaderboard_flights.shared), ("stats", cache.stats_flights.shared)],
+        "cache",
+    ),
+)
+metrics.registry.gauge("user_index_size", "Usernames in the prefix search index.",
+                       lambda: len(user_index))
+metrics.registry.gauge(
+    "friend_graph_edges",
+    "Friendships in the suggestion graph, in its arrays and in the overlay.",
+    lambda: metrics.labelled(
+        [("total", friend_graph.edges), ("overlay", friend_graph.overlay_edges)], "part"
+    ),
+)
+metrics.registry.gauge("reprice_jobs_running", "Reprice jobs running in this process.",
+                       lambda: len(reprice.runner.running()))
+metrics.registry.gauge("cache_warmer", "Rollover cache warming runs and users warmed.",
+                       lambda: metrics.labelled(warmer.stats().items(), "stat"))
+metrics.registry.gauge("hash_pool_pending", "Password hashes queued or running.",
+                       lambda: hashing.pool.pending)
+metrics.registry.gauge("hash_pool_rejected", "Hash requests shed with 503 since start.",
+                       lambda: hashing.pool.rejected)
+metrics.registry.gauge("leaderboard_stream_subscribers", "Open leaderboard streams.",
+                       lambda: hub.subscriber_count)
+metrics.registry.gauge("db_pool_checked_out", "Pooled DB connections in use.",
+                       _pool_checked_out)
+if replicas.engines:
+    metrics.registry.gauge("db_reads", "Read-only sessions opened, by target.",
+                           lambda: metrics.labelled(replicas.reads.items(), "target"))
+    metrics.registry.gauge("db_replica_healthy", "1 if the replica is in rotation.",
+                           lambda: metrics.labelled(replicas.healthy().items(), "replica"))
+if logs_router.write_queue is not None:
+    metrics.registry.gauge(
+        "write_queue",
+        "Daily-log group commit: queued requests, committed batches and writes.",
+        lambda: metrics.labelled(
+            [
+                ("pending", logs_router.write_queue.pending),
+                ("batches", logs_router.write_queue.batches),
+                ("writes", logs_router.write_queue.writes),
+            ],
+            "stat",
+        ),
+    )
+
+
+def create_app(metrics_enabled: bool = config.METRICS_ENABLED) -> FastAPI:
     app = FastAPI(title="Productivity Tracker API")
 
     origins = [
@@ -25,6 +101,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag", pagination.NEXT_CURSOR_HEADER, "X-Export-Watermark"],
     )
 
     app.include_router(auth_router.router)
@@ -33,11 +110,23 @@ def create_app() -> FastAPI:
     app.include_router(friends_router.router)
     app.include_router(leaderboard_router.router)
     app.include_router(stats_router.router)
+    app.include_router(users_router.router)
+    app.include_router(admin_router.router)
 
     @app.get("/")
     async def root():
         return {"message": "Productivity Tracker API"}
 
+    if metrics_enabled:
+        # Added last so it wraps CORS too and times the whole request
+        app.add_middleware(metrics.MetricsMiddleware)
+
+        @app.get("/metrics", include_in_schema=False)
+        async def get_metrics():
+            return PlainTextResponse(
+                metrics.registry.render(), media_type="text/plain; version=0.0.4"
+            )
+
     return app
 
 
@@ -45,6 +134,17 @@ app = create_app()
 
 
 @app.on_event("startup")
-def on_startup() -> None:
+async def on_startup() -> None:
     init_db()
+    await friend_graph.ensure_current()
+    if config.WARMUP_ENABLED:
+        warmer.start()
+
 
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    await warmer.stop()
+    await reprice.runner.stop()
+    if logs_router.write_queue is not None:
+        await logs_router.write_queue.close()
+    hashing.pool.shutdown()
@@ -0,0 +1,230 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+Labels = Tuple[Tuple[str, str], ...]
+GaugeValue = Union[float, Dict[Labels, float]]
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "metrics_request", default=None
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Request and SQL metrics, rendered in the Prometheus text format.
+
+    Request metrics are only touched from the event loop, so they take no
+    lock; SQL counters can be bumped from worker threads and do.
+    """
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_queries: Dict[Tuple[str, str], Histogram] = {}
+        self.request_db_seconds: Dict[Tuple[str, str], float] = {}
+        self._db_lock = threading.Lock()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self._gauges: List[Tuple[str, str, Callable[[], GaugeValue]]] = []
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], GaugeValue]) -> None:
+        """Register a value read at scrape time, optionally keyed by labels."""
+        self._gauges.append((name, help_text, fn))
+
+    def record_request(
+        self, method: str, route: str, status: int, seconds: float, stats: RequestStats
+    ) -> None:
+        key = (method, route)
+        counter_key = (method, route, str(status))
+        self.requests[counter_key] = self.requests.get(counter_key, 0) + 1
+        latency = self.latency.get(key)
+        if latency is None:
+            latency = self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.request_queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+            self.request_db_seconds[key] = 0.0
+        latency.observe(seconds)
+        self.request_queries[key].observe(stats.queries)
+        self.request_db_seconds[key] += stats.db_seconds
+
+    def record_query(self, seconds: float) -> None:
+        with self._db_lock:
+            self.db_queries += 1
+            self.db_seconds += seconds
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def header(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, series: Dict[Tuple[str, str], Histogram]) -> None:
+            for (method, route), hist in sorted(series.items()):
+                labels: Labels = (("method", method), ("route", route))
+                cumulative = 0
+                for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+                    cumulative += count
+                    le = f'le="{_format_number(bound)}"'
+                    lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(hist.total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+
+        header("http_requests_in_flight", "gauge", "Requests currently being served.")
+        lines.append(f"http_requests_in_flight {self.in_flight}")
+
+        header("http_requests_total", "counter", "Requests served, by route and status.")
+        for (method, route, status), count in sorted(self.requests.items()):
+            labels = (("method", method), ("route", route), ("status", status))
+            lines.append(f"http_requests_total{_format_labels(labels)} {count}")
+
+        header("http_request_duration_seconds", "histogram", "Request latency.")
+        histogram("http_request_duration_seconds", self.latency)
+
+        header("http_request_db_queries", "histogram", "SQL statements issued per request.")
+        histogram("http_request_db_queries", self.request_queries)
+
+        header("http_request_db_seconds_total", "counter", "Time spent in SQL, by route.")
+        for (method, route), seconds in sorted(self.request_db_seconds.items()):
+            labels = (("method", method), ("route", route))
+            lines.append(
+                f"http_request_db_seconds_total{_format_labels(labels)} {_format_number(seconds)}"
+            )
+
+        with self._db_lock:
+            db_queries, db_seconds = self.db_queries, self.db_seconds
+        header("db_queries_total", "counter", "SQL statements executed by this process.")
+        lines.append(f"db_queries_total {db_queries}")
+        header("db_query_seconds_total", "counter", "Time spent executing SQL statements.")
+        lines.append(f"db_query_seconds_total {_format_number(db_seconds)}")
+
+        for name, help_text, fn in self._gauges:
+            header(name, "gauge", help_text)
+            value = fn()
+            if isinstance(value, dict):
+                for labels, v in sorted(value.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(v)}")
+            else:
+                lines.append(f"{name} {_format_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request by its route template."""
+
+    def __init__(self, app, registry: Registry = registry) -> None:
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestStats()
+        token = _current_request.set(stats)
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.registry.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.registry.in_flight -= 1
+            _current_request.reset(token)
+            # The router stores the matched route in the scope; unmatched
+            # paths share one label so scanners cannot blow up cardinality.
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<unmatched>"
+            self.registry.record_request(scope["method"], path, status, elapsed, stats)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - context._metrics_started
+    registry.record_query(elapsed)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def uninstrument_engine(engine: Engine) -> None:
+    for name, fn in (
+        ("before_cursor_execute", _before_cursor_execute),
+        ("after_cursor_execute", _after_cursor_execute),
+    ):
+        if event.contains(engine, name, fn):
+            event.remove(engine, name, fn)
+
+
+def labelled(pairs: Iterable[Tuple[str, float]], label: str) -> Dict[Labels, float]:
+    return {((label, key),): value for key, value in pairs}
@@ -0,0 +1,44 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from .database import Base
+
+# Columns added after the first release; create_all() never alters existing
+# tables, so older app.db files get them here. (table, column, DDL type)
+_ADDED_COLUMNS = [
+    ("users", "token_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("users", "log_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("daily_task_logs", "log_version", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# Single-column indexes made redundant by a composite index with the same
+# leading column; dropping them saves a b-tree update on every write.
+_DROPPED_INDEXES = [
+    "ix_daily_task_logs_user_id",
+    "ix_friendships_user_id",
+    # Replaced by ix_daily_task_logs_user_version as the export watermark
+    "ix_daily_task_logs_user_updated",
+]
+
+
+def upgrade(engine: Engine) -> None:
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table, column, ddl in _ADDED_COLUMNS:
+            if table not in tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+    # Indexes declared on the models after their table already existed
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    with engine.begin() as conn:
+        for name in _DROPPED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -6,7 +6,9 @@ from sqlalchemy import (
     Date,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
+    PrimaryKeyConstraint,
     String,
     UniqueConstraint,
 )
@@ -23,6 +25,10 @@ class User(Base):
     email = Column(String(255), unique=True, index=True, nullable=True)
     password_hash = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
+    # Bumped to revoke every token issued before; carried in JWTs as "ver".
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
+    # Bumped on every daily-log write; feeds the ETags of per-user reads.
+    log_version = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     daily_logs = relationship("DailyTaskLog", back_populates="user", cascade="all, delete-orphan")
@@ -58,10 +64,20 @@ class DailyTaskLog(Base):
     __tablename__ = "daily_task_logs"
     __table_args__ = (
         UniqueConstraint("user_id", "task_id", "date", name="uix_user_task_date"),
+        # Per-user date ranges; also covers the rollup rebuild's aggregation
+        Index(
+            "ix_daily_task_logs_user_date_points",
+            "user_id",
+            "date",
+            "points_awarded",
+            "completed",
+        ),
+        # Incremental exports filter on the log_version watermark per user
+        Index("ix_daily_task_logs_user_version", "user_id", "log_version"),
     )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
     date = Column(Date, default=date.today, nullable=False, index=True)
     completed = Column(Boolean, default=False, nullable=False)
@@ -70,6 +86,10 @@ class DailyTaskLog(Base):
     updated_at = Column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
+    # The owner's log_version from the write that last changed the row. It
+    # is taken under the owner's write lock, so unlike updated_at it grows
+    # in commit order.
+    log_version = Column(Integer, default=0, server_default="0", nullable=False)
 
     user = relationship("User", back_populates="daily_logs")
     task = relationship("Task", back_populates="daily_logs")
@@ -82,10 +102,117 @@ class Friendship(Base):
     )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # Lookups by user_id use the leading column of uix_user_friend
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     friend_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     user = relationship("User", foreign_keys=[user_id], back_populates="friendships")
     friend = relationship("User", foreign_keys=[friend_id], back_populates="friend_of")
 
+
+class UserDailyPoints(Base):
+    # Rollup of DailyTaskLog per user and day, maintained on write by
+    # routers/logs.py and rebuildable with `python -m app.rollup rebuild`.
+    __tablename__ = "user_daily_points"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "date"),
+        # Everyone's points for a period, for the global rank index
+        Index("ix_user_daily_points_date_user", "date", "user_id", "points"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    points = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+
+
+class StreakRun(Base):
+    # Maximal runs of consecutive completed days per user and task, with
+    # task_id 0 for "any task that day". Maintained on write by
+    # log_writes.py and rebuildable with `python -m app.streaks rebuild`.
+    __tablename__ = "streak_runs"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "task_id", "start_date"),
+        # Longest run per (user, task) without reading all of them
+        Index("ix_streak_runs_user_task_length", "user_id", "task_id", "length"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    task_id = Column(Integer, nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    length = Column(Integer, nullable=False)
+
+
+class UserStreak(Base):
+    # Latest and longest run per (user, task), kept in step with streak_runs
+    __tablename__ = "user_streaks"
+    __table_args__ = (PrimaryKeyConstraint("user_id", "task_id"),)
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    task_id = Column(Integer, nullable=False)
+    last_start = Column(Date, nullable=False)
+    last_end = Column(Date, nullable=False)
+    longest = Column(Integer, nullable=False)
+
+
+class PeriodSnapshot(Base):
+    # A closed weekly or monthly period whose per-user totals are frozen in
+    # period_totals. Writes dated inside it bump version; the totals are
+    # current while built_version == version. See app/snapshots.py.
+    __tablename__ = "period_snapshots"
+    __table_args__ = (PrimaryKeyConstraint("period", "start_date"),)
+
+    period = Column(String(10), nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    built_version = Column(Integer, nullable=True)
+    built_at = Column(DateTime, nullable=True)
+
+
+class PeriodTotal(Base):
+    __tablename__ = "period_totals"
+    __table_args__ = (PrimaryKeyConstraint("period", "start_date", "user_id"),)
+
+    period = Column(String(10), nullable=False)
+    start_date = Column(Date, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    points = Column(Integer, nullable=False, default=0)
+
+
+class RepriceJob(Base):
+    # Rewrites points_awarded of one task's logs to the price it was given
+    # when the job was created, walking daily_task_logs by id in short
+    # transactions. Logs with id <= last_log_id are done. See app/reprice.py.
+    __tablename__ = "reprice_jobs"
+    __table_args__ = (Index("ix_reprice_jobs_task_status", "task_id", "status"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    points = Column(Integer, nullable=False)
+    is_active = Column(Boolean, nullable=False)
+    # running, done, failed (resumable) or superseded by a later change
+    status = Column(String(20), nullable=False, default="running")
+    last_log_id = Column(Integer, nullable=False, default=0)
+    # Fixed by the first chunk; later logs are written at the new price
+    max_log_id = Column(Integer, nullable=True)
+    scanned = Column(Integer, nullable=False, default=0)
+    changed = Column(Integer, nullable=False, default=0)
+    error = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # When the current run started, and from which log id, for the ETA
+    started_at = Column(DateTime, nullable=True)
+    started_from_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class VersionCounter(Base):
+    # Monotonic counters that let processes notice shared data changed,
+    # e.g. "task_catalog" is bumped whenever a Task row is modified.
+    __tablename__ = "version_counters"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,161 @@
+"""Plan check for the per-request queries.
+
+Runs EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (Postgres) on the statements
+the routers issue and fails if any of them reads a whole table:
+
+    python -m app.query_plans            # against DATABASE_URL
+    python -m app.query_plans --fresh    # against a scratch schema built from the models
+    python -m app.query_plans -v         # print every plan
+"""
+
+import argparse
+import json
+import re
+import sys
+from datetime import date as date_type, timedelta
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection, Engine
+
+from . import (
+    conditional,
+    friend_graph,
+    log_writes,
+    migrations,
+    ranking,
+    reprice,
+    snapshots,
+    streaks,
+    warmup,
+)
+from .database import Base, engine as default_engine
+from .routers import friends, leaderboard, logs, stats, tasks, users
+
+USER_ID = 1
+
+
+def _hot_queries() -> Iterator[Tuple[str, Callable[[], object]]]:
+    today = date_type.today()
+    week = (today - timedelta(days=today.weekday()), today)
+    yield "leaderboard", lambda: leaderboard.leaderboard_query(USER_ID, *week)
+    yield "leaderboard.snapshot", lambda: leaderboard.snapshot_leaderboard_query(
+        USER_ID, "weekly", week[0]
+    )
+    yield "snapshots.state", lambda: snapshots.state_query("weekly", week[0])
+    yield "leaderboard.global_scores", lambda: ranking.period_scores_query(*week)
+    yield "leaderboard.circle_signature", lambda: conditional.circle_signature_query(USER_ID)
+    yield "stats.points_by_date", lambda: stats.points_by_date_query(USER_ID, *week)
+    yield "stats.overview", lambda: stats.overview_logs_query(
+        USER_ID, today - timedelta(days=364), today
+    )
+    yield "stats.streaks", lambda: streaks.user_streaks_query(USER_ID)
+    yield "streaks.touching_runs", lambda: streaks.touching_runs_query(
+        USER_ID, streaks.ANY_TASK, today, today
+    )
+    yield "tasks.daily_logs", lambda: tasks.daily_logs_query(USER_ID, today)
+    yield "tasks.log_version", lambda: conditional.user_log_version_query(USER_ID)
+    yield "logs.existing", lambda: log_writes.existing_query(
+        [(USER_ID, 1, today), (USER_ID, 2, today)]
+    )
+    yield "logs.export", lambda: logs.export_query(logs.export_filters(USER_ID, *week, None))
+    yield "logs.export_since", lambda: logs.export_query(
+        logs.export_filters(USER_ID, None, None, 100)
+    )
+    yield "logs.export_watermark", lambda: logs.export_watermark_query(
+        logs.export_filters(USER_ID, *week, None)
+    )
+    yield "reprice.chunk", lambda: reprice.chunk_rows_query(1, 0, 2000)
+    yield "warmup.active_users", lambda: warmup.active_users_query(today, 2000)
+    yield "users.searchable_among", lambda: users.searchable_among_query(USER_ID, [2, 3, 4])
+    yield "friends.graph_new_edges", lambda: friend_graph.new_edges_query(1000)
+    yield "friends.list", lambda: friends.friends_query(USER_ID)
+    yield "friends.list_page", lambda: friends.friends_query(USER_ID, 50, ("m", 10))
+
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)")
+
+
+def _explain_sqlite(conn: Connection, sql: str) -> Tuple[List[str], List[str]]:
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql).all()
+    plan = [row[3] for row in rows]
+    scans = []
+    for detail in plan:
+        match = _SQLITE_SCAN.match(detail)
+        # "SCAN t USING INDEX i" still visits every entry of i; only
+        # SEARCH steps are bounded by the predicate.
+        if match and match.group(1) in Base.metadata.tables:
+            scans.append(detail)
+    return plan, scans
+
+
+def _walk_pg(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _walk_pg(child)
+
+
+def _explain_postgres(conn: Connection, sql: str) -> Tuple[List[str], List[str]]:
+    # Tiny tables make sequential scans the cheapest plan, so disable them to
+    # see whether an index path exists at all.
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    doc = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql).scalar()
+    if isinstance(doc, str):
+        doc = json.loads(doc)
+    plan, scans = [], []
+    for node in _walk_pg(doc[0]["Plan"]):
+        label = node["Node Type"]
+        if "Relation Name" in node:
+            label += f" on {node['Relation Name']}"
+        plan.append(label)
+        if node["Node Type"] == "Seq Scan":
+            scans.append(label)
+    return plan, scans
+
+
+def check(engine: Engine, verbose: bool = False) -> int:
+    explain = _explain_postgres if engine.dialect.name == "postgresql" else _explain_sqlite
+    failures = 0
+    with engine.connect() as conn:
+        for name, build in _hot_queries():
+            sql = str(
+                build().compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+            )
+            with conn.begin():
+                plan, scans = explain(conn, sql)
+            if scans:
+                failures += 1
+                print(f"FULL SCAN {name}: " + "; ".join(scans))
+            elif verbose:
+                print(f"ok {name}")
+            if verbose or scans:
+                for step in plan:
+                    print(f"    {step}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.query_plans", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fresh", action="store_true",
+                        help="check a scratch SQLite schema built from the models")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.fresh:
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+    else:
+        engine = default_engine
+        Base.metadata.create_all(bind=engine)
+        migrations.upgrade(engine)
+
+    failures = check(engine, verbose=args.verbose)
+    if failures:
+        print(f"{failures} quer{'y' if failures == 1 else 'ies'} read a whole table")
+        sys.exit(1)
+    print("no full table scans")
+
+
+if __name__ == "__main__":
+    main()
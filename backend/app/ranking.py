@@ -0,0 +1,335 @@
+import asyncio
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import date as date_type
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config, models
+
+Period = Tuple[date_type, date_type]
+
+
+class Fenwick:
+    """Counts per integer score with O(log n) prefix sums and k-th lookup."""
+
+    __slots__ = ("size", "tree")
+
+    def __init__(self, size: int) -> None:
+        self.size = size  # always a power of two
+        self.tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int) -> None:
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index: int) -> int:
+        """Sum of counts for indexes 0..index inclusive."""
+        total = 0
+        i = min(index + 1, self.size)
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def lower_bound(self, k: int) -> int:
+        """Smallest index whose prefix sum reaches k (k >= 1)."""
+        pos = 0
+        step = self.size
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] < k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+
+# Largest chunk of a tie bucket; a chunk that outgrows it is split in two
+_CHUNK = 1024
+
+
+class _SortedIds:
+    """The user ids sharing one score, kept sorted in bounded chunks.
+
+    A Fenwick tree over chunk lengths maps between ids and positions, so
+    insert, remove and index lookups cost O(log n) plus a shift inside one
+    chunk of at most _CHUNK ids, however many users share the score.
+    """
+
+    __slots__ = ("chunks", "maxes", "lengths", "size")
+
+    def __init__(self, ids: Sequence[int] = ()) -> None:
+        self.chunks = [list(ids[i:i + _CHUNK // 2]) for i in range(0, len(ids), _CHUNK // 2)]
+        self.size = len(ids)
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self.maxes = [chunk[-1] for chunk in self.chunks]
+        size = 1
+        while size < len(self.chunks):
+            size *= 2
+        self.lengths = Fenwick(size)
+        for i, chunk in enumerate(self.chunks):
+            self.lengths.add(i, len(chunk))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _chunk_for(self, user_id: int) -> int:
+        return min(bisect_left(self.maxes, user_id), len(self.chunks) - 1)
+
+    def add(self, user_id: int) -> None:
+        self.size += 1
+        if not self.chunks:
+            self.chunks.append([user_id])
+            self._reindex()
+            return
+        i = self._chunk_for(user_id)
+        chunk = self.chunks[i]
+        insort(chunk, user_id)
+        self.maxes[i] = chunk[-1]
+        if len(chunk) > _CHUNK:
+            half = len(chunk) // 2
+            self.chunks[i:i + 1] = [chunk[:half], chunk[half:]]
+            self._reindex()
+        else:
+            self.lengths.add(i, 1)
+
+    def remove(self, user_id: int) -> None:
+        self.size -= 1
+        i = self._chunk_for(user_id)
+        chunk = self.chunks[i]
+        del chunk[bisect_left(chunk, user_id)]
+        if chunk:
+            self.maxes[i] = chunk[-1]
+            self.lengths.add(i, -1)
+        else:
+            del self.chunks[i]
+            self._reindex()
+
+    def index(self, user_id: int) -> int:
+        """0-based place of user_id among the ids in the bucket."""
+        i = self._chunk_for(user_id)
+        return self.lengths.prefix(i - 1) + bisect_left(self.chunks[i], user_id)
+
+    def ids(self, index: int, count: int) -> List[int]:
+        """Up to count ids from 0-based place index onwards."""
+        if len(self.chunks) == 1:
+            return self.chunks[0][index:index + count]
+        i = self.lengths.lower_bound(index + 1)
+        offset = index - self.lengths.prefix(i - 1)
+        out: List[int] = []
+        while len(out) < count and i < len(self.chunks):
+            out.extend(self.chunks[i][offset:offset + count - len(out)])
+            offset = 0
+            i += 1
+        return out
+
+
+class RankIndex:
+    """Ranking of every user with points in one period.
+
+    A Fenwick tree over score values gives "how many users score more than
+    s" in O(log S); per-score sorted sets of user ids break ties and let
+    positions be walked for top-k and neighbours. Users without points
+    are not stored: they share the rank after the last scored user.
+    """
+
+    def __init__(self, scores: Mapping[int, int]) -> None:
+        self.scores: Dict[int, int] = {}
+        self.by_score: Dict[int, _SortedIds] = {}
+        top = max(scores.values(), default=0)
+        self.counts = Fenwick(_capacity_for(top))
+        ties: Dict[int, List[int]] = {}
+        for user_id, score in scores.items():
+            if score > 0:
+                self.scores[user_id] = score
+                ties.setdefault(score, []).append(user_id)
+        for score, users in ties.items():
+            users.sort()
+            self.by_score[score] = _SortedIds(users)
+            self.counts.add(score, len(users))
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def add(self, user_id: int, delta: int) -> None:
+        old = self.scores.get(user_id, 0)
+        # Points are never negative; clamp rather than index below zero if a
+        # delta arrives out of order with a rebuild.
+        new = max(0, old + delta)
+        if new == old:
+            return
+        if old > 0:
+            bucket = self.by_score[old]
+            bucket.remove(user_id)
+            if not bucket:
+                del self.by_score[old]
+            self.counts.add(old, -1)
+        if new > 0:
+            if new >= self.counts.size:
+                self._grow(new)
+            bucket = self.by_score.get(new)
+            if bucket is None:
+                bucket = self.by_score[new] = _SortedIds()
+            bucket.add(user_id)
+            self.counts.add(new, 1)
+            self.scores[user_id] = new
+        else:
+            del self.scores[user_id]
+
+    def _grow(self, score: int) -> None:
+        counts = Fenwick(_capacity_for(score))
+        for s, users in self.by_score.items():
+            counts.add(s, len(users))
+        self.counts = counts
+
+    def score_of(self, user_id: int) -> int:
+        return self.scores.get(user_id, 0)
+
+    def rank_of(self, user_id: int) -> int:
+        """Competition rank: 1 + number of users with strictly more points."""
+        return 1 + len(self.scores) - self.counts.prefix(self.score_of(user_id))
+
+    def position_of(self, user_id: int) -> int:
+        """1-based place in the ordering (points desc, user id asc)."""
+        score = self.score_of(user_id)
+        if score == 0:
+            return len(self.scores) + 1
+        above = len(self.scores) - self.counts.prefix(score)
+        return above + 1 + self.by_score[score].index(user_id)
+
+    def entries(self, start: int, stop: int) -> List[Tuple[int, int, int]]:
+        """(rank, user_id, score) for positions start..stop-1 (1-based)."""
+        out: List[Tuple[int, int, int]] = []
+        total = len(self.scores)
+        pos = max(1, start)
+        while pos < stop and pos <= total:
+            # Position p from the top is position total-p+1 from the bottom
+            score = self.counts.lower_bound(total - pos + 1)
+            bucket = self.by_score[score]
+            above = total - self.counts.prefix(score)
+            # Walk the tie bucket from the first wanted id rather than copying
+            # it: the bottom scores can hold hundreds of thousands of users.
+            first = pos - above - 1
+            user_ids = bucket.ids(first, stop - pos)
+            out.extend((above + 1, user_id, score) for user_id in user_ids)
+            pos += len(user_ids)
+        return out
+
+
+def _capacity_for(score: int) -> int:
+    size = 1024
+    while size <= score:
+        size *= 2
+    return size
+
+
+def period_scores_query(start_date: date_type, end_date: date_type):
+    udp = models.UserDailyPoints
+    return (
+        select(udp.user_id, func.sum(udp.points))
+        .where(udp.date >= start_date, udp.date <= end_date)
+        .group_by(udp.user_id)
+    )
+
+
+class _Entry:
+    __slots__ = ("index", "resync_at", "lock", "building", "raced")
+
+    def __init__(self) -> None:
+        self.index: Optional[RankIndex] = None
+        self.resync_at = 0.0
+        self.lock = asyncio.Lock()
+        self.building = False
+        self.raced = False
+
+
+class GlobalRanks:
+    """Per-(range, period) rank indexes, kept current by write deltas.
+
+    Indexes are built lazily from the points rollup and then updated in
+    place from each committed write. Writes made by other processes are
+    picked up by a periodic rebuild (RANK_INDEX_REFRESH_SECONDS), as is any
+    write that lands while an index is being built.
+    """
+
+    def __init__(self, max_periods: int, refresh_seconds: float) -> None:
+        self.max_periods = max_periods
+        self.refresh_seconds = refresh_seconds
+        self._entries: "OrderedDict[Tuple[str, Period], _Entry]" = OrderedDict()
+        self.total_users: Optional[int] = None
+
+    async def get(self, db: AsyncSession, range_key: str, period: Period) -> RankIndex:
+        key = (range_key, period)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+            while len(self._entries) > self.max_periods:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(key)
+
+        if entry.index is not None and (
+            time.monotonic() < entry.resync_at or entry.lock.locked()
+        ):
+            # Fresh, or a rebuild is already underway: serve what we have
+            return entry.index
+        async with entry.lock:
+            if entry.index is None or time.monotonic() >= entry.resync_at:
+                await self._build(db, entry, period)
+        return entry.index
+
+    async def _build(self, db: AsyncSession, entry: _Entry, period: Period) -> None:
+        entry.building, entry.raced = True, False
+        try:
+            rows = (await db.execute(period_scores_query(*period))).all()
+            # Sorting millions of ids would stall the event loop
+            index = await asyncio.to_thread(RankIndex, {uid: int(total) for uid, total in rows})
+            if self.total_users is None:
+                self.total_users = (
+                    await db.execute(select(func.count()).select_from(models.User))
+                ).scalar()
+        finally:
+            entry.building = False
+        entry.index = index
+        # A write that committed during the read may or may not be in it;
+        # rebuild again shortly instead of guessing.
+        delay = config.RANK_INDEX_RESYNC_SECONDS if entry.raced else self.refresh_seconds
+        entry.resync_at = time.monotonic() + delay
+
+    def apply(self, points_deltas: Mapping[Tuple[int, date_type], int]) -> None:
+        """Fold the net points change of a committed write into live indexes."""
+        if not points_deltas:
+            return
+        for (range_key, (start, end)), entry in self._entries.items():
+            if entry.building:
+                entry.raced = True
+            if entry.index is None:
+                continue
+            per_user: Dict[int, int] = {}
+            for (user_id, day), delta in points_deltas.items():
+                if start <= day <= end:
+                    per_user[user_id] = per_user.get(user_id, 0) + delta
+            for user_id, delta in per_user.items():
+                if delta:
+                    entry.index.add(user_id, delta)
+
+    def user_registered(self) -> None:
+        if self.total_users is not None:
+            self.total_users += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total_users = None
+
+
+global_ranks = GlobalRanks(
+    max_periods=config.RANK_INDEX_MAX_PERIODS,
+    refresh_seconds=config.RANK_INDEX_REFRESH_SECONDS,
+)
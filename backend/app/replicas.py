@@ -0,0 +1,121 @@
+import itertools
+import time
+from typing import AsyncIterator, Dict, List, Tuple
+
+from fastapi import Depends
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from . import auth, config
+from .database import AsyncSessionLocal, create_async_db_engine
+
+
+class ReplicaSet:
+    """Read replicas taken in turn, skipping any that recently failed.
+
+    A replica is checked when a session first takes a connection (the pool
+    pings it); if that fails it is skipped for ``retry_seconds`` and the
+    next one, or finally the primary, serves the read.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], retry_seconds: float) -> None:
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self._sessions = [
+            async_sessionmaker(e, autoflush=False, expire_on_commit=False) for e in engines
+        ]
+        self._down_until = [0.0] * len(engines)
+        self._turn = itertools.count()
+        self.reads: Dict[str, int] = {"primary": 0}
+        self.reads.update((f"replica{i}", 0) for i in range(len(engines)))
+        self.failures = 0
+
+    def _candidates(self) -> List[int]:
+        count = len(self.engines)
+        if not count:
+            return []
+        now = time.monotonic()
+        first = next(self._turn) % count
+        order = [(first + k) % count for k in range(count)]
+        return [i for i in order if self._down_until[i] <= now]
+
+    async def open(self) -> Tuple[AsyncSession, str]:
+        for i in self._candidates():
+            session = self._sessions[i]()
+            try:
+                await session.connection()
+            except (SQLAlchemyError, OSError):
+                await session.close()
+                self.failures += 1
+                self._down_until[i] = time.monotonic() + self.retry_seconds
+                continue
+            return session, f"replica{i}"
+        return AsyncSessionLocal(), "primary"
+
+    def healthy(self) -> Dict[str, int]:
+        now = time.monotonic()
+        return {f"replica{i}": int(until <= now) for i, until in enumerate(self._down_until)}
+
+
+class RecentWriters:
+    """Users who wrote within the last ``window`` seconds.
+
+    Their reads go to the primary so they see their own writes despite
+    replica lag. Like the caches this is per process; with several workers
+    a user's requests should be pinned to one, or the window covers only
+    writes made through the worker serving the read.
+    """
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._until: Dict[int, float] = {}
+        self._prune_at = 1024
+
+    def note(self, user_id: int) -> None:
+        now = time.monotonic()
+        self._until[user_id] = now + self.window
+        if len(self._until) > self._prune_at:
+            self._until = {uid: t for uid, t in self._until.items() if t > now}
+            self._prune_at = max(1024, 2 * len(self._until))
+
+    def wrote_recently(self, user_id: int) -> bool:
+        until = self._until.get(user_id)
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            del self._until[user_id]
+            return False
+        return True
+
+
+replicas = ReplicaSet(
+    [create_async_db_engine(url) for url in config.DATABASE_REPLICA_URLS],
+    retry_seconds=config.REPLICA_RETRY_SECONDS,
+)
+recent_writers = RecentWriters(config.READ_YOUR_WRITES_SECONDS)
+
+
+async def get_read_db(token: str = Depends(auth.oauth2_scheme)) -> AsyncIterator[AsyncSession]:
+    """Session for read-only handlers: a replica unless the caller just wrote.
+
+    Only the token's signature is checked here, so picking the session costs
+    no query; get_read_principal then looks the caller up on it.
+    """
+    user_id = auth.token_user_id(token)
+    if replicas.engines and not recent_writers.wrote_recently(user_id):
+        session, target = await replicas.open()
+    else:
+        session, target = AsyncSessionLocal(), "primary"
+    replicas.reads[target] += 1
+    async with session:
+        yield session
+
+
+async def get_read_principal(
+    token: str = Depends(auth.oauth2_scheme),
+    db: AsyncSession = Depends(get_read_db),
+) -> auth.Principal:
+    """The caller, resolved on the read session so the user lookup is
+    offloaded too. Register and logout-all note the writer, so their own
+    follow-up reads see the new row on the primary."""
+    return await auth.principal_from_token(token, db)
@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date as date_type, datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from . import catalog, config, log_writes, models, rollup, snapshots
+from .database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+LOGS = models.DailyTaskLog.__table__
+JOBS = models.RepriceJob.__table__
+USERS = models.User.__table__
+
+# Lock timeouts and SQLite snapshot conflicts with concurrent writers
+_CHUNK_RETRIES = 3
+
+
+@dataclass
+class Chunk:
+    outcome: log_writes.WriteOutcome
+    done: bool
+
+
+def start(
+    db: Session, task: models.Task, points: Optional[int], is_active: Optional[bool]
+) -> models.RepriceJob:
+    """Change a task's price and create the job repricing its logs.
+
+    A running job for the same task is superseded: it was pricing towards
+    a value that no longer holds, so the new job starts over. The caller
+    commits and then calls catalog.invalidate().
+    """
+    now = datetime.utcnow()
+    if points is not None:
+        task.points = points
+    if is_active is not None:
+        task.is_active = is_active
+    db.execute(
+        update(JOBS)
+        .where(JOBS.c.task_id == task.id, JOBS.c.status.in_(("running", "failed")))
+        .values(status="superseded", updated_at=now, finished_at=now)
+    )
+    catalog.bump_version(db)
+    job = models.RepriceJob(
+        task_id=task.id,
+        points=task.points,
+        is_active=task.is_active,
+        status="running",
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+
+def _in_chunk(task_id: int, lo: int, hi: int):
+    return (LOGS.c.id > lo, LOGS.c.id <= hi, LOGS.c.task_id == task_id)
+
+
+def chunk_rows_query(task_id: int, lo: int, hi: int):
+    return select(
+        LOGS.c.id, LOGS.c.user_id, LOGS.c.date, LOGS.c.completed, LOGS.c.points_awarded
+    ).where(*_in_chunk(task_id, lo, hi))
+
+
+def claim(job_id: int) -> Optional[float]:
+    """Mark a job as (re)started; returns seconds until it may run, or None
+    if it is finished or superseded."""
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        job = db.get(models.RepriceJob, job_id)
+        if job is None or job.status not in ("running", "failed"):
+            return None
+        job.status = "running"
+        job.error = None
+        job.started_at = now
+        job.started_from_id = job.last_log_id
+        db.commit()
+        settled = (now - job.created_at).total_seconds()
+    return max(0.0, config.REPRICE_SETTLE_SECONDS - settled)
+
+
+def run_chunk(job_id: int, chunk_size: int) -> Optional[Chunk]:
+    """Reprice the next ``chunk_size`` log ids of a job in one transaction.
+
+    The logs, their rollup rows, the owners' log versions, dirty snapshots
+    and the job's cursor all commit together, so stopping at any point
+    leaves a consistent state to resume from. Returns None once the job is
+    no longer running, including when another runner advanced it first.
+    """
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        job = db.execute(select(JOBS).where(JOBS.c.id == job_id)).one_or_none()
+        if job is None or job.status != "running":
+            return None
+        max_id = job.max_log_id
+        if max_id is None:
+            max_id = db.execute(select(func.coalesce(func.max(LOGS.c.id), 0))).scalar()
+        lo = job.last_log_id
+        hi = min(lo + chunk_size, max_id)
+        price = job.points if job.is_active else 0
+        new_points = case((LOGS.c.completed, price), else_=0)
+
+        # Advancing the cursor first claims the chunk and, on SQLite, takes
+        # the database write lock; the owners are then locked like
+        # log_writes does, so no user write can change a log between
+        # reading it and repricing it.
+        claimed = db.execute(
+            update(JOBS)
+            .where(JOBS.c.id == job_id, JOBS.c.status == "running", JOBS.c.last_log_id == lo)
+            .values(last_log_id=hi, max_log_id=max_id, updated_at=now)
+        ).rowcount
+        if claimed != 1:
+            db.rollback()
+            return None
+        owners = set(
+            db.execute(
+                select(LOGS.c.user_id).where(*_in_chunk(job.task_id, lo, hi)).distinct()
+            ).scalars()
+        )
+        if owners:
+            log_writes.lock_users(db, owners)
+        rows = db.execute(chunk_rows_query(job.task_id, lo, hi)).all()
+
+        stale = [row for row in rows if row.points_awarded != (price if row.completed else 0)]
+        updated: Set[int] = set()
+        if stale:
+            # Stamping the owners' bumped log_version lets incremental
+            # exports pick the new price up
+            log_writes.bump_log_versions(db, {row.user_id for row in stale})
+            owner_version = (
+                select(USERS.c.log_version).where(USERS.c.id == LOGS.c.user_id).scalar_subquery()
+            )
+            stmt = (
+                update(LOGS)
+                .where(*_in_chunk(job.task_id, lo, hi), LOGS.c.points_awarded != new_points)
+                .values(points_awarded=new_points, updated_at=now, log_version=owner_version)
+            )
+            if db.get_bind().dialect.update_returning:
+                updated = set(db.execute(stmt.returning(LOGS.c.id)).scalars())
+            else:
+                db.execute(stmt)
+                updated = {row.id for row in stale}
+        # Only rows the UPDATE changed move the rollup
+        deltas: Dict[Tuple[int, date_type], int] = {}
+        for row in stale:
+            if row.id in updated:
+                key = (row.user_id, row.date)
+                delta = (price if row.completed else 0) - row.points_awarded
+                deltas[key] = deltas.get(key, 0) + delta
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        changed_dates: Dict[int, Set[date_type]] = {}
+        for user_id, day in deltas:
+            changed_dates.setdefault(user_id, set()).add(day)
+        rollup.add_points(db, deltas)
+        snapshots.mark_dirty(db, {day for _, day in deltas})
+
+        done = hi >= max_id
+        db.execute(
+            update(JOBS)
+            .where(JOBS.c.id == job_id)
+            .values(
+                scanned=JOBS.c.scanned + len(rows),
+                changed=JOBS.c.changed + len(updated),
+                status="done" if done else "running",
+                finished_at=now if done else None,
+            )
+        )
+        db.commit()
+
+    outcome = log_writes.WriteOutcome(
+        results=[],
+        changed_dates=changed_dates,
+        points_deltas=deltas,
+    )
+    return Chunk(outcome, done)
+
+
+def _run_chunk_retrying(job_id: int, chunk_size: int) -> Optional[Chunk]:
+    for attempt in range(_CHUNK_RETRIES):
+        try:
+            return run_chunk(job_id, chunk_size)
+        except OperationalError:
+            if attempt == _CHUNK_RETRIES - 1:
+                raise
+            time.sleep(0.5 * (attempt + 1))
+    return None
+
+
+def fail(job_id: int, error: BaseException) -> None:
+    with SessionLocal() as db:
+        db.execute(
+            update(JOBS)
+            .where(JOBS.c.id == job_id, JOBS.c.status == "running")
+            .values(status="failed", error=str(error)[:255], updated_at=datetime.utcnow())
+        )
+        db.commit()
+
+
+def describe(job: models.RepriceJob) -> dict:
+    """The job's columns plus progress (0..1) and an ETA from the current run."""
+    progress = 0.0
+    eta_seconds: Optional[float] = None
+    if job.status == "done":
+        progress = 1.0
+    elif job.max_log_id is not None:
+        progress = job.last_log_id / job.max_log_id if job.max_log_id else 1.0
+        covered = job.last_log_id - job.started_from_id
+        if job.status == "running" and job.started_at is not None and covered > 0:
+            elapsed = (job.updated_at - job.started_at).total_seconds()
+            eta_seconds = round((job.max_log_id - job.last_log_id) * elapsed / covered, 1)
+    values = {c.name: getattr(job, c.name) for c in JOBS.columns}
+    values.update(progress=round(progress, 4), eta_seconds=eta_seconds)
+    return values
+
+
+class RepriceRunner:
+    """Runs reprice jobs as background tasks of this process.
+
+    Chunks run in a worker thread, each followed by ``on_commit`` with the
+    points it moved (for caches and live leaderboards) and a pause. A job
+    left running by a stopped process is resumed through the admin API or
+    ``python -m app.reprice run``.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[int, "asyncio.Task[None]"] = {}
+
+    def running(self) -> List[int]:
+        return [job_id for job_id, task in self._tasks.items() if not task.done()]
+
+    def start(
+        self, job_id: int, on_commit: Optional[Callable[[log_writes.WriteOutcome], None]] = None
+    ) -> bool:
+        task = self._tasks.get(job_id)
+        if task is not None and not task.done():
+            return False
+        task = asyncio.get_running_loop().create_task(self._run(job_id, on_commit))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return True
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(
+        self, job_id: int, on_commit: Optional[Callable[[log_writes.WriteOutcome], None]]
+    ) -> None:
+        try:
+            wait = await asyncio.to_thread(claim, job_id)
+            if wait is None:
+                return
+            await asyncio.sleep(wait)
+            while True:
+                chunk = await asyncio.to_thread(
+                    _run_chunk_retrying, job_id, config.REPRICE_CHUNK_SIZE
+                )
+                if chunk is None:
+                    return
+                if on_commit is not None:
+                    on_commit(chunk.outcome)
+                if chunk.done:
+                    return
+                await asyncio.sleep(config.REPRICE_PAUSE_MS / 1000)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception("reprice job %s failed", job_id)
+            await asyncio.to_thread(fail, job_id, exc)
+
+
+runner = RepriceRunner()
+
+
+def run(job_id: int) -> None:
+    """Run a job to completion in this process, printing progress."""
+    wait = claim(job_id)
+    if wait is None:
+        print(f"job {job_id} is not running")
+        return
+    if wait:
+        print(f"waiting {wait:.0f}s for every process to load the new price")
+        time.sleep(wait)
+    reported = time.monotonic()
+    try:
+        while True:
+            chunk = _run_chunk_retrying(job_id, config.REPRICE_CHUNK_SIZE)
+            if chunk is None or chunk.done:
+                break
+            if time.monotonic() - reported >= 5:
+                _print_status(job_id)
+                reported = time.monotonic()
+            time.sleep(config.REPRICE_PAUSE_MS / 1000)
+    except Exception as exc:
+        fail(job_id, exc)
+        raise
+    _print_status(job_id)
+
+
+def _print_status(job_id: Optional[int] = None) -> None:
+    with SessionLocal() as db:
+        query = select(models.RepriceJob).order_by(models.RepriceJob.id.desc())
+        if job_id is not None:
+            query = query.where(models.RepriceJob.id == job_id)
+        for job in db.execute(query.limit(20)).scalars():
+            d = describe(job)
+            eta = f" eta {d['eta_seconds']:.0f}s" if d["eta_seconds"] is not None else ""
+            print(
+                f"job {job.id} task={job.task_id} points={job.points} "
+                f"active={job.is_active} {job.status} {d['progress']:.1%} "
+                f"(ids {job.last_log_id}/{job.max_log_id}, {job.changed} changed){eta}"
+                + (f" error: {job.error}" if job.error else "")
+            )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.reprice",
+        description="Change a task's points or active flag and reprice its logged history.",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    start_cmd = sub.add_parser("start", help="change a task and run its reprice job")
+    start_cmd.add_argument("task_code")
+    start_cmd.add_argument("--points", type=int)
+    active = start_cmd.add_mutually_exclusive_group()
+    active.add_argument("--deactivate", dest="is_active", action="store_false", default=None)
+    active.add_argument("--activate", dest="is_active", action="store_true")
+    start_cmd.add_argument("--no-run", action="store_true", help="only create the job")
+    run_cmd = sub.add_parser("run", help="resume a running or failed job")
+    run_cmd.add_argument("job_id", type=int)
+    status_cmd = sub.add_parser("status", help="show recent jobs")
+    status_cmd.add_argument("job_id", type=int, nargs="?")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine, tables=[JOBS])
+
+    if args.command == "status":
+        _print_status(args.job_id)
+        return 0
+    if args.command == "run":
+        run(args.job_id)
+        return 0
+
+    if args.points is None and args.is_active is None:
+        parser.error("start needs --points, --activate or --deactivate")
+    with SessionLocal() as db:
+        task = db.execute(
+            select(models.Task).where(models.Task.code == args.task_code)
+        ).scalar_one_or_none()
+        if task is None:
+            print(f"no task {args.task_code!r}")
+            return 1
+        job = start(db, task, args.points, args.is_active)
+        db.commit()
+        job_id = job.id
+    print(f"created job {job_id}")
+    if not args.no_run:
+        run(job_id)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
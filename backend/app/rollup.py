@@ -0,0 +1,208 @@
+import argparse
+import sys
+from datetime import date as date_type
+from typing import Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import dialect_insert, engine
+
+UDP = models.UserDailyPoints.__table__
+
+
+class Drift(NamedTuple):
+    user_id: int
+    date: date_type
+    expected_points: int
+    expected_completed: int
+    actual_points: Optional[int]
+    actual_completed: Optional[int]
+
+
+def apply_log_change(
+    db: Session,
+    user_id: int,
+    log_date: date_type,
+    points_delta: int,
+    completed_delta: int,
+) -> int:
+    """Apply a log change to the day's rollup row; returns its new completed_count.
+
+    Called inside the caller's transaction; the caller commits. The deltas
+    must come from logs read under the user's write lock (see
+    log_writes.write_logs), or concurrent writers apply the same change twice.
+    """
+    insert_for_dialect = dialect_insert(db.get_bind().dialect.name)
+    if insert_for_dialect is not None:
+        stmt = insert_for_dialect(UDP).values(
+            user_id=user_id,
+            date=log_date,
+            points=points_delta,
+            completed_count=completed_delta,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UDP.c.user_id, UDP.c.date],
+            set_={
+                "points": UDP.c.points + points_delta,
+                "completed_count": UDP.c.completed_count + completed_delta,
+            },
+        ).returning(UDP.c.completed_count)
+        return db.execute(stmt).scalar_one()
+
+    row = db.get(models.UserDailyPoints, (user_id, log_date))
+    if row is None:
+        db.add(
+            models.UserDailyPoints(
+                user_id=user_id,
+                date=log_date,
+                points=points_delta,
+                completed_count=completed_delta,
+            )
+        )
+        db.flush()
+        return completed_delta
+    completed_count = row.completed_count + completed_delta
+    row.points = models.UserDailyPoints.points + points_delta
+    row.completed_count = models.UserDailyPoints.completed_count + completed_delta
+    db.flush()
+    return completed_count
+
+
+def _expected_select():
+    log = models.DailyTaskLog
+    return (
+        select(
+            log.user_id,
+            log.date,
+            func.coalesce(func.sum(log.points_awarded), 0).label("points"),
+            func.coalesce(func.sum(case((log.completed.is_(True), 1), else_=0)), 0).label(
+                "completed_count"
+            ),
+        )
+        .group_by(log.user_id, log.date)
+        .order_by(log.user_id, log.date)
+    )
+
+
+def _actual_select():
+    return select(UDP.c.user_id, UDP.c.date, UDP.c.points, UDP.c.completed_count).order_by(
+        UDP.c.user_id, UDP.c.date
+    )
+
+
+def _stream(conn: Connection, stmt) -> Iterator[Tuple]:
+    result = conn.execution_options(stream_results=True, yield_per=1000).execute(stmt)
+    for row in result:
+        yield tuple(row)
+
+
+def find_drift() -> Iterator[Drift]:
+    # Merge-join both sides ordered by (user_id, date) so memory stays flat
+    # no matter how many rows the tables hold.
+    with engine.connect() as expected_conn, engine.connect() as actual_conn:
+        expected = _stream(expected_conn, _expected_select())
+        actual = _stream(actual_conn, _actual_select())
+        exp = next(expected, None)
+        act = next(actual, None)
+        while exp is not None or act is not None:
+            if act is None or (exp is not None and exp[:2] < act[:2]):
+                yield Drift(exp[0], exp[1], exp[2], exp[3], None, None)
+                exp = next(expected, None)
+            elif exp is None or act[:2] < exp[:2]:
+                # A rollup row with no logs behind it is only drift if non-zero.
+                if act[2] or act[3]:
+                    yield Drift(act[0], act[1], 0, 0, act[2], act[3])
+                act = next(actual, None)
+            else:
+                if exp[2] != act[2] or exp[3] != act[3]:
+                    yield Drift(exp[0], exp[1], exp[2], exp[3], act[2], act[3])
+                exp = next(expected, None)
+                act = next(actual, None)
+
+
+def add_points(db: Session, deltas: Mapping[Tuple[int, date_type], int]) -> None:
+    """Add points to existing rollup rows in one executemany.
+
+    For changes to logs that already exist (repricing), whose rows are
+    therefore present; completion counts are untouched. The caller commits.
+    """
+    if not deltas:
+        return
+    db.execute(
+        update(UDP)
+        .where(UDP.c.user_id == bindparam("b_user_id"), UDP.c.date == bindparam("b_date"))
+        .values(points=UDP.c.points + bindparam("b_delta")),
+        [
+            {"b_user_id": user_id, "b_date": day, "b_delta": delta}
+            for (user_id, day), delta in deltas.items()
+        ],
+    )
+
+
+def rebuild() -> None:
+    expected = _expected_select().subquery()
+    with engine.begin() as conn:
+        conn.execute(delete(UDP))
+        conn.execute(
+            insert(UDP).from_select(
+                ["user_id", "date", "points", "completed_count"],
+                select(
+                    expected.c.user_id,
+                    expected.c.date,
+                    expected.c.points,
+                    expected.c.completed_count,
+                ),
+            )
+        )
+
+
+def is_empty_with_logs(db: Session) -> bool:
+    has_rollup = db.execute(select(UDP.c.user_id).limit(1)).first() is not None
+    if has_rollup:
+        return False
+    return db.execute(select(models.DailyTaskLog.id).limit(1)).first() is not None
+
+
+def _print_drift(drift: List[Drift]) -> None:
+    for d in drift:
+        print(
+            f"user={d.user_id} date={d.date} "
+            f"expected=({d.expected_points} pts, {d.expected_completed} done) "
+            f"actual=({d.actual_points} pts, {d.actual_completed} done)"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.rollup",
+        description="Verify or rebuild the user_daily_points rollup from daily_task_logs.",
+    )
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument(
+        "--limit", type=int, default=50, help="max drifted rows to print (default 50)"
+    )
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine, tables=[UDP])
+
+    drift_count = 0
+    sample: List[Drift] = []
+    for d in find_drift():
+        drift_count += 1
+        if len(sample) < args.limit:
+            sample.append(d)
+    _print_drift(sample)
+    print(f"{drift_count} drifted (user, date) rows")
+
+    if args.command == "rebuild":
+        rebuild()
+        print("rollup rebuilt from daily_task_logs")
+        return 0
+    return 1 if drift_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
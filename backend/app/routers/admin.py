@@ -0,0 +1,77 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import auth, catalog, log_writes, models, reprice, schemas
+from ..database import get_async_db
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+async def _job_or_404(db: AsyncSession, job_id: int) -> models.RepriceJob:
+    job = await db.get(models.RepriceJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post(
+    "/tasks/{task_id}/reprice",
+    response_model=schemas.RepriceJobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def reprice_task(
+    task_id: int,
+    payload: schemas.RepriceRequest,
+    db: AsyncSession = Depends(get_async_db),
+    admin: auth.Principal = Depends(auth.get_current_admin),
+):
+    if payload.points is None and payload.is_active is None:
+        raise HTTPException(status_code=400, detail="Nothing to change")
+    task = await db.get(models.Task, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    job = await db.run_sync(
+        lambda sync_db: reprice.start(sync_db, task, payload.points, payload.is_active)
+    )
+    await db.commit()
+    catalog.invalidate()
+    reprice.runner.start(job.id, on_commit=log_writes.after_commit)
+    return reprice.describe(job)
+
+
+@router.get("/reprice-jobs", response_model=List[schemas.RepriceJobRead])
+async def list_reprice_jobs(
+    db: AsyncSession = Depends(get_async_db),
+    admin: auth.Principal = Depends(auth.get_current_admin),
+):
+    jobs = (
+        await db.execute(
+            select(models.RepriceJob).order_by(models.RepriceJob.id.desc()).limit(50)
+        )
+    ).scalars()
+    return [reprice.describe(job) for job in jobs]
+
+
+@router.get("/reprice-jobs/{job_id}", response_model=schemas.RepriceJobRead)
+async def get_reprice_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    admin: auth.Principal = Depends(auth.get_current_admin),
+):
+    return reprice.describe(await _job_or_404(db, job_id))
+
+
+@router.post("/reprice-jobs/{job_id}/resume", response_model=schemas.RepriceJobRead)
+async def resume_reprice_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    admin: auth.Principal = Depends(auth.get_current_admin),
+):
+    job = await _job_or_404(db, job_id)
+    if job.status not in ("running", "failed"):
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    reprice.runner.start(job.id, on_commit=log_writes.after_commit)
+    return reprice.describe(job)
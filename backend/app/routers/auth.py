@@ -1,63 +1,92 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import auth, models, schemas
-from ..database import get_db
+from ..database import get_async_db
+from ..ranking import global_ranks
+from ..replicas import recent_writers
+from ..user_index import user_index
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 
 @router.post("/register", response_model=schemas.UserRead)
-def register(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check username uniqueness
     existing_username = (
-        db.query(models.User)
-        .filter(models.User.username == user_in.username)
-        .first()
-    )
+        await db.execute(
+            select(models.User.id).where(models.User.username == user_in.username)
+        )
+    ).first()
     if existing_username:
         raise HTTPException(status_code=400, detail="Username or email already registered")
 
     # If email is provided, check email uniqueness separately
     if user_in.email:
         existing_email = (
-            db.query(models.User)
-            .filter(models.User.email == user_in.email)
-            .first()
-        )
+            await db.execute(
+                select(models.User.id).where(models.User.email == user_in.email)
+            )
+        ).first()
         if existing_email:
             raise HTTPException(status_code=400, detail="Username or email already registered")
 
+    password_hash = await auth.hash_password_pooled(user_in.password)
     user = models.User(
         username=user_in.username,
         email=user_in.email,
-        password_hash=auth.get_password_hash(user_in.password),
+        password_hash=password_hash,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    # Replicas may not have the new row yet; read it back from the primary
+    recent_writers.note(user.id)
+    global_ranks.user_registered()
+    user_index.register(user.id, user.username)
     return user
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.password_hash):
+    user = (
+        await db.execute(
+            select(models.User).where(models.User.username == form_data.username)
+        )
+    ).scalars().first()
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await auth.verify_password_pooled(
+            form_data.password, user.password_hash
+        )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = auth.create_access_token({"sub": str(user.id)})
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+    access_token = auth.create_access_token(auth.token_claims(user))
     user_read = schemas.UserRead.from_orm(user)
     return schemas.Token(access_token=access_token, token_type="bearer", user=user_read)
 
 
 @router.get("/me", response_model=schemas.UserRead)
-def read_me(current_user: models.User = Depends(auth.get_current_user)):
+async def read_me(current_user: models.User = Depends(auth.get_current_user)):
     return schemas.UserRead.from_orm(current_user)
 
+
+@router.post("/logout-all", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_all(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(auth.get_current_user),
+):
+    await auth.revoke_tokens(db, current_user)
+    recent_writers.note(current_user.id)
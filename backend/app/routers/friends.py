@@ -1,75 +1,133 @@
-from typing import List
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import auth, models, schemas
-from ..database import get_db
+from .. import auth, cache, config, models, pagination, schemas
+from ..database import get_async_db
+from ..friend_graph import friend_graph
+from ..leaderboard_hub import hub
+from ..replicas import get_read_db, get_read_principal, recent_writers
 
 router = APIRouter(prefix="/api/friends", tags=["friends"])
 
 
-@router.get("", response_model=List[schemas.FriendshipRead])
-def list_friends(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+def friends_query(
+    user_id: int, limit: Optional[int] = None, after: Optional[Tuple[str, int]] = None
 ):
-    friendships = (
-        db.query(models.Friendship)
-        .filter(models.Friendship.user_id == current_user.id)
-        .join(models.Friendship.friend)
-        .order_by(models.User.username)
-        .all()
+    # Plain columns rather than ORM entities: building thousands of
+    # Friendship and User objects dominated large listings.
+    friendship, user = models.Friendship, models.User
+    stmt = (
+        select(friendship.id, friendship.created_at, user.id.label("friend_id"), user.username)
+        .join(user, user.id == friendship.friend_id)
+        .where(friendship.user_id == user_id)
+        .order_by(user.username, user.id)
     )
+    if after is not None:
+        stmt = stmt.where(tuple_(user.username, user.id) > after)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)  # one extra row tells us a next page exists
+    return stmt
+
+
+@router.get("", response_model=List[schemas.FriendshipRead])
+async def list_friends(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: auth.Principal = Depends(get_read_principal),
+):
+    after_key = pagination.decode_cursor(after, (str, int)) if after else None
+    rows = (await db.execute(friends_query(current_user.id, limit, after_key))).all()
 
-    result: List[schemas.FriendshipRead] = []
-    for fs in friendships:
-        friend = schemas.FriendRead.from_orm(fs.friend)
-        result.append(
-            schemas.FriendshipRead(
-                id=fs.id,
-                friend=friend,
-                created_at=fs.created_at,
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        cursor = pagination.encode_cursor(last.username, last.friend_id)
+        pagination.set_next_cursor(response, cursor)
+
+    return [
+        {
+            "id": row.id,
+            "friend": {"id": row.friend_id, "username": row.username},
+            "created_at": row.created_at,
+        }
+        for row in rows
+    ]
+
+
+@router.get("/suggestions", response_model=List[schemas.FriendSuggestion])
+async def suggest_friends(
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: auth.Principal = Depends(get_read_principal),
+):
+    await friend_graph.ensure_current()
+    ranked = friend_graph.suggestions(
+        current_user.id,
+        limit,
+        max_friends=config.FRIEND_SUGGEST_MAX_FRIENDS,
+        max_fanout=config.FRIEND_SUGGEST_MAX_FANOUT,
+    )
+    if not ranked:
+        return []
+    names = dict(
+        (
+            await db.execute(
+                select(models.User.id, models.User.username).where(
+                    models.User.id.in_([user_id for user_id, _ in ranked])
+                )
             )
-        )
-    return result
+        ).all()
+    )
+    return [
+        schemas.FriendSuggestion(id=user_id, username=names[user_id], mutual_friends=mutual)
+        for user_id, mutual in ranked
+        if user_id in names
+    ]
 
 
 @router.post("", response_model=schemas.FriendshipRead)
-def add_friend(
+async def add_friend(
     friendship_in: schemas.FriendshipCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
 ):
     friend = (
-        db.query(models.User)
-        .filter(models.User.username == friendship_in.friend_username)
-        .first()
-    )
+        await db.execute(
+            select(models.User).where(models.User.username == friendship_in.friend_username)
+        )
+    ).scalars().first()
     if not friend:
         raise HTTPException(status_code=404, detail="Friend user not found")
     if friend.id == current_user.id:
         raise HTTPException(status_code=400, detail="You cannot add yourself as a friend")
 
     existing = (
-        db.query(models.Friendship)
-        .filter(
-            models.Friendship.user_id == current_user.id,
-            models.Friendship.friend_id == friend.id,
+        await db.execute(
+            select(models.Friendship.id).where(
+                models.Friendship.user_id == current_user.id,
+                models.Friendship.friend_id == friend.id,
+            )
         )
-        .first()
-    )
+    ).first()
     if existing:
         raise HTTPException(status_code=400, detail="Friendship already exists")
 
     friendship = models.Friendship(user_id=current_user.id, friend_id=friend.id)
     db.add(friendship)
-    db.commit()
-    db.refresh(friendship)
+    await db.commit()
+    recent_writers.note(current_user.id)
+    friend_graph.add(current_user.id, friend.id)
+    await db.refresh(friendship)
+    cache.leaderboard_cache.invalidate_tag(cache.friends_tag(current_user.id))
+    hub.notify_friend_added(current_user.id, friend.id, friend.username)
 
     return schemas.FriendshipRead(
         id=friendship.id,
         friend=schemas.FriendRead.from_orm(friend),
         created_at=friendship.created_at,
     )
-
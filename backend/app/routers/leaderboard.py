@@ -1,12 +1,19 @@
+import asyncio
+import json
+from bisect import bisect_right
 from datetime import date as date_type, timedelta
-from typing import List, Optional, Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import auth, models, schemas
-from ..database import get_db
+from .. import auth, cache, conditional, config, models, pagination, schemas, snapshots
+from ..database import AsyncSessionLocal, get_async_db
+from ..leaderboard_hub import hub
+from ..ranking import global_ranks
+from ..replicas import get_read_db, get_read_principal
 
 router = APIRouter(prefix="/api/leaderboard", tags=["leaderboard"])
 
@@ -34,52 +41,304 @@ def _get_range_dates(
     return start, end
 
 
-@router.get("", response_model=List[schemas.LeaderboardEntry])
-def get_leaderboard(
-    range: str = "weekly",
-    for_date: Optional[date_type] = None,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
-):
-    ref_date = for_date or date_type.today()
-    start_date, end_date = _get_range_dates(range, ref_date)
+def _range_key(range_type: str) -> str:
+    return range_type if range_type in ("daily", "monthly") else "weekly"
 
-    friend_ids_subq = (
-        db.query(models.Friendship.friend_id)
-        .filter(models.Friendship.user_id == current_user.id)
-        .subquery()
-    )
 
-    user_ids = [current_user.id]
-    # We will use subquery directly in filter; no need to materialize user_ids list.
+def leaderboard_query(user_id: int, start_date: date_type, end_date: date_type):
+    friend_ids_subq = select(models.Friendship.friend_id).where(
+        models.Friendship.user_id == user_id
+    )
 
-    points_query = (
-        db.query(
+    return (
+        select(
             models.User.id.label("user_id"),
             models.User.username,
-            func.coalesce(func.sum(models.DailyTaskLog.points_awarded), 0).label(
+            func.coalesce(func.sum(models.UserDailyPoints.points), 0).label(
                 "total_points"
             ),
         )
         .outerjoin(
-            models.DailyTaskLog,
-            (models.DailyTaskLog.user_id == models.User.id)
-            & (models.DailyTaskLog.date >= start_date)
-            & (models.DailyTaskLog.date <= end_date),
+            models.UserDailyPoints,
+            (models.UserDailyPoints.user_id == models.User.id)
+            & (models.UserDailyPoints.date >= start_date)
+            & (models.UserDailyPoints.date <= end_date),
         )
-        .filter(
-            (models.User.id == current_user.id)
+        .where(
+            (models.User.id == user_id)
             | (models.User.id.in_(friend_ids_subq))
         )
         .group_by(models.User.id)
-        .order_by(func.coalesce(func.sum(models.DailyTaskLog.points_awarded), 0).desc())
+        .order_by(
+            func.coalesce(func.sum(models.UserDailyPoints.points), 0).desc(), models.User.id
+        )
+    )
+
+
+def snapshot_leaderboard_query(user_id: int, period: str, start_date: date_type):
+    # Frozen totals of a closed period: one primary-key probe per member
+    friend_ids_subq = select(models.Friendship.friend_id).where(
+        models.Friendship.user_id == user_id
+    )
+    points = func.coalesce(models.PeriodTotal.points, 0)
+
+    return (
+        select(
+            models.User.id.label("user_id"),
+            models.User.username,
+            points.label("total_points"),
+        )
+        .outerjoin(
+            models.PeriodTotal,
+            (models.PeriodTotal.period == period)
+            & (models.PeriodTotal.start_date == start_date)
+            & (models.PeriodTotal.user_id == models.User.id),
+        )
+        .where(
+            (models.User.id == user_id)
+            | (models.User.id.in_(friend_ids_subq))
+        )
+        .order_by(points.desc(), models.User.id)
+    )
+
+
+async def compute_leaderboard(
+    db: AsyncSession,
+    user_id: int,
+    range_key: str,
+    start_date: date_type,
+    end_date: date_type,
+    signature: tuple,
+    ttl_seconds: Optional[float] = None,
+) -> List[schemas.LeaderboardEntry]:
+    # Keyed by the circle signature (conditional.circle_signature) read before
+    # computing, so a write through any process misses the entry, and a body
+    # is never older than the ETag it is served under.
+    cache_key = (user_id, range_key, start_date, signature)
+    cached = cache.leaderboard_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    async def compute() -> List[schemas.LeaderboardEntry]:
+        if await snapshots.builder.is_current(db, range_key, start_date, end_date):
+            query = snapshot_leaderboard_query(user_id, range_key, start_date)
+        else:
+            query = leaderboard_query(user_id, start_date, end_date)
+        rows = (await db.execute(query)).all()
+        entries = [
+            schemas.LeaderboardEntry(
+                user_id=row.user_id, username=row.username, total_points=row.total_points
+            )
+            for row in rows
+        ]
+
+        tags = [cache.points_tag(row.user_id) for row in rows]
+        tags.append(cache.friends_tag(user_id))
+        cache.leaderboard_cache.set(cache_key, entries, tags, ttl_seconds)
+        return entries
+
+    return await cache.leaderboard_flights.run(cache_key, compute)
+
+
+@router.get("", response_model=List[schemas.LeaderboardEntry])
+async def get_leaderboard(
+    request: Request,
+    response: Response,
+    range: str = "weekly",
+    for_date: Optional[date_type] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: auth.Principal = Depends(get_read_principal),
+):
+    ref_date = for_date or date_type.today()
+    start_date, end_date = _get_range_dates(range, ref_date)
+
+    range_key = _range_key(range)
+    after_key = pagination.decode_cursor(after, (int, int)) if after else None
+
+    signature = await conditional.circle_signature(db, current_user.id)
+    etag = conditional.make_etag(
+        "leaderboard", current_user.id, range_key, start_date, limit, after, *signature
+    )
+    if conditional.etag_matches(request, etag):
+        return conditional.not_modified(etag)
+    response.headers.update(conditional.cache_headers(etag))
+
+    entries = await compute_leaderboard(
+        db, current_user.id, range_key, start_date, end_date, signature
+    )
+    if limit is None and after_key is None:
+        return entries
+    return _page(entries, response, limit, after_key)
+
+
+def _page(
+    entries: List[schemas.LeaderboardEntry],
+    response: Response,
+    limit: Optional[int],
+    after: Optional[Tuple[int, int]],
+) -> List[schemas.LeaderboardEntry]:
+    # Entries are ordered by (points desc, user_id asc); the cursor is that
+    # key of the last entry served.
+    start = 0
+    if after is not None:
+        points, user_id = after
+        keys = [(-e.total_points, e.user_id) for e in entries]
+        start = bisect_right(keys, (-points, user_id))
+    stop = len(entries) if limit is None else start + limit
+    page = entries[start:stop]
+    if stop < len(entries) and page:
+        last = page[-1]
+        cursor = pagination.encode_cursor(last.total_points, last.user_id)
+        pagination.set_next_cursor(response, cursor)
+    return page
+
+
+@router.get("/global", response_model=schemas.GlobalLeaderboard)
+async def get_global_leaderboard(
+    range: str = "weekly",
+    for_date: Optional[date_type] = None,
+    limit: int = Query(100, ge=1, le=500),
+    around: int = Query(5, ge=0, le=50),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    ref_date = for_date or date_type.today()
+    start_date, end_date = _get_range_dates(range, ref_date)
+    range_key = _range_key(range)
+
+    index = await global_ranks.get(db, range_key, (start_date, end_date))
+    top = index.entries(1, limit + 1)
+    position = index.position_of(current_user.id)
+    neighbors = index.entries(position - around, position + around + 1)
+    me_points = index.score_of(current_user.id)
+    me_rank = index.rank_of(current_user.id)
+
+    user_ids = {user_id for _, user_id, _ in top + neighbors}
+    user_ids.add(current_user.id)
+    names = dict(
+        (
+            await db.execute(
+                select(models.User.id, models.User.username).where(models.User.id.in_(user_ids))
+            )
+        ).all()
+    )
+
+    def entry(rank: int, user_id: int, points: int) -> schemas.GlobalLeaderboardEntry:
+        return schemas.GlobalLeaderboardEntry(
+            rank=rank, user_id=user_id, username=names.get(user_id, ""), total_points=points
+        )
+
+    return schemas.GlobalLeaderboard(
+        range=range_key,  # type: ignore[arg-type]
+        start_date=start_date,
+        end_date=end_date,
+        total_users=max(global_ranks.total_users or 0, len(index)),
+        ranked_users=len(index),
+        top=[entry(*row) for row in top],
+        me=entry(me_rank, current_user.id, me_points),
+        neighbors=[entry(*row) for row in neighbors],
+    )
+
+
+@router.get("/cache-stats", response_model=schemas.CacheStats)
+async def get_leaderboard_cache_stats(
+    current_user: auth.Principal = Depends(auth.get_current_admin),
+):
+    return schemas.CacheStats(**cache.leaderboard_cache.stats())
+
+
+def _sse(event: str, data: object) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _leaderboard_events(user_id: int, range_key: str) -> AsyncIterator[str]:
+    sub = None
+    try:
+        while True:
+            if sub is None or sub.needs_resync or date_type.today() > sub.period[1]:
+                # (Re)subscribe before reading the snapshot so no delta
+                # committed in between is missed; deltas carry absolute totals.
+                if sub is not None:
+                    hub.unsubscribe(sub)
+                start_date, end_date = _get_range_dates(range_key, date_type.today())
+                async with AsyncSessionLocal() as db:
+                    friend_ids = (
+                        await db.execute(
+                            select(models.Friendship.friend_id).where(
+                                models.Friendship.user_id == user_id
+                            )
+                        )
+                    ).scalars().all()
+                    sub = hub.subscribe(
+                        user_id, range_key, (start_date, end_date), [user_id, *friend_ids]
+                    )
+                    signature = await conditional.circle_signature(db, user_id)
+                    entries = await compute_leaderboard(
+                        db, user_id, range_key, start_date, end_date, signature
+                    )
+                yield _sse(
+                    "snapshot",
+                    {
+                        "range": range_key,
+                        "start_date": start_date,
+                        "end_date": end_date,
+                        "entries": [e.model_dump() for e in entries],
+                    },
+                )
+            try:
+                message = await asyncio.wait_for(
+                    sub.queue.get(), timeout=config.LEADERBOARD_STREAM_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _sse("delta", message)
+    finally:
+        if sub is not None:
+            hub.unsubscribe(sub)
+
+
+@router.post("/stream-ticket", response_model=schemas.StreamTicket)
+async def create_stream_ticket(
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    return schemas.StreamTicket(
+        ticket=auth.create_stream_ticket(current_user),
+        expires_in=config.LEADERBOARD_STREAM_TICKET_SECONDS,
     )
 
-    rows = points_query.all()
-    return [
-        schemas.LeaderboardEntry(
-            user_id=row.user_id, username=row.username, total_points=row.total_points
+
+@router.get("/stream")
+async def stream_leaderboard(
+    request: Request,
+    range: str = "weekly",
+    ticket: Optional[str] = Query(None, description="From POST /stream-ticket"),
+):
+    # EventSource cannot set headers, so browsers pass a stream ticket as
+    # ?ticket=; access tokens are only accepted in the Authorization header,
+    # keeping long-lived credentials out of URLs and access logs.
+    header = request.headers.get("authorization", "")
+    raw_token = header[7:] if header.lower().startswith("bearer ") else None
+    if not ticket and not raw_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-        for row in rows
-    ]
+    # A short-lived session: holding the request session for the lifetime of
+    # the stream would pin a pooled connection per subscriber.
+    async with AsyncSessionLocal() as db:
+        if ticket:
+            principal = await auth.principal_from_token(
+                ticket, db, purpose=auth.STREAM_TICKET_PURPOSE
+            )
+        else:
+            principal = await auth.principal_from_token(raw_token, db)
 
+    return StreamingResponse(
+        _leaderboard_events(principal.id, _range_key(range)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
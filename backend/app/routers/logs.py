@@ -1,54 +1,235 @@
-from fastapi import APIRouter, Depends, HTTPException
+import csv
+import io
+import json
+from datetime import date as date_type
+from typing import AsyncIterator, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import auth, models, schemas
-from ..database import get_db
+from .. import auth, catalog, config, log_writes, models, schemas
+from ..database import AsyncSessionLocal, get_async_db
+from ..replicas import recent_writers
+from ..write_queue import WriteQueue, WriteRejected
 
 router = APIRouter(prefix="/api/daily-logs", tags=["daily-logs"])
 
+EXPORT_COLUMNS = ["date", "task_id", "task_code", "completed", "points_awarded", "updated_at"]
+EXPORT_CHUNK_ROWS = 1000
+
+
+write_queue: Optional[WriteQueue] = (
+    WriteQueue(
+        max_items=config.WRITE_QUEUE_MAX_ITEMS,
+        max_delay=config.WRITE_QUEUE_MAX_DELAY_MS / 1000,
+        on_commit=log_writes.after_commit,
+    )
+    if config.WRITE_QUEUE_ENABLED
+    else None
+)
+
+
+async def _write(
+    db: AsyncSession, writes: List[log_writes.LogWrite]
+) -> List[log_writes.LogWriteResult]:
+    for user_id in {w.user_id for w in writes}:
+        recent_writers.note(user_id)
+    if write_queue is not None:
+        # The writer commits on its own connection; a request parked on the
+        # queue must not keep one checked out or a burst starves the pool.
+        await db.close()
+        try:
+            return await write_queue.submit(writes)
+        except WriteRejected:
+            raise HTTPException(status_code=400, detail="Could not save log")
+
+    tasks = await catalog.get(db)
+    try:
+        outcome = await db.run_sync(log_writes.write_logs, writes, tasks)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Could not save log")
+
+    log_writes.after_commit(outcome)
+    return outcome.results
+
+
+def _to_read(result: log_writes.LogWriteResult) -> schemas.DailyTaskLogRead:
+    return schemas.DailyTaskLogRead(
+        id=result.id,
+        task=schemas.TaskRead.from_orm(result.task),
+        date=result.date,
+        completed=result.completed,
+        points_awarded=result.points_awarded,
+    )
+
 
 @router.post("", response_model=schemas.DailyTaskLogRead)
-def upsert_daily_log(
+async def upsert_daily_log(
     log_in: schemas.DailyTaskLogCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
 ):
-    task = db.query(models.Task).filter(models.Task.id == log_in.task_id).first()
-    if not task or not task.is_active:
-        raise HTTPException(status_code=404, detail="Task not found")
-
-    log = (
-        db.query(models.DailyTaskLog)
-        .filter(
-            models.DailyTaskLog.user_id == current_user.id,
-            models.DailyTaskLog.task_id == log_in.task_id,
-            models.DailyTaskLog.date == log_in.date,
-        )
-        .first()
+    write = log_writes.LogWrite(
+        user_id=current_user.id,
+        task_id=log_in.task_id,
+        date=log_in.date,
+        completed=log_in.completed,
     )
+    result = (await _write(db, [write]))[0]
+    if result.error:
+        raise HTTPException(status_code=404, detail=result.error)
+    return _to_read(result)
 
-    points_awarded = task.points if log_in.completed else 0
 
-    if log:
-        log.completed = log_in.completed
-        log.points_awarded = points_awarded
-    else:
-        log = models.DailyTaskLog(
+@router.post("/batch", response_model=List[schemas.DailyTaskLogBatchResult])
+async def upsert_daily_logs_batch(
+    batch_in: schemas.DailyTaskLogBatch,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    writes = [
+        log_writes.LogWrite(
             user_id=current_user.id,
-            task_id=log_in.task_id,
-            date=log_in.date,
-            completed=log_in.completed,
-            points_awarded=points_awarded,
+            task_id=item.task_id,
+            date=item.date,
+            completed=item.completed,
         )
-        db.add(log)
+        for item in batch_in.items
+    ]
+    results = await _write(db, writes)
+    return [
+        schemas.DailyTaskLogBatchResult(index=i, ok=False, error=result.error)
+        if result.error
+        else schemas.DailyTaskLogBatchResult(index=i, ok=True, log=_to_read(result))
+        for i, result in enumerate(results)
+    ]
 
-    try:
-        db.commit()
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(status_code=400, detail="Could not save log")
 
-    db.refresh(log)
-    return log
+def export_filters(
+    user_id: int,
+    from_date: Optional[date_type],
+    to_date: Optional[date_type],
+    since: Optional[int],
+) -> list:
+    log = models.DailyTaskLog
+    filters = [log.user_id == user_id]
+    if from_date is not None:
+        filters.append(log.date >= from_date)
+    if to_date is not None:
+        filters.append(log.date <= to_date)
+    if since is not None:
+        filters.append(log.log_version > since)
+    return filters
 
+
+def export_query(filters: list):
+    log = models.DailyTaskLog
+    return (
+        select(
+            log.date,
+            log.task_id,
+            models.Task.code.label("task_code"),
+            log.completed,
+            log.points_awarded,
+            log.updated_at,
+        )
+        .join(models.Task, models.Task.id == log.task_id)
+        .where(*filters)
+        .order_by(log.date, log.task_id)
+    )
+
+
+def export_watermark_query(filters: list):
+    return select(func.max(models.DailyTaskLog.log_version)).where(*filters)
+
+
+def _encode_rows(rows, fmt: str) -> str:
+    if fmt == "ndjson":
+        return "".join(
+            json.dumps(
+                {
+                    "date": row.date.isoformat(),
+                    "task_id": row.task_id,
+                    "task_code": row.task_code,
+                    "completed": row.completed,
+                    "points_awarded": row.points_awarded,
+                    "updated_at": row.updated_at.isoformat(),
+                }
+            )
+            + "\n"
+            for row in rows
+        )
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(
+            [
+                row.date.isoformat(),
+                row.task_id,
+                row.task_code,
+                int(row.completed),
+                row.points_awarded,
+                row.updated_at.isoformat(),
+            ]
+        )
+    return buf.getvalue()
+
+
+async def _stream_export(filters: list, fmt: str) -> AsyncIterator[str]:
+    if fmt == "csv":
+        yield ",".join(EXPORT_COLUMNS) + "\r\n"
+
+    stmt = export_query(filters).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    # The request-scoped session may be closed before the body is sent, so
+    # the stream owns its own session and server-side cursor.
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt)
+        async for rows in result.partitions(EXPORT_CHUNK_ROWS):
+            yield _encode_rows(rows, fmt)
+
+
+@router.get("/export")
+async def export_daily_logs(
+    format: Literal["csv", "ndjson"] = "csv",
+    from_date: Optional[date_type] = Query(None, alias="from"),
+    to_date: Optional[date_type] = Query(None, alias="to"),
+    since: Optional[int] = Query(
+        None, description="Only rows changed after this X-Export-Watermark (exclusive)"
+    ),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+):
+    filters = export_filters(current_user.id, from_date, to_date, since)
+
+    # Pin the upper bound so rows written mid-export are left for the next
+    # incremental run; clients pass it back as ?since=.
+    watermark = (
+        await db.execute(export_watermark_query(filters))
+    ).scalar()
+    headers = {
+        "Content-Disposition": f'attachment; filename="daily-logs.{format}"',
+    }
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    if watermark is None:
+        # Nothing matches: answer without a query, keeping the client's
+        # watermark for its next run
+        if since is not None:
+            headers["X-Export-Watermark"] = str(since)
+        body = ",".join(EXPORT_COLUMNS) + "\r\n" if format == "csv" else ""
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    headers["X-Export-Watermark"] = str(watermark)
+    filters.append(models.DailyTaskLog.log_version <= watermark)
+
+    # Hand the connection back before the stream checks out its own;
+    # holding both deadlocks the pool once exports outnumber its size.
+    await db.close()
+
+    return StreamingResponse(
+        _stream_export(filters, format), media_type=media_type, headers=headers
+    )
@@ -1,15 +1,17 @@
 from datetime import date as date_type, timedelta
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import auth, models, schemas
-from ..database import get_db
+from .. import auth, cache, catalog, conditional, models, schemas, streaks
+from ..replicas import get_read_db, get_read_principal
 
 router = APIRouter(prefix="/api/stats", tags=["stats"])
 
+OVERVIEW_DAYS = 365
+
 
 def _get_range_dates(
     range_type: str, ref_date: date_type
@@ -34,46 +36,53 @@ def _get_range_dates(
     return start, end
 
 
+def points_by_date_query(user_id: int, start_date: date_type, end_date: date_type):
+    return (
+        select(models.UserDailyPoints.date, models.UserDailyPoints.points)
+        .where(
+            models.UserDailyPoints.user_id == user_id,
+            models.UserDailyPoints.date >= start_date,
+            models.UserDailyPoints.date <= end_date,
+        )
+        .order_by(models.UserDailyPoints.date)
+    )
+
+
+def overview_logs_query(user_id: int, start_date: date_type, end_date: date_type):
+    log = models.DailyTaskLog
+    return select(log.date, log.task_id, log.points_awarded, log.completed).where(
+        log.user_id == user_id,
+        log.date >= start_date,
+        log.date <= end_date,
+    )
+
+
 @router.get("/summary", response_model=schemas.StatsSummary)
-def get_stats_summary(
+async def get_stats_summary(
+    request: Request,
+    response: Response,
     range: str = "weekly",
     for_date: Optional[date_type] = None,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: auth.Principal = Depends(get_read_principal),
 ):
     ref_date = for_date or date_type.today()
     start_date, end_date = _get_range_dates(range, ref_date)
 
-    total_points = (
-        db.query(func.coalesce(func.sum(models.DailyTaskLog.points_awarded), 0))
-        .filter(
-            models.DailyTaskLog.user_id == current_user.id,
-            models.DailyTaskLog.date >= start_date,
-            models.DailyTaskLog.date <= end_date,
-        )
-        .scalar()
-    )
+    log_version = await conditional.user_log_version(db, current_user.id)
+    etag = conditional.make_etag("stats", current_user.id, range, start_date, log_version)
+    if conditional.etag_matches(request, etag):
+        return conditional.not_modified(etag)
+    response.headers.update(conditional.cache_headers(etag))
 
     by_date_rows = (
-        db.query(
-            models.DailyTaskLog.date,
-            func.coalesce(func.sum(models.DailyTaskLog.points_awarded), 0).label(
-                "points"
-            ),
-        )
-        .filter(
-            models.DailyTaskLog.user_id == current_user.id,
-            models.DailyTaskLog.date >= start_date,
-            models.DailyTaskLog.date <= end_date,
-        )
-        .group_by(models.DailyTaskLog.date)
-        .order_by(models.DailyTaskLog.date)
-        .all()
-    )
+        await db.execute(points_by_date_query(current_user.id, start_date, end_date))
+    ).all()
 
     by_date = [
         schemas.StatsByDate(date=row.date, points=row.points) for row in by_date_rows
     ]
+    total_points = sum(row.points for row in by_date_rows)
 
     return schemas.StatsSummary(
         range=range,  # type: ignore[arg-type]
@@ -83,3 +92,146 @@ def get_stats_summary(
         by_date=by_date,
     )
 
+
+def _streak(summary: Optional[streaks.Summary], today: date_type) -> dict:
+    current = streaks.current_length(summary, today)
+    return {
+        "current": current,
+        "longest": summary.longest if summary is not None else 0,
+        "current_start": summary.last_start if current else None,
+    }
+
+
+@router.get("/streaks", response_model=schemas.Streaks)
+async def get_streaks(
+    request: Request,
+    response: Response,
+    for_date: Optional[date_type] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: auth.Principal = Depends(get_read_principal),
+):
+    today = for_date or date_type.today()
+
+    log_version = await conditional.user_log_version(db, current_user.id)
+    etag = conditional.make_etag("streaks", current_user.id, today, log_version)
+    if conditional.etag_matches(request, etag):
+        return conditional.not_modified(etag)
+    response.headers.update(conditional.cache_headers(etag))
+
+    rows = (await db.execute(streaks.user_streaks_query(current_user.id))).all()
+    by_task = {
+        row.task_id: streaks.Summary(row.last_start, row.last_end, row.longest) for row in rows
+    }
+    tasks = await catalog.get(db)
+    return schemas.Streaks(
+        as_of=today,
+        overall=schemas.Streak(**_streak(by_task.get(streaks.ANY_TASK), today)),
+        tasks=[
+            schemas.TaskStreak(
+                task_id=task.id, task_code=task.code, **_streak(by_task.get(task.id), today)
+            )
+            for task in tasks.active
+        ],
+    )
+
+
+def overview_periods(ref_date: date_type, days: int) -> Dict[str, Tuple[date_type, date_type]]:
+    periods = {name: _get_range_dates(name, ref_date) for name in ("daily", "weekly", "monthly")}
+    periods["heatmap"] = (ref_date - timedelta(days=days - 1), ref_date)
+    return periods
+
+
+async def compute_overview(
+    db: AsyncSession,
+    user_id: int,
+    ref_date: date_type,
+    days: int,
+    tasks: catalog.TaskCatalog,
+    log_version: int,
+    ttl_seconds: Optional[float] = None,
+) -> schemas.StatsOverview:
+    # Keyed by the versions in the ETag: a write from any process makes the
+    # entry unreachable instead of stale, so no invalidation is needed
+    cache_key = (user_id, ref_date, days, log_version, tasks.version)
+    cached = cache.stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    async def compute() -> schemas.StatsOverview:
+        overview = await _overview(db, user_id, ref_date, days, tasks)
+        cache.stats_cache.set(cache_key, overview, (), ttl_seconds)
+        return overview
+
+    return await cache.stats_flights.run(cache_key, compute)
+
+
+async def _overview(
+    db: AsyncSession, user_id: int, ref_date: date_type, days: int, tasks: catalog.TaskCatalog
+) -> schemas.StatsOverview:
+    periods = overview_periods(ref_date, days)
+    # One window covering every range: read once, then slice per range
+    start = min(first for first, _ in periods.values())
+    end = max(last for _, last in periods.values())
+
+    width = (end - start).days + 1
+    points = [0] * width
+    completed: Dict[int, bytearray] = {task.id: bytearray(width) for task in tasks.active}
+    for row in await db.execute(overview_logs_query(user_id, start, end)):
+        i = (row.date - start).days
+        points[i] += row.points_awarded
+        if row.completed and row.task_id in completed:
+            completed[row.task_id][i] = 1
+
+    def range_stats(first: date_type, last: date_type) -> schemas.RangeStats:
+        lo, hi = (first - start).days, (last - start).days + 1
+        # Rates only count days that have happened
+        elapsed_hi = min(hi, (ref_date - start).days + 1)
+        elapsed = max(0, elapsed_hi - lo)
+        series = points[lo:hi]
+        task_rates: List[schemas.TaskCompletion] = []
+        for task in tasks.active:
+            done = sum(completed[task.id][lo:elapsed_hi])
+            task_rates.append(
+                schemas.TaskCompletion(
+                    task_id=task.id,
+                    task_code=task.code,
+                    completed_days=done,
+                    rate=round(done / elapsed, 4) if elapsed else 0.0,
+                )
+            )
+        return schemas.RangeStats(
+            start_date=first,
+            end_date=last,
+            total_points=sum(series),
+            points=series,
+            tasks=task_rates,
+        )
+
+    return schemas.StatsOverview(
+        as_of=ref_date, **{name: range_stats(*period) for name, period in periods.items()}
+    )
+
+
+@router.get("/overview", response_model=schemas.StatsOverview)
+async def get_stats_overview(
+    request: Request,
+    response: Response,
+    for_date: Optional[date_type] = None,
+    days: int = Query(
+        OVERVIEW_DAYS, ge=7, le=366, description="length of the heatmap, ending on for_date"
+    ),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: auth.Principal = Depends(get_read_principal),
+):
+    ref_date = for_date or date_type.today()
+
+    tasks = await catalog.get(db)
+    log_version = await conditional.user_log_version(db, current_user.id)
+    etag = conditional.make_etag(
+        "stats-overview", current_user.id, ref_date, days, log_version, tasks.version
+    )
+    if conditional.etag_matches(request, etag):
+        return conditional.not_modified(etag)
+    response.headers.update(conditional.cache_headers(etag))
+
+    return await compute_overview(db, current_user.id, ref_date, days, tasks, log_version)
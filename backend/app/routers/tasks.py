@@ -1,50 +1,63 @@
 from datetime import date as date_type
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import auth, models, schemas
-from ..database import get_db
+from .. import auth, catalog, conditional, models, schemas
+from ..replicas import get_read_db, get_read_principal
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
 
 @router.get("", response_model=List[schemas.TaskRead])
-def list_tasks(
+async def list_tasks(
+    request: Request,
+    response: Response,
     include_inactive: bool = False,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: auth.Principal = Depends(get_read_principal),
 ):
-    query = db.query(models.Task)
-    if not include_inactive:
-        query = query.filter(models.Task.is_active.is_(True))
-    return query.order_by(models.Task.id).all()
+    tasks = await catalog.get(db)
+    etag = conditional.make_etag("tasks", tasks.version, include_inactive)
+    if conditional.etag_matches(request, etag):
+        return conditional.not_modified(etag)
+    response.headers.update(conditional.cache_headers(etag))
+    return tasks.tasks if include_inactive else tasks.active
+
+
+def daily_logs_query(user_id: int, target_date: date_type):
+    return select(models.DailyTaskLog).where(
+        models.DailyTaskLog.user_id == user_id,
+        models.DailyTaskLog.date == target_date,
+    )
 
 
 @router.get("/daily", response_model=List[schemas.DailyTaskWithStatus])
-def get_daily_tasks(
+async def get_daily_tasks(
+    request: Request,
+    response: Response,
     for_date: Optional[date_type] = None,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: auth.Principal = Depends(get_read_principal),
 ):
     target_date = for_date or date_type.today()
 
-    tasks = (
-        db.query(models.Task)
-        .filter(models.Task.is_active.is_(True))
-        .order_by(models.Task.id)
-        .all()
+    task_catalog = await catalog.get(db)
+    log_version = await conditional.user_log_version(db, current_user.id)
+    etag = conditional.make_etag(
+        "daily", current_user.id, target_date, task_catalog.version, log_version
     )
+    if conditional.etag_matches(request, etag):
+        return conditional.not_modified(etag)
+    response.headers.update(conditional.cache_headers(etag))
+
+    tasks = task_catalog.active
 
     logs = (
-        db.query(models.DailyTaskLog)
-        .filter(
-            models.DailyTaskLog.user_id == current_user.id,
-            models.DailyTaskLog.date == target_date,
-        )
-        .all()
-    )
+        await db.execute(daily_logs_query(current_user.id, target_date))
+    ).scalars().all()
     logs_by_task_id = {log.task_id: log for log in logs}
 
     result: List[schemas.DailyTaskWithStatus] = []
@@ -61,4 +74,3 @@ def get_daily_tasks(
             )
         )
     return result
-
@@ -0,0 +1,56 @@
+from itertools import islice
+from typing import List, Set
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import auth, models, schemas
+from ..replicas import get_read_db, get_read_principal
+from ..user_index import user_index
+
+router = APIRouter(prefix="/api/users", tags=["users"])
+
+
+def searchable_among_query(user_id: int, candidate_ids: List[int]):
+    # The index may still hold users deactivated since it was built
+    friends = select(models.Friendship.id).where(
+        models.Friendship.user_id == user_id,
+        models.Friendship.friend_id == models.User.id,
+    )
+    return select(models.User.id).where(
+        models.User.id.in_(candidate_ids),
+        models.User.is_active.is_(True),
+        ~friends.exists(),
+    )
+
+
+@router.get("/search", response_model=List[schemas.UserSearchResult])
+async def search_users(
+    prefix: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: auth.Principal = Depends(get_read_principal),
+):
+    await user_index.ensure_current()
+
+    # Check candidates against the caller's friendships a batch at a time,
+    # so the cost follows the page size rather than the size of the circle
+    matches = user_index.matches(prefix)
+    results: List[schemas.UserSearchResult] = []
+    seen: Set[int] = {current_user.id}
+    while len(results) < limit:
+        batch = [(i, name) for i, name in islice(matches, 2 * limit) if i not in seen]
+        if not batch:
+            break
+        seen.update(i for i, _ in batch)
+        searchable = set(
+            (await db.execute(searchable_among_query(current_user.id, [i for i, _ in batch])))
+            .scalars()
+        )
+        results.extend(
+            schemas.UserSearchResult(id=i, username=name)
+            for i, name in batch
+            if i in searchable
+        )
+    return results[:limit]
@@ -1,7 +1,7 @@
 from datetime import date, datetime
 from typing import List, Literal, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 
 # User schemas
@@ -24,6 +24,11 @@ class UserRead(UserBase):
         from_attributes = True
 
 
+class UserSearchResult(BaseModel):
+    id: int
+    username: str
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -70,6 +75,17 @@ class DailyTaskLogRead(BaseModel):
         from_attributes = True
 
 
+class DailyTaskLogBatch(BaseModel):
+    items: List[DailyTaskLogCreate] = Field(..., min_length=1, max_length=500)
+
+
+class DailyTaskLogBatchResult(BaseModel):
+    index: int
+    ok: bool
+    log: Optional[DailyTaskLogRead] = None
+    error: Optional[str] = None
+
+
 class DailyTaskWithStatus(BaseModel):
     task: TaskRead
     date: date
@@ -97,6 +113,13 @@ class FriendshipRead(BaseModel):
         from_attributes = True
 
 
+class FriendSuggestion(BaseModel):
+    id: int
+    username: str
+    # How many of the caller's friends have them as a friend
+    mutual_friends: int
+
+
 class FriendshipCreate(BaseModel):
     friend_username: str
 
@@ -107,6 +130,39 @@ class LeaderboardEntry(BaseModel):
     total_points: int
 
 
+class GlobalLeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: str
+    total_points: int
+
+
+class GlobalLeaderboard(BaseModel):
+    range: Literal["daily", "weekly", "monthly"]
+    start_date: date
+    end_date: date
+    total_users: int
+    ranked_users: int
+    top: List[GlobalLeaderboardEntry]
+    me: GlobalLeaderboardEntry
+    neighbors: List[GlobalLeaderboardEntry]
+
+
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int
+
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+
+
 # Stats
 
 
@@ -122,3 +178,72 @@ class StatsSummary(BaseModel):
     total_points: int
     by_date: List[StatsByDate]
 
+
+class TaskCompletion(BaseModel):
+    task_id: int
+    task_code: str
+    completed_days: int
+    # completed_days over the days of the range up to as_of
+    rate: float
+
+
+class RangeStats(BaseModel):
+    start_date: date
+    end_date: date
+    total_points: int
+    # One entry per day from start_date to end_date, zero-filled
+    points: List[int]
+    tasks: List[TaskCompletion]
+
+
+class StatsOverview(BaseModel):
+    as_of: date
+    daily: RangeStats
+    weekly: RangeStats
+    monthly: RangeStats
+    heatmap: RangeStats
+
+
+class Streak(BaseModel):
+    current: int
+    longest: int
+    current_start: Optional[date] = None
+
+
+class TaskStreak(Streak):
+    task_id: int
+    task_code: str
+
+
+class Streaks(BaseModel):
+    as_of: date
+    overall: Streak
+    tasks: List[TaskStreak]
+
+
+# Admin
+
+
+class RepriceRequest(BaseModel):
+    points: Optional[int] = Field(None, ge=0)
+    is_active: Optional[bool] = None
+
+
+class RepriceJobRead(BaseModel):
+    id: int
+    task_id: int
+    points: int
+    is_active: bool
+    status: Literal["running", "done", "failed", "superseded"]
+    last_log_id: int
+    max_log_id: Optional[int] = None
+    scanned: int
+    changed: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+    # Share of the log id range covered, and the time left at the current pace
+    progress: float
+    eta_seconds: Optional[float] = None
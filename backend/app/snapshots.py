@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import date as date_type, datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, delete, func, insert, literal, or_, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import config, models
+from .database import dialect_insert, engine
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS = models.PeriodSnapshot.__table__
+TOTALS = models.PeriodTotal.__table__
+UDP = models.UserDailyPoints.__table__
+
+# Daily totals already are the rollup rows, so only longer periods are frozen
+PERIODS = ("weekly", "monthly")
+
+Key = Tuple[str, date_type]
+
+
+def period_bounds(period: str, day: date_type) -> Tuple[date_type, date_type]:
+    if period == "weekly":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    start = day.replace(day=1)
+    if start.month == 12:
+        next_month = start.replace(year=start.year + 1, month=1)
+    else:
+        next_month = start.replace(month=start.month + 1)
+    return start, next_month - timedelta(days=1)
+
+
+def is_frozen(end_date: date_type, today: Optional[date_type] = None) -> bool:
+    """Whether a period ending on ``end_date`` is served from its snapshot."""
+    today = today or date_type.today()
+    return (today - end_date).days > config.SNAPSHOT_GRACE_DAYS
+
+
+def _key_filter(table, period: str, start_date: date_type):
+    return and_(table.c.period == period, table.c.start_date == start_date)
+
+
+def state_query(period: str, start_date: date_type):
+    return select(SNAPSHOTS.c.version, SNAPSHOTS.c.built_version).where(
+        _key_filter(SNAPSHOTS, period, start_date)
+    )
+
+
+def mark_dirty(db: Session, days: Iterable[date_type]) -> None:
+    """Bump the version of every snapshot covering one of ``days``.
+
+    Called in the caller's write transaction; days in periods that have not
+    ended cannot have a snapshot and cost nothing.
+    """
+    today = date_type.today()
+    keys: Set[Key] = set()
+    for day in days:
+        for period in PERIODS:
+            start, end = period_bounds(period, day)
+            if end < today:
+                keys.add((period, start))
+    if not keys:
+        return
+    db.execute(
+        update(SNAPSHOTS)
+        .where(or_(*(_key_filter(SNAPSHOTS, period, start) for period, start in sorted(keys))))
+        .values(version=SNAPSHOTS.c.version + 1)
+    )
+
+
+def build(period: str, start_date: date_type) -> bool:
+    """Recompute one period's totals from the rollup unless already current.
+
+    Returns whether it rebuilt. Writes that commit after the version is read
+    leave the snapshot dirty again, so a racing write is never lost.
+    """
+    _, end_date = period_bounds(period, start_date)
+    key = _key_filter(SNAPSHOTS, period, start_date)
+    with engine.begin() as conn:
+        values = {"period": period, "start_date": start_date, "end_date": end_date, "version": 0}
+        insert_for_dialect = dialect_insert(conn.dialect.name)
+        if insert_for_dialect is not None:
+            conn.execute(
+                insert_for_dialect(SNAPSHOTS)
+                .values(**values)
+                .on_conflict_do_nothing(index_elements=[SNAPSHOTS.c.period, SNAPSHOTS.c.start_date])
+            )
+        elif conn.execute(state_query(period, start_date)).first() is None:
+            conn.execute(insert(SNAPSHOTS).values(**values))
+
+        version, built_version = conn.execute(state_query(period, start_date)).one()
+        if built_version == version:
+            return False
+        conn.execute(delete(TOTALS).where(_key_filter(TOTALS, period, start_date)))
+        total = func.sum(UDP.c.points)
+        conn.execute(
+            insert(TOTALS).from_select(
+                ["period", "start_date", "user_id", "points"],
+                select(literal(period), literal(start_date), UDP.c.user_id, total)
+                .where(UDP.c.date >= start_date, UDP.c.date <= end_date)
+                .group_by(UDP.c.user_id)
+                .having(total != 0),
+            )
+        )
+        conn.execute(
+            update(SNAPSHOTS).where(key).values(built_version=version, built_at=datetime.utcnow())
+        )
+    return True
+
+
+class SnapshotBuilder:
+    """Builds missing or dirty snapshots in the background, once per period
+    at a time; until one is current its period is read from the rollup."""
+
+    def __init__(self) -> None:
+        self._building: Set[Key] = set()
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    async def is_current(
+        self, db: AsyncSession, period: str, start_date: date_type, end_date: date_type
+    ) -> bool:
+        if period not in PERIODS or not is_frozen(end_date):
+            return False
+        row = (await db.execute(state_query(period, start_date))).first()
+        if row is not None and row.built_version == row.version:
+            return True
+        self.schedule(period, start_date)
+        return False
+
+    def schedule(self, period: str, start_date: date_type) -> None:
+        key = (period, start_date)
+        if key in self._building:
+            return
+        self._building.add(key)
+        task = asyncio.get_running_loop().create_task(self._build(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _build(self, key: Key) -> None:
+        try:
+            await asyncio.to_thread(build, *key)
+        except Exception:
+            logger.exception("snapshot build failed for %s %s", *key)
+        finally:
+            self._building.discard(key)
+
+
+builder = SnapshotBuilder()
+
+
+def stale_periods(conn: Connection, today: date_type) -> Iterator[Key]:
+    """Frozen periods with logged points whose snapshot is missing or dirty."""
+    first_day = conn.execute(select(func.min(UDP.c.date))).scalar()
+    if first_day is None:
+        return
+    current = {
+        (row.period, row.start_date): row.version == row.built_version
+        for row in conn.execute(
+            select(
+                SNAPSHOTS.c.period,
+                SNAPSHOTS.c.start_date,
+                SNAPSHOTS.c.version,
+                SNAPSHOTS.c.built_version,
+            )
+        )
+    }
+    for period in PERIODS:
+        start, end = period_bounds(period, first_day)
+        while is_frozen(end, today):
+            if not current.get((period, start), False):
+                yield period, start
+            start, end = period_bounds(period, end + timedelta(days=1))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.snapshots",
+        description="List or build missing and dirty weekly/monthly period snapshots.",
+    )
+    parser.add_argument("command", choices=["status", "close"])
+    parser.add_argument(
+        "--today",
+        type=date_type.fromisoformat,
+        default=date_type.today(),
+        help="close periods as of this date (default today)",
+    )
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine, tables=[SNAPSHOTS, TOTALS])
+
+    with engine.connect() as conn:
+        stale = list(stale_periods(conn, args.today))
+    for period, start in stale:
+        print(f"{period} {start}")
+    print(f"{len(stale)} missing or dirty snapshots")
+
+    if args.command == "close":
+        for period, start in stale:
+            build(period, start)
+        print(f"built {len(stale)} snapshots")
+        return 0
+    return 1 if stale else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
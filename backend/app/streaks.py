@@ -0,0 +1,493 @@
+import argparse
+import sys
+from datetime import date as date_type, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import engine
+
+RUNS = models.StreakRun.__table__
+SUMMARY = models.UserStreak.__table__
+
+# task_id of the per-user streak: a day counts if any task was completed
+ANY_TASK = 0
+ONE_DAY = timedelta(days=1)
+_INSERT_CHUNK = 1000
+
+Run = Tuple[date_type, date_type]  # first and last day, inclusive
+Key = Tuple[int, int]  # (user_id, task_id)
+DayChange = Tuple[int, int, date_type, bool]  # user_id, task_id, day, completed
+
+
+class Summary(NamedTuple):
+    last_start: date_type
+    last_end: date_type
+    longest: int
+
+
+class Drift(NamedTuple):
+    table: str
+    key: tuple
+    expected: Optional[tuple]
+    actual: Optional[tuple]
+
+
+def run_length(run: Run) -> int:
+    return (run[1] - run[0]).days + 1
+
+
+def toggle(runs: List[Run], day: date_type, completed: bool) -> List[Run]:
+    """The runs after marking ``day`` completed or not.
+
+    ``runs`` are sorted and disjoint. Completing a day can extend a run or
+    bridge two into one; clearing one can shorten a run or split it.
+    """
+    out: List[Run] = []
+    if completed:
+        start = end = day
+        for s, e in runs:
+            if e + ONE_DAY < day or s - ONE_DAY > day:
+                out.append((s, e))
+            else:
+                start, end = min(start, s), max(end, e)
+        out.append((start, end))
+        out.sort()
+        return out
+    for s, e in runs:
+        if s <= day <= e:
+            if s < day:
+                out.append((s, day - ONE_DAY))
+            if day < e:
+                out.append((day + ONE_DAY, e))
+        else:
+            out.append((s, e))
+    return out
+
+
+def runs_from_days(days: Iterable[date_type]) -> List[Run]:
+    """Collapse ascending days into runs of consecutive days."""
+    runs: List[Run] = []
+    for day in days:
+        if runs and runs[-1][1] + ONE_DAY >= day:
+            if day > runs[-1][1]:
+                runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+def touching_runs_query(user_id: int, task_id: int, first: date_type, last: date_type):
+    # Runs that can touch [first - 1, last + 1]: those starting inside it and
+    # the last one starting before it. Both are primary-key seeks, so a
+    # back-dated edit does not read the whole history.
+    lo, hi = first - ONE_DAY, last + ONE_DAY
+    previous = (
+        select(RUNS.c.start_date)
+        .where(RUNS.c.user_id == user_id, RUNS.c.task_id == task_id, RUNS.c.start_date < lo)
+        .order_by(RUNS.c.start_date.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return (
+        select(RUNS.c.start_date, RUNS.c.end_date)
+        .where(
+            RUNS.c.user_id == user_id,
+            RUNS.c.task_id == task_id,
+            RUNS.c.start_date >= func.coalesce(previous, lo),
+            RUNS.c.start_date <= hi,
+        )
+        .order_by(RUNS.c.start_date)
+    )
+
+
+def user_streaks_query(user_id: int):
+    return select(
+        SUMMARY.c.task_id, SUMMARY.c.last_start, SUMMARY.c.last_end, SUMMARY.c.longest
+    ).where(SUMMARY.c.user_id == user_id)
+
+
+def _key_filter(table, key: Key) -> tuple:
+    return (table.c.user_id == key[0], table.c.task_id == key[1])
+
+
+def _seek_last(db: Session, key: Key) -> Optional[Run]:
+    row = db.execute(
+        select(RUNS.c.start_date, RUNS.c.end_date)
+        .where(*_key_filter(RUNS, key))
+        .order_by(RUNS.c.start_date.desc())
+        .limit(1)
+    ).first()
+    return (row.start_date, row.end_date) if row is not None else None
+
+
+def _seek_longest(db: Session, key: Key) -> int:
+    return db.execute(
+        select(RUNS.c.length)
+        .where(*_key_filter(RUNS, key))
+        .order_by(RUNS.c.length.desc())
+        .limit(1)
+    ).scalar() or 0
+
+
+def _next_summary(
+    db: Session,
+    key: Key,
+    old: Optional[Summary],
+    after: List[Run],
+    removed: List[Run],
+    added: List[Run],
+    last_day: date_type,
+) -> Optional[Summary]:
+    # Runs starting after the loaded window were not touched
+    if old is not None and old.last_start > last_day + ONE_DAY:
+        last: Optional[Run] = (old.last_start, old.last_end)
+    elif after:
+        last = after[-1]
+    else:
+        last = _seek_last(db, key)
+    if last is None:
+        return None
+
+    old_longest = old.longest if old is not None else 0
+    longest = max((run_length(run) for run in added), default=0)
+    if longest < old_longest:
+        if any(run_length(run) == old_longest for run in removed):
+            # The longest run was cut short; another may now be longest
+            longest = _seek_longest(db, key)
+        else:
+            longest = old_longest
+    return Summary(last[0], last[1], longest)
+
+
+def _apply_key(
+    db: Session, key: Key, days: Dict[date_type, bool], old: Optional[Summary]
+) -> None:
+    first, last = min(days), max(days)
+    before = [tuple(row) for row in db.execute(touching_runs_query(*key, first, last))]
+    after = before
+    for day in sorted(days):
+        after = toggle(after, day, days[day])
+    removed = [run for run in before if run not in after]
+    added = [run for run in after if run not in before]
+    if not removed and not added:
+        return
+
+    if removed:
+        db.execute(
+            delete(RUNS).where(
+                *_key_filter(RUNS, key), RUNS.c.start_date.in_([s for s, _ in removed])
+            )
+        )
+    if added:
+        db.execute(
+            insert(RUNS),
+            [
+                {
+                    "user_id": key[0],
+                    "task_id": key[1],
+                    "start_date": s,
+                    "end_date": e,
+                    "length": run_length((s, e)),
+                }
+                for s, e in added
+            ],
+        )
+
+    summary = _next_summary(db, key, old, after, removed, added, last)
+    if summary == old:
+        return
+    if summary is None:
+        db.execute(delete(SUMMARY).where(*_key_filter(SUMMARY, key)))
+    elif old is None:
+        db.execute(insert(SUMMARY).values(user_id=key[0], task_id=key[1], **summary._asdict()))
+    else:
+        db.execute(
+            update(SUMMARY).where(*_key_filter(SUMMARY, key)).values(**summary._asdict())
+        )
+
+
+def apply_changes(db: Session, changes: Iterable[DayChange]) -> None:
+    """Fold days that became completed or not into the stored runs.
+
+    Runs inside the caller's transaction, which must already hold the
+    users' write lock (log_writes.bump_log_versions) from before it read
+    the logs the changes were derived from; otherwise two writers can fold
+    the same change in twice. The caller commits.
+    """
+    by_key: Dict[Key, Dict[date_type, bool]] = {}
+    for user_id, task_id, day, completed in changes:
+        by_key.setdefault((user_id, task_id), {})[day] = completed
+    if not by_key:
+        return
+
+    summaries: Dict[Key, Summary] = {}
+    user_ids = sorted({user_id for user_id, _ in by_key})
+    for row in db.execute(
+        select(SUMMARY).where(SUMMARY.c.user_id.in_(user_ids))
+    ):
+        summaries[(row.user_id, row.task_id)] = Summary(
+            row.last_start, row.last_end, row.longest
+        )
+    for key, days in by_key.items():
+        _apply_key(db, key, days, summaries.get(key))
+
+
+def current_length(summary: Optional[Summary], today: date_type) -> int:
+    # A run still counts as current until a full day has been missed
+    if summary is None or summary.last_start > today or summary.last_end < today - ONE_DAY:
+        return 0
+    return run_length((summary.last_start, min(summary.last_end, today)))
+
+
+def _completed_days_select():
+    log = models.DailyTaskLog
+    return (
+        select(log.user_id, log.date, log.task_id)
+        .where(log.completed.is_(True))
+        .order_by(log.user_id, log.date, log.task_id)
+    )
+
+
+def _stream(conn: Connection, stmt) -> Iterator[Tuple]:
+    result = conn.execution_options(stream_results=True, yield_per=1000).execute(stmt)
+    for row in result:
+        yield tuple(row)
+
+
+def expected_runs(conn: Connection) -> Iterator[Tuple[int, int, date_type, date_type]]:
+    """Every run implied by daily_task_logs, ordered by (user, task, start).
+
+    One streaming pass over completed logs in (user, date) order; only the
+    current user's days are held in memory.
+    """
+
+    def flush(user_id: int, days_by_task: Dict[int, List[date_type]]):
+        for task_id in sorted(days_by_task):
+            for start, end in runs_from_days(days_by_task[task_id]):
+                yield user_id, task_id, start, end
+
+    current: Optional[int] = None
+    days_by_task: Dict[int, List[date_type]] = {}
+    for user_id, day, task_id in _stream(conn, _completed_days_select()):
+        if user_id != current:
+            if current is not None:
+                yield from flush(current, days_by_task)
+            current, days_by_task = user_id, {}
+        days_by_task.setdefault(task_id, []).append(day)
+        any_days = days_by_task.setdefault(ANY_TASK, [])
+        if not any_days or any_days[-1] != day:
+            any_days.append(day)
+    if current is not None:
+        yield from flush(current, days_by_task)
+
+
+def runs_day_by_day(days: Iterable[date_type]) -> List[Run]:
+    """Runs found by walking every calendar day from the first to the last.
+
+    Deliberately naive and sharing nothing with runs_from_days or toggle(),
+    so verify can catch a bug in either.
+    """
+    completed = set(days)
+    runs: List[Run] = []
+    if not completed:
+        return runs
+    day, last = min(completed), max(completed)
+    start: Optional[date_type] = None
+    while day <= last + ONE_DAY:
+        if day in completed:
+            if start is None:
+                start = day
+        elif start is not None:
+            runs.append((start, day - ONE_DAY))
+            start = None
+        day += ONE_DAY
+    return runs
+
+
+def _naive_streaks(conn: Connection) -> Iterator[Tuple[int, int, List[Run]]]:
+    """(user, task, runs) in key order, recomputed day by day for verify."""
+    current: Optional[int] = None
+    days_by_task: Dict[int, Set[date_type]] = {}
+    for user_id, day, task_id in _stream(conn, _completed_days_select()):
+        if user_id != current:
+            if current is not None:
+                for key_task in sorted(days_by_task):
+                    yield current, key_task, runs_day_by_day(days_by_task[key_task])
+            current, days_by_task = user_id, {}
+        days_by_task.setdefault(task_id, set()).add(day)
+        days_by_task.setdefault(ANY_TASK, set()).add(day)
+    if current is not None:
+        for key_task in sorted(days_by_task):
+            yield current, key_task, runs_day_by_day(days_by_task[key_task])
+
+
+def summaries_from_runs(
+    runs: Iterable[Tuple[int, int, date_type, date_type]]
+) -> Iterator[Tuple[int, int, date_type, date_type, int]]:
+    """(user, task, last_start, last_end, longest) from runs in key order."""
+    key: Optional[Key] = None
+    last: Optional[Run] = None
+    longest = 0
+    for user_id, task_id, start, end in runs:
+        if (user_id, task_id) != key:
+            if key is not None:
+                yield (*key, last[0], last[1], longest)
+            key, longest = (user_id, task_id), 0
+        last = (start, end)
+        longest = max(longest, run_length(last))
+    if key is not None:
+        yield (*key, last[0], last[1], longest)
+
+
+def _stored_runs(conn: Connection) -> Iterator[Tuple]:
+    return _stream(
+        conn,
+        select(RUNS.c.user_id, RUNS.c.task_id, RUNS.c.start_date, RUNS.c.end_date).order_by(
+            RUNS.c.user_id, RUNS.c.task_id, RUNS.c.start_date
+        ),
+    )
+
+
+def _stored_summaries(conn: Connection) -> Iterator[Tuple]:
+    return _stream(
+        conn,
+        select(
+            SUMMARY.c.user_id,
+            SUMMARY.c.task_id,
+            SUMMARY.c.last_start,
+            SUMMARY.c.last_end,
+            SUMMARY.c.longest,
+        ).order_by(SUMMARY.c.user_id, SUMMARY.c.task_id),
+    )
+
+
+def _merge(
+    table: str, key_len: int, expected: Iterator[Tuple], actual: Iterator[Tuple]
+) -> Iterator[Drift]:
+    exp = next(expected, None)
+    act = next(actual, None)
+    while exp is not None or act is not None:
+        if act is None or (exp is not None and exp[:key_len] < act[:key_len]):
+            yield Drift(table, exp[:key_len], exp[key_len:], None)
+            exp = next(expected, None)
+        elif exp is None or act[:key_len] < exp[:key_len]:
+            yield Drift(table, act[:key_len], None, act[key_len:])
+            act = next(actual, None)
+        else:
+            if exp != act:
+                yield Drift(table, exp[:key_len], exp[key_len:], act[key_len:])
+            exp = next(expected, None)
+            act = next(actual, None)
+
+
+def find_drift() -> Iterator[Drift]:
+    # Merge-join runs recomputed day by day against the stored ones, then
+    # the same for summaries, so memory stays flat however many users there
+    # are. The expected side shares no code with the incremental path or
+    # rebuild().
+    with engine.connect() as expected_conn, engine.connect() as actual_conn:
+        expected = (
+            (user_id, task_id, start, end)
+            for user_id, task_id, runs in _naive_streaks(expected_conn)
+            for start, end in runs
+        )
+        yield from _merge("streak_runs", 3, expected, _stored_runs(actual_conn))
+        expected_summaries = (
+            (user_id, task_id, runs[-1][0], runs[-1][1], max(map(run_length, runs)))
+            for user_id, task_id, runs in _naive_streaks(expected_conn)
+        )
+        yield from _merge(
+            "user_streaks", 2, expected_summaries, _stored_summaries(actual_conn)
+        )
+
+
+def rebuild() -> None:
+    with engine.begin() as conn:
+        conn.execute(delete(RUNS))
+        conn.execute(delete(SUMMARY))
+        runs: List[dict] = []
+        summaries: List[dict] = []
+
+        def flush() -> None:
+            if runs:
+                conn.execute(insert(RUNS), runs)
+                runs.clear()
+            if summaries:
+                conn.execute(insert(SUMMARY), summaries)
+                summaries.clear()
+
+        def collect() -> Iterator[Tuple[int, int, date_type, date_type]]:
+            for user_id, task_id, start, end in expected_runs(conn):
+                runs.append(
+                    {
+                        "user_id": user_id,
+                        "task_id": task_id,
+                        "start_date": start,
+                        "end_date": end,
+                        "length": run_length((start, end)),
+                    }
+                )
+                yield user_id, task_id, start, end
+
+        for user_id, task_id, last_start, last_end, longest in summaries_from_runs(collect()):
+            summaries.append(
+                {
+                    "user_id": user_id,
+                    "task_id": task_id,
+                    "last_start": last_start,
+                    "last_end": last_end,
+                    "longest": longest,
+                }
+            )
+            if len(runs) >= _INSERT_CHUNK:
+                flush()
+        flush()
+
+
+def is_empty_with_logs(db: Session) -> bool:
+    if db.execute(select(SUMMARY.c.user_id).limit(1)).first() is not None:
+        return False
+    log = models.DailyTaskLog
+    return db.execute(select(log.id).where(log.completed.is_(True)).limit(1)).first() is not None
+
+
+def _format(values: Optional[tuple]) -> str:
+    return "missing" if values is None else ", ".join(str(v) for v in values)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.streaks",
+        description="Verify or rebuild streak_runs and user_streaks from daily_task_logs.",
+    )
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument(
+        "--limit", type=int, default=50, help="max drifted rows to print (default 50)"
+    )
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine, tables=[RUNS, SUMMARY])
+
+    drift_count = 0
+    for d in find_drift():
+        drift_count += 1
+        if drift_count <= args.limit:
+            print(
+                f"{d.table} key=({_format(d.key)}) "
+                f"expected=({_format(d.expected)}) actual=({_format(d.actual)})"
+            )
+    print(f"{drift_count} drifted streak rows")
+
+    if args.command == "rebuild":
+        rebuild()
+        print("streaks rebuilt from daily_task_logs")
+        return 0
+    return 1 if drift_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
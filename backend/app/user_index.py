@@ -0,0 +1,136 @@
+import asyncio
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from . import config, models
+from .database import AsyncSessionLocal
+
+
+def users_after_query(user_id: int):
+    users = models.User
+    return select(users.id, users.username, users.is_active).where(users.id > user_id)
+
+
+class UsernameIndex:
+    """Active users' names in case-folded sorted order, for prefix search.
+
+    The names matching a prefix are one contiguous run found by bisection,
+    so the first k matches cost O(log n + k). Three parallel arrays keep it
+    compact: folded keys, display names (the same object when already
+    lower-case) and ids. Registrations are inserted in place, an O(n)
+    move of the arrays that takes about a millisecond at a million users;
+    users registered through other processes are picked up by a periodic
+    read of ids above the highest one indexed, less ``rescan_ids`` since a
+    lower id can commit after a higher one. Deactivations are not tracked:
+    the search filters them out, and the index is rebuilt from scratch
+    every ``reload_seconds``.
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: float,
+        rescan_ids: int = 0,
+        reload_seconds: float = float("inf"),
+    ) -> None:
+        self.refresh_seconds = refresh_seconds
+        self.rescan_ids = rescan_ids
+        self.reload_seconds = reload_seconds
+        self._keys: List[str] = []
+        self._names: List[str] = []
+        self._ids = array("q")
+        self._loaded_through = 0
+        self._checked_at: Optional[float] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _insert(self, user_id: int, username: str) -> None:
+        key = username.casefold()
+        i = bisect_right(self._keys, key)
+        self._keys.insert(i, key)
+        self._names.insert(i, key if key == username else username)
+        self._ids.insert(i, user_id)
+
+    def _load(self, rows: Iterable[Tuple[int, str]]) -> None:
+        entries = sorted((name.casefold(), name, user_id) for user_id, name in rows)
+        self._keys = [key for key, _, _ in entries]
+        # Share the string when folding did not change it
+        self._names = [key if key == name else name for key, name, _ in entries]
+        self._ids = array("q", (user_id for _, _, user_id in entries))
+
+    def _contains(self, user_id: int, username: str) -> bool:
+        key = username.casefold()
+        keys, ids = self._keys, self._ids
+        i = bisect_left(keys, key)
+        while i < len(keys) and keys[i] == key:
+            if ids[i] == user_id:
+                return True
+            i += 1
+        return False
+
+    def register(self, user_id: int, username: str) -> None:
+        """Index a user who just registered through this process."""
+        if self._checked_at is None:
+            return  # the first load will read them
+        if not self._contains(user_id, username):
+            self._insert(user_id, username)
+
+    def load_all(self, rows: Iterable[Tuple[int, str]]) -> None:
+        """Replace the contents, e.g. from a synthetic list in benchmarks."""
+        rows = list(rows)
+        self._load(rows)
+        self._loaded_through = max((user_id for user_id, _ in rows), default=0)
+        self._checked_at = self._loaded_at = time.monotonic()
+
+    def _is_current(self) -> bool:
+        return (
+            self._checked_at is not None
+            and time.monotonic() - self._checked_at < self.refresh_seconds
+        )
+
+    async def ensure_current(self) -> None:
+        if self._is_current():
+            return
+        async with self._lock:
+            if self._is_current():
+                return
+            started = time.monotonic()
+            reload = self._loaded_at is None or started - self._loaded_at >= self.reload_seconds
+            after = 0 if reload else self._loaded_through - self.rescan_ids
+            # Always the primary: a lagging replica would hold users back
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(users_after_query(after))).all()
+            active = [(row.id, row.username) for row in rows if row.is_active]
+            if reload:
+                # Sorting a large user table would stall the event loop
+                await asyncio.to_thread(self._load, active)
+                self._loaded_at = started
+                self._loaded_through = 0
+            else:
+                for user_id, username in active:
+                    self.register(user_id, username)
+            if rows:
+                self._loaded_through = max(self._loaded_through, max(row.id for row in rows))
+            self._checked_at = time.monotonic()
+
+    def matches(self, prefix: str) -> Iterator[Tuple[int, str]]:
+        """(user_id, username) of names starting with ``prefix``, any case."""
+        key = prefix.casefold()
+        keys, names, ids = self._keys, self._names, self._ids
+        i = bisect_left(keys, key)
+        while i < len(keys) and keys[i].startswith(key):
+            yield ids[i], names[i]
+            i += 1
+
+
+user_index = UsernameIndex(
+    refresh_seconds=config.USER_INDEX_REFRESH_SECONDS,
+    rescan_ids=config.USER_INDEX_RESCAN_IDS,
+    reload_seconds=config.USER_INDEX_RELOAD_SECONDS,
+)
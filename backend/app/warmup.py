@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from datetime import date as date_type, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import catalog, conditional, config, models, snapshots
+from .database import AsyncSessionLocal
+from .ranking import global_ranks
+from .routers import leaderboard, stats
+
+logger = logging.getLogger(__name__)
+
+
+def rollover_ranges(day: date_type) -> List[str]:
+    """Leaderboard ranges whose period starts on ``day``."""
+    ranges = ["daily"]
+    if day.weekday() == 0:
+        ranges.append("weekly")
+    if day.day == 1:
+        ranges.append("monthly")
+    return ranges
+
+
+def active_users_query(day: date_type, limit: int):
+    # One day's slice of the (date, user_id) index, already in user order
+    udp = models.UserDailyPoints
+    return select(udp.user_id).where(udp.date == day).order_by(udp.user_id).limit(limit)
+
+
+async def active_users(
+    db: AsyncSession, since: date_type, until: date_type, limit: int
+) -> List[int]:
+    """Up to ``limit`` users with points in since..until, latest first.
+
+    Walks the days backwards from ``until`` and stops once ``limit`` users
+    are found. Users already found may reappear on earlier days, so each
+    day reads at most ``limit`` more rows than are still wanted.
+    """
+    found: Dict[int, None] = {}
+    day = until
+    while day >= since and len(found) < limit:
+        wanted = limit - len(found)
+        rows = await db.execute(active_users_query(day, wanted + len(found)))
+        for user_id in rows.scalars():
+            if user_id not in found:
+                found[user_id] = None
+                wanted -= 1
+                if not wanted:
+                    break
+        day -= timedelta(days=1)
+    return list(found)
+
+
+def _schedule_snapshots(day: date_type) -> None:
+    # Periods that ended SNAPSHOT_GRACE_DAYS + 1 days ago are frozen from today
+    last_day = day - timedelta(days=config.SNAPSHOT_GRACE_DAYS + 1)
+    for period in snapshots.PERIODS:
+        start, end = snapshots.period_bounds(period, last_day)
+        if end == last_day:
+            snapshots.builder.schedule(period, start)
+
+
+class CacheWarmer:
+    """Fills the leaderboard and stats caches when their periods roll over.
+
+    At midnight every user's daily window moves to a new period (on Mondays
+    and the 1st the weekly and monthly ones too), so their first reads would
+    all miss at once. The warmer computes those entries for recently active
+    users instead, starting them evenly over ``spread_seconds`` with at most
+    ``concurrency`` running, so the database sees a trickle, not a burst.
+    """
+
+    def __init__(self, spread_seconds: float, concurrency: int) -> None:
+        self.spread_seconds = spread_seconds
+        self.concurrency = concurrency
+        self.runs = 0
+        self.warmed = 0
+        self.failed = 0
+        self.last_seconds = 0.0
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            now = datetime.now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            await asyncio.sleep((midnight - now).total_seconds())
+            try:
+                await self.warm(date_type.today())
+            except Exception:
+                logger.exception("cache warming failed")
+
+    async def warm(self, day: date_type, spread_seconds: Optional[float] = None) -> int:
+        """Warm the periods starting on ``day``; returns the users warmed."""
+        started = time.monotonic()
+        spread = self.spread_seconds if spread_seconds is None else spread_seconds
+        ranges = rollover_ranges(day)
+        periods = {name: leaderboard._get_range_dates(name, day) for name in ranges}
+        _schedule_snapshots(day)
+
+        since = day - timedelta(days=config.WARMUP_ACTIVE_DAYS)
+        async with AsyncSessionLocal() as db:
+            user_ids = await active_users(db, since, day, config.WARMUP_MAX_USERS)
+            for name, period in periods.items():
+                await global_ranks.get(db, name, period)
+
+        loop = asyncio.get_running_loop()
+        first_start = loop.time()
+        step = spread / max(len(user_ids), 1)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm_user(i: int, user_id: int) -> None:
+            await asyncio.sleep(max(0.0, first_start + i * step - loop.time()))
+            async with semaphore, AsyncSessionLocal() as db:
+                signature = await conditional.circle_signature(db, user_id)
+                for name, (start, end) in periods.items():
+                    await leaderboard.compute_leaderboard(
+                        db, user_id, name, start, end, signature,
+                        config.WARMUP_CACHE_TTL_SECONDS,
+                    )
+                tasks = await catalog.get(db)
+                log_version = await conditional.user_log_version(db, user_id)
+                await stats.compute_overview(
+                    db, user_id, day, stats.OVERVIEW_DAYS, tasks, log_version
+                )
+
+        results = await asyncio.gather(
+            *(warm_user(i, user_id) for i, user_id in enumerate(user_ids)),
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            logger.error(
+                "cache warming failed for %d of %d users", len(errors), len(user_ids),
+                exc_info=errors[0],
+            )
+        self.runs += 1
+        self.warmed += len(user_ids) - len(errors)
+        self.failed += len(errors)
+        self.last_seconds = time.monotonic() - started
+        return len(user_ids) - len(errors)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "runs": self.runs,
+            "warmed": self.warmed,
+            "failed": self.failed,
+            "last_seconds": self.last_seconds,
+        }
+
+
+warmer = CacheWarmer(
+    spread_seconds=config.WARMUP_SPREAD_SECONDS,
+    concurrency=config.WARMUP_CONCURRENCY,
+)
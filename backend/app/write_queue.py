@@ -0,0 +1,156 @@
+import asyncio
+from dataclasses import replace
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from . import catalog, log_writes
+from .database import AsyncSessionLocal
+from .log_writes import LogWrite, LogWriteResult, WriteOutcome
+
+_Pending = Tuple[List[LogWrite], "asyncio.Future[List[LogWriteResult]]"]
+
+
+class WriteRejected(Exception):
+    """The caller's writes could not be committed."""
+
+
+def _own_view(results: List[LogWriteResult], writes: List[LogWrite]) -> List[LogWriteResult]:
+    # write_logs reports the batch-wide winner per key; each caller should
+    # see its own last write, as if it had committed just before the next.
+    mine = {w.key: w for w in writes}
+    out: List[LogWriteResult] = []
+    for result, w in zip(results, writes):
+        own = mine[w.key]
+        if result.error is None and result.completed != own.completed:
+            result = replace(
+                result,
+                completed=own.completed,
+                points_awarded=result.task.points if own.completed else 0,
+            )
+        out.append(result)
+    return out
+
+
+class WriteQueue:
+    """Group commit for daily-log writes.
+
+    Callers hand their writes to one writer task, which commits whatever
+    arrived within ``max_delay`` seconds of the first queued write (up to
+    ``max_items`` writes) in a single transaction through write_logs. Writes
+    to the same (user, task, date) within a batch coalesce, last one wins.
+    A caller is answered only once the batch holding its writes committed,
+    so an acknowledged write is as durable as with a commit per request.
+    """
+
+    def __init__(
+        self,
+        max_items: int,
+        max_delay: float,
+        on_commit: Optional[Callable[[WriteOutcome], None]] = None,
+    ) -> None:
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.on_commit = on_commit
+        self.batches = 0
+        self.writes = 0
+        self._queue: Optional["asyncio.Queue[Optional[_Pending]]"] = None
+        self._writer: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_writer(self) -> "asyncio.Queue[Optional[_Pending]]":
+        loop = asyncio.get_running_loop()
+        if self._writer is None or self._writer.done() or self._writer.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._writer = loop.create_task(self._run(self._queue))
+        return self._queue
+
+    async def submit(self, writes: Sequence[LogWrite]) -> List[LogWriteResult]:
+        queue = self._ensure_writer()
+        future: "asyncio.Future[List[LogWriteResult]]" = asyncio.get_running_loop().create_future()
+        queue.put_nowait((list(writes), future))
+        return await future
+
+    async def close(self) -> None:
+        """Commit what is queued, then stop the writer."""
+        if self._writer is None or self._writer.done():
+            return
+        self._queue.put_nowait(None)
+        await self._writer
+
+    async def _run(self, queue: "asyncio.Queue[Optional[_Pending]]") -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await queue.get()
+            if first is None:
+                return
+            batch = [first]
+            count = len(first[0])
+            deadline = loop.time() + self.max_delay
+            stopping = False
+            while count < self.max_items:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                count += len(item[0])
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _commit(self, writes: List[LogWrite]) -> WriteOutcome:
+        async with AsyncSessionLocal() as db:
+            tasks = await catalog.get(db)
+            outcome = await db.run_sync(log_writes.write_logs, writes, tasks)
+            await db.commit()
+        return outcome
+
+    async def _flush(self, batch: List[_Pending]) -> None:
+        # Callers that went away were never acknowledged; drop their writes
+        batch = [(writes, future) for writes, future in batch if not future.done()]
+        if not batch:
+            return
+        writes = [w for item_writes, _ in batch for w in item_writes]
+        try:
+            outcome = await self._commit(writes)
+        except IntegrityError as exc:
+            if len(batch) > 1:
+                # Let one caller's bad write fail alone, not the whole batch
+                for item in batch:
+                    await self._flush([item])
+                return
+            _fail(batch, WriteRejected(str(exc)))
+            return
+        except Exception as exc:
+            _fail(batch, exc)
+            return
+
+        self.batches += 1
+        self.writes += len(writes)
+        if self.on_commit is not None:
+            self.on_commit(outcome)
+        offset = 0
+        for item_writes, future in batch:
+            results = outcome.results[offset:offset + len(item_writes)]
+            offset += len(item_writes)
+            if not future.done():
+                future.set_result(_own_view(results, item_writes))
+
+
+def _fail(batch: List[_Pending], exc: BaseException) -> None:
+    for _, future in batch:
+        if not future.done():
+            future.set_exception(exc)
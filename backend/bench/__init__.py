@@ -0,0 +1 @@
+# Load and micro benchmarks; run from backend/ as `python -m bench.<name>`
@@ -0,0 +1,135 @@
+"""Memory and latency of the friend-suggestion graph.
+
+Builds a synthetic directed friendship graph (skewed: a few popular users
+are followed by many) into a FriendGraph, then times suggestions, edge
+additions into the overlay and a compaction. --sql also times the
+two-hop self-join it replaces on an in-memory SQLite copy:
+
+    python -m bench.friend_graph --users 100000 --edges 1000000 --sql
+"""
+
+import argparse
+import asyncio
+import random
+import sqlite3
+import sys
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+from app.friend_graph import FriendGraph
+
+
+def _timed(label: str, n: int, fn: Callable[[int], object]) -> None:
+    samples = []
+    for i in range(n):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1e3
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e3
+    print(f"{label:<34} p50 {p50:>8.3f} ms   p99 {p99:>8.3f} ms")
+
+
+def _edges(users: int, edges: int, rng: random.Random) -> List[int]:
+    """Sorted (user_id << 32 | friend_id) keys, no self-edges or duplicates."""
+
+    def pick() -> int:
+        # Mostly uniform, with a Pareto tail: low ids follow and are followed
+        # far more than most, as a handful of very social users would
+        if rng.random() < 0.7:
+            return rng.randint(1, users)
+        return min(users, int(rng.paretovariate(0.8)))
+
+    packed = set()
+    while len(packed) < edges:
+        user_id, friend_id = pick(), pick()
+        if friend_id != user_id:
+            packed.add(user_id << 32 | friend_id)
+    return sorted(packed)
+
+
+async def _compact(graph: FriendGraph) -> None:
+    await graph.compact()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.friend_graph", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    parser.add_argument("--ops", type=int, default=2_000)
+    parser.add_argument("--max-friends", type=int, default=200)
+    parser.add_argument("--max-fanout", type=int, default=200)
+    parser.add_argument("--sql", action="store_true", help="also time the SQLite self-join")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    packed = _edges(args.users, args.edges, rng)
+    print(f"generated {len(packed):,} edges over {args.users:,} users "
+          f"in {time.perf_counter() - started:.1f}s")
+    mask = (1 << 32) - 1
+
+    graph = FriendGraph(refresh_seconds=3600, compact_edges=sys.maxsize)
+    tracemalloc.start()
+    started = time.perf_counter()
+    graph.load_sorted((key >> 32, key & mask) for key in packed)
+    build = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"CSR graph: built in {build:.2f}s, {memory / 2**20:.1f} MiB")
+
+    tracemalloc.start()
+    sets: dict = {}
+    for key in packed:
+        sets.setdefault(key >> 32, set()).add(key & mask)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"dict of sets, for comparison: {memory / 2**20:.1f} MiB")
+    del sets
+
+    graph._checked_at = time.monotonic()  # loaded: accept add()
+    users = [rng.randint(1, args.users) for _ in range(args.ops)]
+    by_degree = sorted(range(1, args.users + 1), key=lambda u: -len(graph.friends(u)))[:50]
+    top = len(graph.friends(by_degree[0]))
+    print(f"max out-degree {top}, mean {len(packed) / args.users:.1f}")
+
+    def suggest(user_id: int) -> object:
+        return graph.suggestions(user_id, 10, args.max_friends, args.max_fanout)
+
+    _timed("suggestions, random users", len(users), lambda i: suggest(users[i]))
+    _timed("suggestions, 50 highest degree", 50, lambda i: suggest(by_degree[i]))
+
+    adds = [(rng.randint(1, args.users), rng.randint(1, args.users)) for _ in range(50_000)]
+    _timed("add edge (overlay)", len(adds), lambda i: graph.add(*adds[i]))
+    _timed("suggestions with 50k overlay", len(users) // 4, lambda i: suggest(users[i]))
+    started = time.perf_counter()
+    overlay = graph.overlay_edges
+    asyncio.run(_compact(graph))
+    print(f"compacted {overlay:,} overlay edges in {time.perf_counter() - started:.2f}s")
+
+    if args.sql:
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE friendships (user_id INTEGER, friend_id INTEGER, "
+                     "UNIQUE (user_id, friend_id))")
+        conn.executemany("INSERT INTO friendships VALUES (?, ?)",
+                         ((key >> 32, key & mask) for key in packed))
+        query = """
+            SELECT f2.friend_id, COUNT(*) AS mutual FROM friendships f1
+            JOIN friendships f2 ON f2.user_id = f1.friend_id
+            WHERE f1.user_id = :u AND f2.friend_id != :u AND f2.friend_id NOT IN
+                (SELECT friend_id FROM friendships WHERE user_id = :u)
+            GROUP BY f2.friend_id ORDER BY mutual DESC, f2.friend_id LIMIT 10
+        """
+        sql_ops = min(len(users), 300)
+        _timed("SQLite two-hop self-join", sql_ops,
+               lambda i: conn.execute(query, {"u": users[i]}).fetchall())
+        _timed("SQLite, 50 highest degree", 50,
+               lambda i: conn.execute(query, {"u": by_degree[i]}).fetchall())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Cost of the global leaderboard's rank index.
+
+Builds a RankIndex over N users with a realistic (skewed, tie-heavy)
+points distribution, then times rank lookups, top-k pages, neighbour
+windows and incremental updates:
+
+    python -m bench.global_rank --users 2100000
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+from app.ranking import RankIndex
+
+
+def _rate(label: str, n: int, fn: Callable[[int], object]) -> None:
+    started = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {n / elapsed:>12,.0f} ops/s  {elapsed / n * 1e6:>8.1f} us/op")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.global_rank", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2_100_000)
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    # A month of 5-point steps, most users near the bottom
+    scores = {uid: 5 * int(rng.paretovariate(1.5) * 20) - 100 for uid in range(1, args.users + 1)}
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = RankIndex(scores)
+    build = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"built {len(index):,} ranked users in {build:.2f}s, {memory / 2**20:.0f} MiB")
+
+    users = list(index.scores)
+    _rate("rank_of", args.ops, lambda i: index.rank_of(users[i % len(users)]))
+    _rate("top 100", args.ops // 10, lambda i: index.entries(1, 101))
+    _rate(
+        "neighbours (+-5)",
+        args.ops,
+        lambda i: index.entries(index.position_of(users[i % len(users)]) - 5,
+                                index.position_of(users[i % len(users)]) + 6),
+    )
+    _rate("add (write delta)", args.ops,
+          lambda i: index.add(users[i % len(users)], rng.choice((-15, 10, 20))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Password hashing throughput per scheme configuration.
+
+Reports single-threaded hashes/sec and the throughput of the bounded hash
+pool for each configuration whose backend is installed:
+
+    python -m bench.hashing --seconds 2 --workers 4
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from app import hashing
+
+CONFIGS = [
+    ("pbkdf2_sha256", {"pbkdf2_rounds": 29_000}),
+    ("pbkdf2_sha256", {"pbkdf2_rounds": 100_000}),
+    ("pbkdf2_sha256", {"pbkdf2_rounds": 600_000}),
+    ("bcrypt", {"bcrypt_rounds": 10}),
+    ("bcrypt", {"bcrypt_rounds": 12}),
+    ("argon2", {"argon2_time_cost": 2, "argon2_memory_cost": 19 * 1024, "argon2_parallelism": 1}),
+    ("argon2", {"argon2_time_cost": 3, "argon2_memory_cost": 64 * 1024, "argon2_parallelism": 4}),
+]
+
+
+def _serial_rate(context, seconds: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        context.hash("correct horse battery staple")
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+async def _pool_rate(context, kind: str, workers: int, seconds: float) -> float:
+    pool = hashing.HashPool(kind=kind, workers=workers, max_pending=workers * 2)
+    count = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client() -> None:
+        nonlocal count
+        while time.perf_counter() < deadline:
+            await pool.run(context.hash, "correct horse battery staple")
+            count += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(workers * 2)))
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return count / elapsed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.hashing", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=hashing.config.HASH_POOL_WORKERS)
+    args = parser.parse_args(argv)
+
+    for scheme, params in CONFIGS:
+        label = f"{scheme} " + " ".join(f"{k.split('_', 1)[1]}={v}" for k, v in params.items())
+        if not hashing.available_schemes([scheme]):
+            print(f"{label:<58} skipped (backend unavailable)")
+            continue
+        context = hashing.build_context([scheme], **params)
+        serial = _serial_rate(context, args.seconds)
+        pooled = asyncio.run(_pool_rate(context, "thread", args.workers, args.seconds))
+        row: Dict[str, float] = {"serial": serial, "pool": pooled}
+        print(
+            f"{label:<58} {row['serial']:>9.1f} hashes/s serial  "
+            f"{row['pool']:>9.1f} hashes/s with {args.workers} threads"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Fan-out cost of the live leaderboard hub.
+
+Creates N idle subscribers (each with its own consumer task, like an open
+SSE connection) in circles of --circle users, then publishes point changes
+for random users and measures delivered messages/sec and memory per
+connection. The DB read for totals and the HTTP framing are excluded; this
+isolates the hub itself:
+
+    python -m bench.leaderboard_stream --connections 10000 --events 20000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import List, Optional
+
+from app.leaderboard_hub import LeaderboardHub
+
+
+async def run(connections: int, circle: int, users: int, events: int, seed: int) -> None:
+    rng = random.Random(seed)
+    hub = LeaderboardHub()
+    start = date.today() - timedelta(days=date.today().weekday())
+    period = (start, start + timedelta(days=6))
+    delivered = 0
+
+    async def consume(sub) -> None:
+        nonlocal delivered
+        while True:
+            await sub.queue.get()
+            delivered += 1
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    subs = []
+    consumers: List[asyncio.Task] = []
+    for owner in range(connections):
+        owner_id = owner % users
+        members = {owner_id, *(rng.randrange(users) for _ in range(circle))}
+        sub = hub.subscribe(owner_id, "weekly", period, members)
+        subs.append(sub)
+        consumers.append(asyncio.create_task(consume(sub)))
+    await asyncio.sleep(0)  # let every consumer park on its queue
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    sent = 0
+    for i in range(events):
+        sent += hub.broadcast(rng.randrange(users), {period: i})
+        if i % 100 == 0:
+            await asyncio.sleep(0)
+    while delivered < sent and time.perf_counter() - started < 60:
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    for task in consumers:
+        task.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+
+    print(f"connections          {connections}")
+    print(f"memory/connection    {(after - before) / connections / 1024:.2f} KiB")
+    print(f"events published     {events}")
+    print(f"messages delivered   {delivered} (resyncs {sum(s.needs_resync for s in subs)})")
+    print(f"messages/sec         {delivered / elapsed:,.0f}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.leaderboard_stream", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--circle", type=int, default=20, help="friends per subscriber")
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.connections, args.circle, args.users, args.events, args.seed))
+
+
+if __name__ == "__main__":
+    main()
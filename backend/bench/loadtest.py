@@ -0,0 +1,164 @@
+"""Closed-loop HTTP load test for the API.
+
+Each target is either ``inprocess`` (the app served through an ASGI transport,
+using whatever DATABASE_URL is set, ``sqlite:///./bench.db`` by default) or the
+base URL of a running server. To compare the old sync handlers with the async
+ones, start one uvicorn per checkout and pass both URLs:
+
+    python -m bench.loadtest --target http://127.0.0.1:8001 --target http://127.0.0.1:8002
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    raise SystemExit("bench requires httpx: pip install -r requirements-bench.txt")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def make_client(target: str) -> "httpx.AsyncClient":
+    if target == "inprocess":
+        os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+        from app.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30)
+    return httpx.AsyncClient(base_url=target, timeout=30)
+
+
+async def _ensure_started(target: str) -> None:
+    if target == "inprocess":
+        from app.init_data import init_db
+
+        init_db()
+
+
+async def _login(client: "httpx.AsyncClient", username: str) -> Dict[str, str]:
+    password = "bench-password"
+    await client.post("/api/auth/register", json={"username": username, "password": password})
+    res = await client.post(
+        "/api/auth/login", data={"username": username, "password": password}
+    )
+    res.raise_for_status()
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+async def setup_users(client: "httpx.AsyncClient", count: int, prefix: str) -> List[Dict[str, str]]:
+    headers = [await _login(client, f"{prefix}{i}") for i in range(count)]
+    # Everyone befriends the next few users so leaderboards have real circles
+    for i, h in enumerate(headers):
+        for offset in (1, 2, 3):
+            friend = f"{prefix}{(i + offset) % count}"
+            await client.post("/api/friends", json={"friend_username": friend}, headers=h)
+    return headers
+
+
+async def run_target(
+    target: str,
+    concurrency: int,
+    duration: float,
+    users: int,
+    write_ratio: float,
+) -> Dict[str, object]:
+    await _ensure_started(target)
+    async with make_client(target) as client:
+        prefix = f"bench{int(time.time())}_"
+        headers = await setup_users(client, users, prefix)
+        tasks = (await client.get("/api/tasks", headers=headers[0])).json()
+        task_ids = [t["id"] for t in tasks]
+
+        reads = [
+            ("GET", "/api/tasks/daily", None),
+            ("GET", "/api/leaderboard?range=weekly", None),
+            ("GET", "/api/stats/summary?range=monthly", None),
+        ]
+        latencies: List[float] = []
+        errors = 0
+        deadline = time.perf_counter() + duration
+
+        async def worker(seed: int) -> None:
+            nonlocal errors
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                h = rng.choice(headers)
+                if task_ids and rng.random() < write_ratio:
+                    day = date.today() - timedelta(days=rng.randrange(28))
+                    method, path = "POST", "/api/daily-logs"
+                    body = {
+                        "task_id": rng.choice(task_ids),
+                        "date": day.isoformat(),
+                        "completed": rng.random() < 0.7,
+                    }
+                else:
+                    method, path, body = rng.choice(reads)
+                started = time.perf_counter()
+                try:
+                    res = await client.request(method, path, json=body, headers=h)
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if res.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.loadtest", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", help="'inprocess' or a base URL")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per target")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for target in args.target or ["inprocess"]:
+        result = asyncio.run(
+            run_target(target, args.concurrency, args.duration, args.users, args.write_ratio)
+        )
+        results.append(result)
+        print(
+            f"{result['target']:<28} {result['rps']:>9} req/s  "
+            f"p50 {result['p50_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  "
+            f"errors {result['errors']}"
+        )
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
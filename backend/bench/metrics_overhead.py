@@ -0,0 +1,158 @@
+"""Cost of the /metrics instrumentation.
+
+Two measurements:
+
+* component cost: the middleware around a no-op ASGI app and the SQL hooks
+  around ``SELECT 1``, each timed with and without instrumentation. These are
+  small and stable, and give the added time per request as
+  ``middleware + queries_per_request * hook``.
+* end to end: the same routes served by an app built with and one without
+  instrumentation, alternating small batches so machine drift hits both
+  equally. On a busy or single-core box this is noisier than the cost being
+  measured, so the component estimate is the one to trust.
+
+    python -m bench.metrics_overhead --rounds 40 --batch 25
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List, Optional
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    raise SystemExit("bench requires httpx: pip install -r requirements-bench.txt")
+
+from sqlalchemy import text  # noqa: E402
+
+from app import metrics  # noqa: E402
+from app.database import async_engine, engine  # noqa: E402
+from app.init_data import init_db  # noqa: E402
+from app.main import create_app  # noqa: E402
+
+ROUTES = ["/api/tasks/daily", "/api/leaderboard?range=weekly", "/api/stats/summary"]
+USERNAME = "metrics_bench"
+PASSWORD = "bench-password"
+
+
+def _instrument(enabled: bool) -> None:
+    for db_engine in (engine, async_engine.sync_engine):
+        metrics.uninstrument_engine(db_engine)
+        if enabled:
+            metrics.instrument_engine(db_engine)
+
+
+async def _middleware_cost(n: int) -> float:
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    wrapped = metrics.MetricsMiddleware(app, registry=metrics.Registry())
+    samples: Dict[bool, List[float]] = {False: [], True: []}
+    for _ in range(5):
+        for enabled, target in ((False, app), (True, wrapped)):
+            started = time.perf_counter()
+            for _ in range(n):
+                await target({"type": "http", "method": "GET", "path": "/"}, receive, send)
+            samples[enabled].append((time.perf_counter() - started) / n)
+    return statistics.median(samples[True]) - statistics.median(samples[False])
+
+
+def _hook_cost(n: int) -> float:
+    samples: Dict[bool, List[float]] = {False: [], True: []}
+    stmt = text("SELECT 1")
+    token = metrics._current_request.set(metrics.RequestStats())
+    try:
+        with engine.connect() as conn:
+            for _ in range(5):
+                for enabled in (False, True):
+                    _instrument(enabled)
+                    started = time.perf_counter()
+                    for _ in range(n):
+                        conn.execute(stmt)
+                    samples[enabled].append((time.perf_counter() - started) / n)
+    finally:
+        metrics._current_request.reset(token)
+    return statistics.median(samples[True]) - statistics.median(samples[False])
+
+
+async def _headers(client: "httpx.AsyncClient") -> Dict[str, str]:
+    await client.post("/api/auth/register", json={"username": USERNAME, "password": PASSWORD})
+    res = await client.post("/api/auth/login", data={"username": USERNAME, "password": PASSWORD})
+    res.raise_for_status()
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+async def _batch(client: "httpx.AsyncClient", path: str, headers: Dict[str, str], n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        res = await client.get(path, headers=headers)
+        res.raise_for_status()
+    return (time.perf_counter() - started) / n
+
+
+async def run(rounds: int, batch: int) -> None:
+    init_db()
+    middleware_s = await _middleware_cost(20_000)
+    hook_s = _hook_cost(5_000)
+    print(f"middleware   {middleware_s * 1e6:6.2f} us/request")
+    print(f"SQL hooks    {hook_s * 1e6:6.2f} us/query\n")
+
+    apps = {False: create_app(metrics_enabled=False), True: create_app(metrics_enabled=True)}
+    clients = {
+        enabled: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+        for enabled, app in apps.items()
+    }
+    headers = await _headers(clients[False])
+
+    print(f"{'route':<32} {'request':>9} {'q/req':>6} {'estimated':>10} {'measured':>9}")
+    for path in ROUTES:
+        samples: Dict[bool, List[float]] = {False: [], True: []}
+        for enabled in (False, True):  # warm both
+            _instrument(enabled)
+            await _batch(clients[enabled], path, headers, batch)
+        route_key = ("GET", path.split("?", 1)[0])
+        before = metrics.registry.request_queries.get(route_key)
+        queries_before = (before.total, before.count) if before else (0.0, 0)
+        for i in range(rounds):
+            order = (False, True) if i % 2 == 0 else (True, False)
+            for enabled in order:
+                _instrument(enabled)
+                samples[enabled].append(await _batch(clients[enabled], path, headers, batch))
+        hist = metrics.registry.request_queries[route_key]
+        per_request = (hist.total - queries_before[0]) / (hist.count - queries_before[1])
+        off = statistics.median(samples[False])
+        on = statistics.median(samples[True])
+        estimated = (middleware_s + per_request * hook_s) / off * 100
+        print(
+            f"{path:<32} {off * 1e3:>7.2f}ms {per_request:>6.1f} {estimated:>+9.2f}% "
+            f"{(on - off) / off * 100:>+8.2f}%"
+        )
+
+    for client in clients.values():
+        await client.aclose()
+    _instrument(True)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.metrics_overhead", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--batch", type=int, default=25, help="requests per alternating batch")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.rounds, args.batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""Per-route benchmark of the whole API, in process.
+
+Drives every route registered by ``app.main.create_app()`` through an ASGI
+transport at a fixed concurrency, one route at a time, against a database
+populated by ``python -m bench.seed``. Reports req/s, p50/p95/p99 latency
+and SQL statements per request, and writes the results as JSON so two runs
+can be diffed:
+
+    python -m bench.seed --users 10000 --days 90 --reset
+    python -m bench.routes --concurrency 16 --duration 5 --json before.json
+    # ...change something...
+    python -m bench.routes --concurrency 16 --duration 5 --json after.json --baseline before.json
+
+Routes without a scenario are listed as skipped, so a new endpoint shows up
+here until it is given one.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    raise SystemExit("bench requires httpx: pip install -r requirements-bench.txt")
+
+from fastapi.routing import APIRoute  # noqa: E402
+from sqlalchemy import event, func, select  # noqa: E402
+
+from app import catalog, models  # noqa: E402
+from app.database import SessionLocal, async_engine, engine  # noqa: E402
+from app.init_data import init_db  # noqa: E402
+from app.main import create_app  # noqa: E402
+
+from .loadtest import percentile  # noqa: E402
+from .seed import PASSWORD, USERNAME_PREFIX  # noqa: E402
+
+
+@dataclass
+class Context:
+    usernames: List[str]
+    headers: List[Dict[str, str]]
+    task_ids: List[int]
+    counter: "itertools.count[int]"
+
+
+# A scenario turns (rng, context) into request arguments for httpx.
+Request = Tuple[str, Dict[str, object]]
+
+
+@dataclass
+class Scenario:
+    build: Callable[[random.Random, Context], Request]
+    ok: Tuple[int, ...] = (200,)
+
+
+def _authed(rng: random.Random, ctx: Context, path: str, **kwargs) -> Request:
+    return path, dict(headers=rng.choice(ctx.headers), **kwargs)
+
+
+def _recent_day(rng: random.Random) -> str:
+    return (date.today() - timedelta(days=rng.randrange(28))).isoformat()
+
+
+def _log_item(rng: random.Random, ctx: Context) -> dict:
+    return {
+        "task_id": rng.choice(ctx.task_ids),
+        "date": _recent_day(rng),
+        "completed": rng.random() < 0.7,
+    }
+
+
+SCENARIOS: Dict[Tuple[str, str], Scenario] = {
+    ("GET", "/"): Scenario(lambda rng, ctx: ("/", {})),
+    ("POST", "/api/auth/register"): Scenario(
+        lambda rng, ctx: (
+            "/api/auth/register",
+            {
+                "json": {
+                    "username": f"bench_{os.getpid()}_{next(ctx.counter)}",
+                    "password": PASSWORD,
+                }
+            },
+        ),
+    ),
+    ("POST", "/api/auth/login"): Scenario(
+        lambda rng, ctx: (
+            "/api/auth/login",
+            {"data": {"username": rng.choice(ctx.usernames), "password": PASSWORD}},
+        ),
+    ),
+    ("GET", "/api/auth/me"): Scenario(lambda rng, ctx: _authed(rng, ctx, "/api/auth/me")),
+    ("GET", "/api/tasks"): Scenario(lambda rng, ctx: _authed(rng, ctx, "/api/tasks")),
+    ("GET", "/api/tasks/daily"): Scenario(
+        lambda rng, ctx: _authed(
+            rng, ctx, "/api/tasks/daily", params={"for_date": _recent_day(rng)}
+        )
+    ),
+    ("POST", "/api/daily-logs"): Scenario(
+        lambda rng, ctx: _authed(rng, ctx, "/api/daily-logs", json=_log_item(rng, ctx))
+    ),
+    ("POST", "/api/daily-logs/batch"): Scenario(
+        lambda rng, ctx: _authed(
+            rng,
+            ctx,
+            "/api/daily-logs/batch",
+            json={"items": [_log_item(rng, ctx) for _ in range(7)]},
+        )
+    ),
+    ("GET", "/api/daily-logs/export"): Scenario(
+        lambda rng, ctx: _authed(
+            rng,
+            ctx,
+            "/api/daily-logs/export",
+            params={
+                "format": "ndjson",
+                "from": (date.today() - timedelta(days=30)).isoformat(),
+            },
+        )
+    ),
+    ("GET", "/api/friends"): Scenario(lambda rng, ctx: _authed(rng, ctx, "/api/friends")),
+    ("POST", "/api/friends"): Scenario(
+        lambda rng, ctx: _authed(
+            rng, ctx, "/api/friends", json={"friend_username": rng.choice(ctx.usernames)}
+        ),
+        # Random pairs sometimes already exist or are the caller
+        ok=(200, 400),
+    ),
+    ("GET", "/api/leaderboard"): Scenario(
+        lambda rng, ctx: _authed(
+            rng, ctx, "/api/leaderboard", params={"range": rng.choice(["weekly", "monthly"])}
+        )
+    ),
+    ("GET", "/api/leaderboard/global"): Scenario(
+        lambda rng, ctx: _authed(
+            rng,
+            ctx,
+            "/api/leaderboard/global",
+            params={"range": rng.choice(["weekly", "monthly"])},
+        )
+    ),
+    ("GET", "/api/stats/summary"): Scenario(
+        lambda rng, ctx: _authed(
+            rng, ctx, "/api/stats/summary", params={"range": rng.choice(["weekly", "monthly"])}
+        )
+    ),
+    ("GET", "/api/stats/overview"): Scenario(
+        lambda rng, ctx: _authed(rng, ctx, "/api/stats/overview")
+    ),
+    ("GET", "/api/stats/streaks"): Scenario(
+        lambda rng, ctx: _authed(rng, ctx, "/api/stats/streaks")
+    ),
+}
+
+SKIPPED: Dict[Tuple[str, str], str] = {
+    ("POST", "/api/auth/logout-all"): "revokes the tokens the other scenarios use",
+    ("GET", "/api/leaderboard/stream"): "long-lived stream; see bench.leaderboard_stream",
+}
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.count = 0
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+
+async def _login(client: "httpx.AsyncClient", username: str) -> Dict[str, str]:
+    res = await client.post("/api/auth/login", data={"username": username, "password": PASSWORD})
+    res.raise_for_status()
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+async def run_route(
+    client: "httpx.AsyncClient",
+    method: str,
+    scenario: Scenario,
+    ctx: Context,
+    counter: QueryCounter,
+    concurrency: int,
+    duration: float,
+    seed: int,
+) -> Dict[str, object]:
+    latencies: List[float] = []
+    errors = 0
+    queries_before = counter.count
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_seed: int) -> None:
+        nonlocal errors
+        rng = random.Random(worker_seed)
+        while time.perf_counter() < deadline:
+            path, kwargs = scenario.build(rng, ctx)
+            started = time.perf_counter()
+            try:
+                res = await client.request(method, path, **kwargs)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if res.status_code not in scenario.ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(seed * 1000 + i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    requests = len(latencies)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round((counter.count - queries_before) / requests, 2)
+        if requests
+        else 0.0,
+    }
+
+
+def _dataset() -> Dict[str, int]:
+    with SessionLocal() as db:
+        return {
+            "users": db.execute(select(func.count()).select_from(models.User)).scalar(),
+            "friendships": db.execute(
+                select(func.count()).select_from(models.Friendship)
+            ).scalar(),
+            "daily_task_logs": db.execute(
+                select(func.count()).select_from(models.DailyTaskLog)
+            ).scalar(),
+        }
+
+
+async def run(
+    concurrency: int, duration: float, logins: int, only: List[str], seed: int
+) -> Dict[str, object]:
+    init_db()
+    with SessionLocal() as db:
+        usernames = list(
+            db.execute(
+                select(models.User.username)
+                .where(models.User.username.like(f"{USERNAME_PREFIX}%"))
+                .order_by(models.User.id)
+            ).scalars()
+        )
+    if not usernames:
+        raise SystemExit("no seeded users; run python -m bench.seed first")
+
+    app = create_app()
+    counter = QueryCounter()
+    rng = random.Random(seed)
+    results: Dict[str, object] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        sample = rng.sample(usernames, min(logins, len(usernames)))
+        ctx = Context(
+            usernames=usernames,
+            headers=[await _login(client, name) for name in sample],
+            task_ids=[t.id for t in catalog.current().active],
+            counter=itertools.count(),
+        )
+        for route in app.routes:
+            if not isinstance(route, APIRoute):
+                continue
+            for method in sorted(route.methods):
+                key = f"{method} {route.path}"
+                if only and not any(part in key for part in only):
+                    continue
+                scenario = SCENARIOS.get((method, route.path))
+                if scenario is None:
+                    reason = SKIPPED.get((method, route.path), "no scenario")
+                    results[key] = {"skipped": reason}
+                    print(f"{key:<36} skipped: {reason}")
+                    continue
+                row = await run_route(
+                    client, method, scenario, ctx, counter, concurrency, duration, seed
+                )
+                results[key] = row
+                print(
+                    f"{key:<36} {row['rps']:>8} req/s  p50 {row['p50_ms']:>7} "
+                    f"p95 {row['p95_ms']:>7} p99 {row['p99_ms']:>7} ms  "
+                    f"{row['queries_per_request']:>5} q/req  errors {row['errors']}"
+                )
+
+    return {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "database": engine.url.render_as_string(hide_password=True),
+            "python": platform.python_version(),
+            "concurrency": concurrency,
+            "duration_s": duration,
+            "logins": len(ctx.headers),
+            "seed": seed,
+            "dataset": _dataset(),
+        },
+        "routes": results,
+    }
+
+
+def _print_comparison(baseline: Dict[str, object], current: Dict[str, object]) -> None:
+    print("\nvs baseline (req/s change, p95 change)")
+    for key, row in current["routes"].items():
+        old = baseline["routes"].get(key)
+        if "skipped" in row or not old or "skipped" in old or not old["rps"]:
+            continue
+        rps = (row["rps"] - old["rps"]) / old["rps"] * 100
+        p95 = row["p95_ms"] - old["p95_ms"]
+        print(f"{key:<36} {rps:+7.1f}%  {p95:+8.2f} ms")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.routes", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per route")
+    parser.add_argument("--logins", type=int, default=32, help="seeded users to log in as")
+    parser.add_argument("--route", action="append", default=[],
+                        help="only routes containing this text (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare against")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args.concurrency, args.duration, args.logins, args.route, args.seed))
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(result, fh, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            _print_comparison(json.load(fh), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Cost of the username prefix index behind /api/users/search.
+
+Loads N synthetic usernames into a UsernameIndex, then times top-k prefix
+lookups for random 1-4 character prefixes and in-place registrations.
+--sql also times the query it replaces, a LIMITed LIKE 'prefix%' over an
+indexed in-memory SQLite table of the same names:
+
+    python -m bench.user_search --users 1000000 --sql
+"""
+
+import argparse
+import random
+import sqlite3
+import string
+import time
+import tracemalloc
+from itertools import islice
+from typing import Callable, List, Optional
+
+from app.user_index import UsernameIndex
+
+_SYLLABLES = ["ka", "ri", "mo", "lu", "sa", "te", "no", "vi", "ja", "po", "el", "an", "zu", "ek"]
+
+
+def _usernames(n: int, rng: random.Random) -> List[str]:
+    names = set()
+    while len(names) < n:
+        name = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if rng.random() < 0.6:
+            name += str(rng.randrange(10_000))
+        if rng.random() < 0.1:
+            name = name.capitalize()
+        names.add(name)
+    return list(names)
+
+
+def _timed(label: str, n: int, fn: Callable[[int], object]) -> None:
+    samples = []
+    for i in range(n):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1e6
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6
+    print(f"{label:<30} p50 {p50:>9.1f} us   p99 {p99:>9.1f} us")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.user_search", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--sql", action="store_true", help="also time LIKE on SQLite")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    names = _usernames(args.users, rng)
+    rows = list(enumerate(names, start=1))
+
+    index = UsernameIndex(refresh_seconds=3600)
+    tracemalloc.start()
+    started = time.perf_counter()
+    index.load_all(rows)
+    build = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"indexed {len(index):,} usernames in {build:.2f}s, {memory / 2**20:.0f} MiB")
+
+    letters = string.ascii_lowercase
+    prefixes = [
+        "".join(rng.choice(letters) for _ in range(rng.randint(1, 4))) for _ in range(args.ops)
+    ]
+    # Prefixes of real names, so most lookups return a full page
+    prefixes += [rng.choice(names)[: rng.randint(1, 4)] for _ in range(args.ops)]
+    rng.shuffle(prefixes)
+    _timed(f"top {args.limit} by prefix", len(prefixes),
+           lambda i: list(islice(index.matches(prefixes[i]), args.limit)))
+
+    new_names = [f"{name}x{i}" for i, name in enumerate(rng.sample(names, min(args.ops, 2_000)))]
+    next_id = args.users + 1
+    _timed("register (insert)", len(new_names),
+           lambda i: index.register(next_id + i, new_names[i]))
+
+    if args.sql:
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE)")
+        conn.executemany("INSERT INTO users VALUES (?, ?)", rows)
+        sql_ops = min(len(prefixes), 500)
+        _timed(f"SQLite LIKE, top {args.limit}", sql_ops, lambda i: conn.execute(
+            "SELECT id, username FROM users WHERE username LIKE ? ORDER BY username LIMIT ?",
+            (prefixes[i] + "%", args.limit),
+        ).fetchall())
+
+
+if __name__ == "__main__":
+    main()
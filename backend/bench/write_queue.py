@@ -0,0 +1,174 @@
+"""Per-request commit vs group commit for daily-log writes.
+
+Drives ``POST /api/daily-logs`` in process at a fixed concurrency, once with
+a commit per request and once per ``--delay-ms`` value through the write
+queue (WRITE_QUEUE_ENABLED), against a database from ``python -m bench.seed``.
+Reports writes/s, p50/p99 latency and the mean number of requests per
+committed batch:
+
+    python -m bench.seed --users 10000 --days 30 --reset
+    python -m bench.write_queue --concurrency 16 --duration 5 --delay-ms 0 --delay-ms 2
+
+--verify checks the points rollup and the streak tables against the logs
+afterwards, which reads every log row.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    raise SystemExit("bench requires httpx: pip install -r requirements-bench.txt")
+
+from sqlalchemy import select  # noqa: E402
+
+from app import catalog, config, log_writes, models, rollup, streaks  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.init_data import init_db  # noqa: E402
+from app.main import create_app  # noqa: E402
+from app.routers import logs as logs_router  # noqa: E402
+from app.write_queue import WriteQueue  # noqa: E402
+
+from .loadtest import percentile  # noqa: E402
+from .seed import PASSWORD, USERNAME_PREFIX  # noqa: E402
+
+
+async def _login(client: "httpx.AsyncClient", username: str) -> Dict[str, str]:
+    res = await client.post("/api/auth/login", data={"username": username, "password": PASSWORD})
+    res.raise_for_status()
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+async def run_mode(
+    client: "httpx.AsyncClient",
+    headers: List[Dict[str, str]],
+    task_ids: List[int],
+    concurrency: int,
+    duration: float,
+    seed: int,
+) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_seed: int) -> None:
+        nonlocal errors
+        rng = random.Random(worker_seed)
+        while time.perf_counter() < deadline:
+            body = {
+                "task_id": rng.choice(task_ids),
+                "date": (date.today() - timedelta(days=rng.randrange(7))).isoformat(),
+                "completed": rng.random() < 0.7,
+            }
+            started = time.perf_counter()
+            try:
+                res = await client.post(
+                    "/api/daily-logs", json=body, headers=rng.choice(headers)
+                )
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if res.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(seed * 1000 + i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "writes": len(latencies),
+        "errors": errors,
+        "wps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+async def run(
+    concurrency: int, duration: float, delays_ms: List[float], logins: int, seed: int
+) -> None:
+    init_db()
+    with SessionLocal() as db:
+        usernames = list(
+            db.execute(
+                select(models.User.username)
+                .where(models.User.username.like(f"{USERNAME_PREFIX}%"))
+                .order_by(models.User.id)
+            ).scalars()
+        )
+    if not usernames:
+        raise SystemExit("no seeded users; run python -m bench.seed first")
+
+    app = create_app()
+    # Lock timeouts surface as 500s and are counted, not raised
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        rng = random.Random(seed)
+        headers = [await _login(client, name) for name in rng.sample(usernames, logins)]
+        task_ids = [t.id for t in catalog.current().active]
+
+        modes: List[Optional[float]] = [None] + list(delays_ms)
+        print(f"{'mode':<22} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'req/batch':>10} errors")
+        for delay_ms in modes:
+            queue = None
+            if delay_ms is not None:
+                queue = WriteQueue(
+                    max_items=config.WRITE_QUEUE_MAX_ITEMS,
+                    max_delay=delay_ms / 1000,
+                    on_commit=log_writes.after_commit,
+                )
+            logs_router.write_queue = queue
+            # Warm up so the first mode does not pay for cold caches
+            await run_mode(client, headers, task_ids, concurrency, min(1.0, duration), seed)
+            if queue is not None:
+                queue.batches = 0
+            row = await run_mode(client, headers, task_ids, concurrency, duration, seed)
+            label = "commit per request"
+            per_batch = "1.0"
+            if queue is not None:
+                await queue.close()
+                label = f"queue, {delay_ms:g} ms window"
+                per_batch = f"{row['writes'] / queue.batches:.1f}" if queue.batches else "-"
+            print(
+                f"{label:<22} {row['wps']:>9.1f} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+                f"{per_batch:>10} {row['errors']}"
+            )
+        logs_router.write_queue = None
+
+
+def _verify() -> None:
+    rollup_drift = sum(1 for _ in rollup.find_drift())
+    streak_drift = sum(1 for _ in streaks.find_drift())
+    print(f"\nrollup drift {rollup_drift}, streak drift {streak_drift}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.write_queue", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per mode")
+    parser.add_argument("--delay-ms", type=float, action="append", dest="delays_ms",
+                        help="queue flush window to try (repeatable; default 0 and 2)")
+    parser.add_argument("--logins", type=int, default=200, help="seeded users writing")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verify", action="store_true")
+    args = parser.parse_args(argv)
+
+    delays = args.delays_ms or [0.0, 2.0]
+    asyncio.run(run(args.concurrency, args.duration, delays, args.logins, args.seed))
+    if args.verify:
+        _verify()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+import pytest
+
+# Settings are read when app.config is imported, so point the app at a
+# throwaway database before any test module imports it: a fresh SQLite file,
+# or an empty ephemeral PostgreSQL given as TEST_DATABASE_URL, e.g.
+# postgresql://postgres@localhost:5432/productivity_test
+_DATA_DIR = tempfile.mkdtemp(prefix="productivity-tests-")
+os.environ["DATABASE_URL"] = os.getenv(
+    "TEST_DATABASE_URL", f"sqlite:///{_DATA_DIR}/primary.db"
+)
+os.environ.setdefault("ADMIN_USERNAMES", "admin")
+os.environ.setdefault("WARMUP_ENABLED", "0")
+
+import httpx  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+def data_dir() -> str:
+    return _DATA_DIR
+
+
+@asynccontextmanager
+async def api_client() -> AsyncIterator[httpx.AsyncClient]:
+    """The app with its startup and shutdown hooks run, over ASGI."""
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+
+
+async def register(client: httpx.AsyncClient, prefix: str = "user") -> Dict[str, str]:
+    """Register a fresh user and return their auth headers."""
+    username = f"{prefix}{uuid.uuid4().hex[:8]}"
+    response = await client.post(
+        "/api/auth/register", json={"username": username, "password": "pw"}
+    )
+    assert response.status_code == 200, response.text
+    response = await client.post(
+        "/api/auth/login", data={"username": username, "password": "pw"}
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+import pytest
+
+from app import auth
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_stale_checks_share_one_revocation_reload(monkeypatch):
+    revocations = auth.RevocationCache(refresh_seconds=30)
+    reloads = []
+
+    async def refresh():
+        reloads.append(time.monotonic())
+        await asyncio.sleep(0.05)
+        revocations._loaded_at = time.monotonic()
+
+    monkeypatch.setattr(revocations, "refresh", refresh)
+
+    # Nothing loaded yet: everyone waits for the one reload
+    await asyncio.gather(*(revocations.ensure_fresh() for _ in range(50)))
+    assert len(reloads) == 1
+    assert not revocations.is_stale()
+
+    # Stale snapshot: one request reloads, the rest go on without waiting
+    revocations._loaded_at = time.monotonic() - 60
+    started = time.monotonic()
+    first = asyncio.ensure_future(revocations.ensure_fresh())
+    await asyncio.sleep(0)
+    await asyncio.gather(*(revocations.ensure_fresh() for _ in range(50)))
+    assert time.monotonic() - started < 0.05
+    await first
+    assert len(reloads) == 2
@@ -0,0 +1,73 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import log_writes
+from app.routers import logs
+
+from .conftest import api_client, register
+
+pytestmark = pytest.mark.anyio
+
+
+class _LaggingClock:
+    """A writer whose timestamp was taken well before it committed."""
+
+    @staticmethod
+    def utcnow() -> datetime:
+        return datetime.utcnow() - timedelta(hours=1)
+
+
+async def test_incremental_export_includes_writes_committed_after_watermark(monkeypatch):
+    async with api_client() as client:
+        headers = await register(client, "exporter")
+        tasks = (await client.get("/api/tasks", headers=headers)).json()
+        today = date.today().isoformat()
+
+        async def log(task_id: int) -> None:
+            response = await client.post(
+                "/api/daily-logs",
+                json={"task_id": task_id, "date": today, "completed": True},
+                headers=headers,
+            )
+            assert response.status_code == 200, response.text
+
+        async def export(since=None):
+            params = {"format": "ndjson"}
+            if since is not None:
+                params["since"] = since
+            response = await client.get("/api/daily-logs/export", params=params, headers=headers)
+            assert response.status_code == 200, response.text
+            return response.text.splitlines(), response.headers["X-Export-Watermark"]
+
+        await log(tasks[0]["id"])
+        rows, watermark = await export()
+        assert len(rows) == 1
+
+        monkeypatch.setattr(log_writes, "datetime", _LaggingClock)
+        await log(tasks[1]["id"])
+        rows, next_watermark = await export(watermark)
+        assert len(rows) == 1 and f'"task_id": {tasks[1]["id"]}' in rows[0]
+
+        rows, _ = await export(next_watermark)
+        assert rows == []
+
+        # Nothing new: the client's watermark comes back unchanged
+        response = await client.get(
+            "/api/daily-logs/export",
+            params={"format": "csv", "since": next_watermark},
+            headers=headers,
+        )
+        assert response.headers["X-Export-Watermark"] == next_watermark
+        assert response.text.splitlines() == [",".join(logs.EXPORT_COLUMNS)]
+
+
+async def test_export_without_logs_is_empty():
+    async with api_client() as client:
+        headers = await register(client, "idle")
+        response = await client.get(
+            "/api/daily-logs/export", params={"format": "ndjson"}, headers=headers
+        )
+        assert response.status_code == 200, response.text
+        assert response.text == ""
+        assert "X-Export-Watermark" not in response.headers
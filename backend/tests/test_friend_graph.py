@@ -0,0 +1,52 @@
+import pytest
+
+from app import models
+from app.database import SessionLocal
+from app.friend_graph import FriendGraph
+
+from .conftest import api_client, register
+
+pytestmark = pytest.mark.anyio
+
+
+def _commit_edge(user_id: int, friend_id: int, edge_id: int) -> None:
+    with SessionLocal() as db:
+        db.add(models.Friendship(id=edge_id, user_id=user_id, friend_id=friend_id))
+        db.commit()
+
+
+async def _user_id(client, headers) -> int:
+    return (await client.get("/api/auth/me", headers=headers)).json()["id"]
+
+
+async def test_edge_committed_below_the_watermark_is_picked_up():
+    async with api_client() as client:
+        a, b, c = [await _user_id(client, await register(client, "g")) for _ in range(3)]
+        graph = FriendGraph(refresh_seconds=0, compact_edges=1000, rescan_ids=100)
+        await graph.ensure_current()
+
+        # Id 5001 commits first; 5000 was taken earlier but commits after it
+        _commit_edge(a, b, 5001)
+        await graph.ensure_current()
+        assert graph.has_edge(a, b)
+        _commit_edge(a, c, 5000)
+        await graph.ensure_current()
+        assert graph.has_edge(a, c)
+
+
+async def test_periodic_reload_catches_edges_outside_the_rescan_window():
+    async with api_client() as client:
+        a, b, c = [await _user_id(client, await register(client, "r")) for _ in range(3)]
+        graph = FriendGraph(
+            refresh_seconds=0, compact_edges=1000, rescan_ids=0, reload_seconds=3600
+        )
+        await graph.ensure_current()
+        _commit_edge(b, c, 7001)
+        await graph.ensure_current()
+        _commit_edge(b, a, 6000)
+        await graph.ensure_current()
+        assert not graph.has_edge(b, a)
+
+        graph.reload_seconds = 0
+        await graph.ensure_current()
+        assert graph.has_edge(b, a) and graph.has_edge(b, c)
@@ -0,0 +1,83 @@
+from datetime import date
+
+import pytest
+from fastapi.responses import StreamingResponse
+from starlette.requests import Request
+
+from app import catalog, log_writes
+from app.database import SessionLocal
+from app.routers import leaderboard
+
+from .conftest import api_client, register
+
+pytestmark = pytest.mark.anyio
+
+
+def _write_elsewhere(user_id: int, task_id: int) -> None:
+    """Commit a log the way another worker would: no local cache invalidation."""
+    with SessionLocal() as db:
+        tasks = catalog.load(db)
+        log_writes.write_logs(
+            db, [log_writes.LogWrite(user_id, task_id, date.today(), True)], tasks
+        )
+        db.commit()
+
+
+async def test_leaderboard_reflects_writes_through_other_workers():
+    async with api_client() as client:
+        headers = await register(client, "leader")
+        me = (await client.get("/api/auth/me", headers=headers)).json()
+        task = (await client.get("/api/tasks", headers=headers)).json()[0]
+
+        first = await client.get("/api/leaderboard?range=daily", headers=headers)
+        assert first.json()[0]["total_points"] == 0
+        _write_elsewhere(me["id"], task["id"])
+
+        second = await client.get(
+            "/api/leaderboard?range=daily",
+            headers={**headers, "If-None-Match": first.headers["ETag"]},
+        )
+        assert second.status_code == 200
+        assert second.headers["ETag"] != first.headers["ETag"]
+        assert second.json()[0]["total_points"] == task["points"]
+
+
+async def test_stream_opens_with_a_ticket_not_an_access_token():
+    async with api_client() as client:
+        headers = await register(client, "streamer")
+        token = headers["Authorization"][len("Bearer "):]
+
+        for query in (f"token={token}", f"ticket={token}"):
+            response = await client.get(f"/api/leaderboard/stream?{query}")
+            assert response.status_code == 401, query
+
+        response = await client.post("/api/leaderboard/stream-ticket", headers=headers)
+        assert response.status_code == 200, response.text
+        ticket = response.json()["ticket"]
+        # Single purpose: a ticket is no bearer token
+        response = await client.get(
+            "/api/leaderboard", headers={"Authorization": f"Bearer {ticket}"}
+        )
+        assert response.status_code == 401
+
+        # Called directly: over ASGI the endless stream would never finish
+        request = Request({"type": "http", "method": "GET", "headers": []})
+        stream = await leaderboard.stream_leaderboard(request, range="weekly", ticket=ticket)
+        assert isinstance(stream, StreamingResponse)
+        await stream.body_iterator.aclose()
+
+
+async def test_cache_stats_are_admin_only():
+    async with api_client() as client:
+        headers = await register(client, "player")
+        response = await client.get("/api/leaderboard/cache-stats", headers=headers)
+        assert response.status_code == 403
+
+        credentials = {"username": "admin", "password": "pw"}
+        await client.post("/api/auth/register", json=credentials)
+        token = (await client.post("/api/auth/login", data=credentials)).json()["access_token"]
+        response = await client.get(
+            "/api/leaderboard/cache-stats", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200
+        assert "hits" in response.json()
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from app.leaderboard_hub import LeaderboardHub
+
+pytestmark = pytest.mark.anyio
+
+DAY = date(2026, 3, 4)
+PERIOD = (DAY, DAY)
+
+
+async def test_slow_read_does_not_overwrite_newer_total(monkeypatch):
+    hub = LeaderboardHub()
+    sub = hub.subscribe(1, "daily", PERIOD, [1, 2])
+    committed = {"total": 10}
+    reads = []
+
+    async def totals(user_id, periods):
+        # Read the committed total now, answer later; the first read is slow
+        seen = committed["total"]
+        reads.append(seen)
+        await asyncio.sleep(0.05 if len(reads) == 1 else 0)
+        return {period: seen for period in periods}
+
+    monkeypatch.setattr(hub, "_totals", totals)
+
+    hub.notify_points({2: {DAY}})
+    await asyncio.sleep(0)  # the first read is in flight
+    committed["total"] = 20
+    hub.notify_points({2: {DAY}})
+    committed["total"] = 30
+    hub.notify_points({2: {DAY}})
+    while hub._tasks:
+        await asyncio.gather(*hub._tasks)
+
+    messages = []
+    while not sub.queue.empty():
+        messages.append(sub.queue.get_nowait()["total_points"])
+    # Changes during the slow read are coalesced into one later read
+    assert reads == [10, 30]
+    assert messages == [10, 30]
+
+
+async def test_new_member_is_announced_with_username(monkeypatch):
+    hub = LeaderboardHub()
+    sub = hub.subscribe(1, "daily", PERIOD, [1])
+
+    async def totals(user_id, periods):
+        return {period: 5 for period in periods}
+
+    monkeypatch.setattr(hub, "_totals", totals)
+    hub.notify_friend_added(1, 3, "carol")
+    hub.notify_points({3: {DAY}})
+    while hub._tasks:
+        await asyncio.gather(*hub._tasks)
+
+    first = sub.queue.get_nowait()
+    assert first == {"type": "delta", "user_id": 3, "total_points": 5, "username": "carol"}
+    assert sub.queue.empty()
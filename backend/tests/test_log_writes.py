@@ -0,0 +1,31 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from app import rollup
+
+from .conftest import api_client, register
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_toggles_keep_rollup_in_sync():
+    async with api_client() as client:
+        headers = await register(client, "racer")
+        task_id = (await client.get("/api/tasks", headers=headers)).json()[0]["id"]
+        day = date.today().isoformat()
+        for _ in range(20):
+            responses = await asyncio.gather(
+                *(
+                    client.post(
+                        "/api/daily-logs",
+                        json={"task_id": task_id, "date": day, "completed": i % 2 == 0},
+                        headers=headers,
+                    )
+                    for i in range(8)
+                )
+            )
+            assert all(r.status_code == 200 for r in responses), [r.text for r in responses]
+
+    assert list(rollup.find_drift()) == []
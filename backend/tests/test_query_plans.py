@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from app import migrations, query_plans
+from app.database import Base, engine
+
+from .conftest import api_client
+
+pytestmark = pytest.mark.anyio
+
+# The first release's schema, as found in existing app.db files
+_FIRST_RELEASE = [
+    """CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL UNIQUE,
+        email VARCHAR(255) UNIQUE, password_hash VARCHAR(255) NOT NULL,
+        is_active BOOLEAN NOT NULL, created_at DATETIME NOT NULL)""",
+    """CREATE TABLE tasks (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL,
+        code VARCHAR(50) NOT NULL UNIQUE, description VARCHAR(255),
+        points INTEGER NOT NULL, is_active BOOLEAN NOT NULL, created_at DATETIME NOT NULL)""",
+    """CREATE TABLE daily_task_logs (id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        task_id INTEGER NOT NULL REFERENCES tasks (id), date DATE NOT NULL,
+        completed BOOLEAN NOT NULL, points_awarded INTEGER NOT NULL,
+        created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL,
+        CONSTRAINT uix_user_task_date UNIQUE (user_id, task_id, date))""",
+    "CREATE INDEX ix_daily_task_logs_user_id ON daily_task_logs (user_id)",
+    "CREATE INDEX ix_daily_task_logs_task_id ON daily_task_logs (task_id)",
+    "CREATE INDEX ix_daily_task_logs_date ON daily_task_logs (date)",
+    """CREATE TABLE friendships (id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        friend_id INTEGER NOT NULL REFERENCES users (id), created_at DATETIME NOT NULL,
+        CONSTRAINT uix_user_friend UNIQUE (user_id, friend_id))""",
+    "CREATE INDEX ix_friendships_user_id ON friendships (user_id)",
+    "CREATE INDEX ix_friendships_friend_id ON friendships (friend_id)",
+]
+
+
+def test_hot_queries_use_indexes(capsys):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    failures = query_plans.check(engine)
+    assert failures == 0, capsys.readouterr().out
+
+
+def test_upgraded_first_release_database_uses_indexes(capsys, data_dir):
+    old = create_engine(f"sqlite:///{data_dir}/first-release.db")
+    with old.begin() as conn:
+        for ddl in _FIRST_RELEASE:
+            conn.exec_driver_sql(ddl)
+
+    Base.metadata.create_all(bind=old)
+    migrations.upgrade(old)
+
+    inspector = inspect(old)
+    indexes = {i["name"] for i in inspector.get_indexes("daily_task_logs")}
+    assert "ix_daily_task_logs_user_date_points" in indexes
+    assert "ix_daily_task_logs_user_id" not in indexes
+    assert "log_version" in {c["name"] for c in inspector.get_columns("daily_task_logs")}
+    failures = query_plans.check(old)
+    assert failures == 0, capsys.readouterr().out
+    old.dispose()
+
+
+async def test_configured_database_uses_indexes(capsys):
+    # The test database, SQLite or TEST_DATABASE_URL's PostgreSQL, after startup
+    async with api_client():
+        failures = query_plans.check(engine)
+    assert failures == 0, capsys.readouterr().out
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+
+from app import ranking
+
+
+def _naive_order(scores):
+    ranked = sorted((-s, uid) for uid, s in scores.items() if s > 0)
+    return [(uid, -neg) for neg, uid in ranked]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rank_index_matches_sorted_order(monkeypatch, seed):
+    # Tiny chunks so tie buckets split and empty out many times
+    monkeypatch.setattr(ranking, "_CHUNK", 4)
+    rng = random.Random(seed)
+    # Few distinct scores: every bucket holds many tied users
+    scores = {uid: rng.choice((0, 5, 10, 15)) for uid in range(1, 200)}
+    index = ranking.RankIndex(scores)
+
+    for step in range(600):
+        uid = rng.randrange(1, 260)
+        delta = rng.choice((-10, -5, 5, 10))
+        index.add(uid, delta)
+        scores[uid] = max(0, scores.get(uid, 0) + delta)
+        if step % 20:
+            continue
+
+        order = _naive_order(scores)
+        assert len(index) == len(order)
+        rows = index.entries(1, len(order) + 1)
+        assert [(uid, score) for _, uid, score in rows] == order
+        for position, (uid, score) in enumerate(order, 1):
+            assert index.position_of(uid) == position
+            assert index.rank_of(uid) == 1 + sum(1 for _, s in order if s > score)
+        start = rng.randrange(1, len(order) + 1)
+        window = index.entries(start, start + 7)
+        assert [(uid, score) for _, uid, score in window] == order[start - 1:start + 6]
@@ -0,0 +1,143 @@
+import os
+import sqlite3
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from app import auth, config, replicas
+from app.database import async_engine, create_async_db_engine, engine
+
+from .conftest import api_client, register
+
+pytestmark = [
+    pytest.mark.anyio,
+    # The stand-in replicas are copies of the SQLite primary file
+    pytest.mark.skipif(engine.dialect.name != "sqlite", reason="needs a SQLite primary"),
+]
+
+
+def _copy_primary(path: str) -> None:
+    """A replica frozen at the primary's current state."""
+    source = sqlite3.connect(engine.url.database)
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+class _PrimaryStatements:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args) -> None:
+        self.count += 1
+
+
+async def test_reads_go_to_replica_unless_caller_just_wrote(data_dir, monkeypatch):
+    replica_path = os.path.join(data_dir, "replica.db")
+    async with api_client() as client:
+        headers = await register(client, "reader")
+        task = (await client.get("/api/tasks", headers=headers)).json()[0]
+        _copy_primary(replica_path)
+
+        replica_set = replicas.ReplicaSet(
+            [
+                create_async_db_engine("sqlite:////nonexistent/dir/replica.db"),
+                create_async_db_engine(f"sqlite:///{replica_path}"),
+            ],
+            retry_seconds=60,
+        )
+        monkeypatch.setattr(replicas, "replicas", replica_set)
+        monkeypatch.setattr(replicas.recent_writers, "window", 60)
+
+        async def daily_points() -> int:
+            response = await client.get("/api/stats/summary?range=daily", headers=headers)
+            assert response.status_code == 200, response.text
+            return response.json()["total_points"]
+
+        response = await client.post(
+            "/api/daily-logs",
+            json={"task_id": task["id"], "date": date.today().isoformat(), "completed": True},
+            headers=headers,
+        )
+        assert response.status_code == 200, response.text
+
+        # Just wrote: read from the primary, which has the log
+        assert await daily_points() == task["points"]
+        assert replica_set.reads["primary"] == 1
+
+        # Once the write is old, the lagging replica serves the read, and
+        # the caller is looked up there too: no statement hits the primary
+        replicas.recent_writers._until.clear()
+        primary = _PrimaryStatements()
+        event.listen(async_engine.sync_engine, "before_cursor_execute", primary)
+        try:
+            assert await daily_points() == 0
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", primary)
+        assert primary.count == 0
+        assert replica_set.reads["replica1"] == 1
+        # The unreachable replica was skipped, not fatal
+        assert replica_set.failures == 1
+        assert replica_set.healthy() == {"replica0": 0, "replica1": 1}
+
+    for replica_engine in replica_set.engines:
+        await replica_engine.dispose()
+
+
+def _lagging_replica(data_dir: str, monkeypatch) -> replicas.ReplicaSet:
+    replica_path = os.path.join(data_dir, "lagging.db")
+    if os.path.exists(replica_path):
+        os.remove(replica_path)
+    _copy_primary(replica_path)
+    replica_set = replicas.ReplicaSet(
+        [create_async_db_engine(f"sqlite:///{replica_path}")], retry_seconds=60
+    )
+    monkeypatch.setattr(replicas, "replicas", replica_set)
+    monkeypatch.setattr(replicas.recent_writers, "window", 60)
+    return replica_set
+
+
+async def test_new_user_reads_own_account_despite_replica_lag(data_dir, monkeypatch):
+    async with api_client() as client:
+        # The replica is copied before the user exists
+        replica_set = _lagging_replica(data_dir, monkeypatch)
+        headers = await register(client, "newcomer")
+
+        response = await client.get("/api/tasks", headers=headers)
+        assert response.status_code == 200, response.text
+        assert replica_set.reads["primary"] == 1
+
+        # Without the read-your-writes window the replica does not know them
+        replicas.recent_writers._until.clear()
+        response = await client.get("/api/tasks", headers=headers)
+        assert response.status_code == 401
+        assert replica_set.reads["replica0"] == 1
+
+    await replica_set.engines[0].dispose()
+
+
+async def test_logout_all_survives_revocation_refresh_on_lagging_replica(
+    data_dir, monkeypatch
+):
+    monkeypatch.setattr(config, "AUTH_STATELESS", True)
+    async with api_client() as client:
+        headers = await register(client, "leaver")
+        # The replica still holds the user's token version from before logout
+        replica_set = _lagging_replica(data_dir, monkeypatch)
+
+        response = await client.post("/api/auth/logout-all", headers=headers)
+        assert response.status_code == 204, response.text
+
+        # Read from the replica with a stale revocation snapshot: the refresh
+        # must not bring the revoked token back
+        replicas.recent_writers._until.clear()
+        monkeypatch.setattr(auth.revocation_cache, "_loaded_at", None)
+        response = await client.get("/api/tasks", headers=headers)
+        assert response.status_code == 401
+        assert replica_set.reads["replica0"] == 1
+
+    await replica_set.engines[0].dispose()
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from app import catalog, models, reprice, rollup
+from app.database import SessionLocal
+
+from .conftest import api_client, register
+
+pytestmark = pytest.mark.anyio
+
+DAYS = 30
+
+
+async def test_reprice_alongside_user_writes_keeps_rollup_in_sync():
+    async with api_client() as client:
+        users = [await register(client, "repricer") for _ in range(4)]
+        task_id = (await client.get("/api/tasks", headers=users[0])).json()[1]["id"]
+        days = [(date.today() - timedelta(days=i)).isoformat() for i in range(DAYS)]
+        for headers in users:
+            items = [{"task_id": task_id, "date": day, "completed": True} for day in days]
+            response = await client.post(
+                "/api/daily-logs/batch", json={"items": items}, headers=headers
+            )
+            assert response.status_code == 200, response.text
+
+        with SessionLocal() as db:
+            task = db.get(models.Task, task_id)
+            job_id = reprice.start(db, task, task.points + 5, None).id
+            db.commit()
+        catalog.invalidate()
+
+        async def run_job():
+            while True:
+                chunk = await asyncio.to_thread(reprice.run_chunk, job_id, 10)
+                if chunk is None or chunk.done:
+                    return
+
+        async def toggle(headers):
+            for i, day in enumerate(days):
+                response = await client.post(
+                    "/api/daily-logs",
+                    json={"task_id": task_id, "date": day, "completed": i % 2 == 1},
+                    headers=headers,
+                )
+                assert response.status_code == 200, response.text
+
+        await asyncio.gather(run_job(), *(toggle(headers) for headers in users))
+
+    with SessionLocal() as db:
+        assert db.get(models.RepriceJob, job_id).status == "done"
+    assert list(rollup.find_drift()) == []
@@ -0,0 +1,99 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from app import streaks
+
+from .conftest import api_client, register
+
+pytestmark = pytest.mark.anyio
+
+START = date(2026, 1, 1)
+
+
+def _random_days(rng: random.Random, span: int = 60):
+    return {START + timedelta(days=i) for i in range(span) if rng.random() < 0.6}
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_run_helpers_match_day_by_day_walk(seed):
+    rng = random.Random(seed)
+    days = _random_days(rng)
+    assert streaks.runs_from_days(sorted(days)) == streaks.runs_day_by_day(days)
+
+    runs, completed = [], set()
+    for _ in range(200):
+        day = START + timedelta(days=rng.randrange(60))
+        done = rng.random() < 0.6
+        runs = streaks.toggle(runs, day, done)
+        (completed.add if done else completed.discard)(day)
+        assert runs == streaks.runs_day_by_day(completed)
+
+
+async def test_incremental_streaks_and_rebuild_match_day_by_day_walk():
+    rng = random.Random(7)
+    async with api_client() as client:
+        headers = await register(client, "streaker")
+        task_ids = [t["id"] for t in (await client.get("/api/tasks", headers=headers)).json()][:3]
+        today = date.today()
+        for _ in range(150):
+            response = await client.post(
+                "/api/daily-logs",
+                json={
+                    "task_id": rng.choice(task_ids),
+                    "date": (today - timedelta(days=rng.randrange(40))).isoformat(),
+                    "completed": rng.random() < 0.7,
+                },
+                headers=headers,
+            )
+            assert response.status_code == 200, response.text
+
+    assert list(streaks.find_drift()) == []
+    streaks.rebuild()
+    assert list(streaks.find_drift()) == []
+
+
+def _count_streaks(days, today):
+    """Current and longest streak by counting day by day."""
+    longest = run = 0
+    previous = None
+    for day in sorted(days):
+        run = run + 1 if previous == day - timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    current = 0
+    anchor = today if today in days else today - timedelta(days=1)
+    while anchor - timedelta(days=current) in days:
+        current += 1
+    return current, longest
+
+
+async def test_streaks_endpoint_matches_day_counts_after_back_dated_edits():
+    rng = random.Random(11)
+    today = date.today()
+    async with api_client() as client:
+        headers = await register(client, "badger")
+        task_ids = [t["id"] for t in (await client.get("/api/tasks", headers=headers)).json()][:2]
+        completed = {task_id: set() for task_id in task_ids}
+        for _ in range(200):
+            task_id = rng.choice(task_ids)
+            # Mostly recent days, so edits split and merge the current run
+            day = today - timedelta(days=rng.randrange(15))
+            done = rng.random() < 0.75
+            response = await client.post(
+                "/api/daily-logs",
+                json={"task_id": task_id, "date": day.isoformat(), "completed": done},
+                headers=headers,
+            )
+            assert response.status_code == 200, response.text
+            (completed[task_id].add if done else completed[task_id].discard)(day)
+
+            if rng.random() < 0.2:
+                body = (await client.get("/api/stats/streaks", headers=headers)).json()
+                by_task = {t["task_id"]: t for t in body["tasks"]}
+                for tid, days in completed.items():
+                    streak = by_task[tid]
+                    assert (streak["current"], streak["longest"]) == _count_streaks(days, today)
+                overall = _count_streaks(set().union(*completed.values()), today)
+                assert (body["overall"]["current"], body["overall"]["longest"]) == overall
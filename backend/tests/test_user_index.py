@@ -0,0 +1,55 @@
+import uuid
+
+import pytest
+from sqlalchemy import update
+
+from app import models
+from app.database import SessionLocal
+from app.user_index import UsernameIndex
+
+from .conftest import api_client, register
+
+pytestmark = pytest.mark.anyio
+
+
+def _commit_user(user_id: int, username: str) -> None:
+    with SessionLocal() as db:
+        db.add(models.User(id=user_id, username=username, password_hash="x"))
+        db.commit()
+
+
+async def test_user_committed_below_the_watermark_is_indexed():
+    async with api_client():
+        index = UsernameIndex(refresh_seconds=0, rescan_ids=100)
+        await index.ensure_current()
+        prefix = f"late{uuid.uuid4().hex[:6]}"
+
+        # Id 9001 commits first; 9000 was taken earlier but commits after it
+        _commit_user(9001, f"{prefix}b")
+        await index.ensure_current()
+        _commit_user(9000, f"{prefix}a")
+        await index.ensure_current()
+        assert list(index.matches(prefix)) == [(9000, f"{prefix}a"), (9001, f"{prefix}b")]
+
+
+async def test_deactivated_user_is_not_searchable():
+    async with api_client() as client:
+        headers = await register(client, "seeker")
+        target = f"gone{uuid.uuid4().hex[:6]}"
+        response = await client.post(
+            "/api/auth/register", json={"username": target, "password": "pw"}
+        )
+        target_id = response.json()["id"]
+
+        async def found() -> bool:
+            response = await client.get(f"/api/users/search?prefix={target}", headers=headers)
+            assert response.status_code == 200, response.text
+            return target_id in [u["id"] for u in response.json()]
+
+        assert await found()
+        with SessionLocal() as db:
+            db.execute(
+                update(models.User).where(models.User.id == target_id).values(is_active=False)
+            )
+            db.commit()
+        assert not await found()
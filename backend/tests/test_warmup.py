@@ -0,0 +1,43 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from app import models, warmup
+from app.database import AsyncSessionLocal, SessionLocal
+
+from .conftest import api_client
+
+pytestmark = pytest.mark.anyio
+
+# Far from the dates other tests write
+UNTIL = date(2031, 6, 30)
+SINCE = UNTIL - timedelta(days=7)
+
+
+def _naive(rows, limit):
+    last = {}
+    for user_id, day in rows:
+        if SINCE <= day <= UNTIL:
+            last[user_id] = max(day, last.get(user_id, day))
+    return sorted(last, key=lambda uid: (-last[uid].toordinal(), uid))[:limit]
+
+
+async def test_active_users_match_a_full_scan():
+    rng = random.Random(3)
+    rows = {
+        (rng.randrange(100_000, 100_400), UNTIL - timedelta(days=rng.randrange(12)))
+        for _ in range(1500)
+    }
+    async with api_client():
+        with SessionLocal() as db:
+            db.execute(
+                insert(models.UserDailyPoints),
+                [{"user_id": u, "date": d, "points": 5, "completed_count": 1} for u, d in rows],
+            )
+            db.commit()
+
+        async with AsyncSessionLocal() as db:
+            for limit in (1, 7, 50, 200, 1000):
+                assert await warmup.active_users(db, SINCE, UNTIL, limit) == _naive(rows, limit)
@@ -21,5 +21,6 @@ api.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+export { API_BASE_URL };
 export default api;
 
@@ -1,8 +1,11 @@
 import React, { useEffect, useState } from "react";
-import api from "../api.js";
+import api, { API_BASE_URL } from "../api.js";
 
 const RANGES = ["daily", "weekly", "monthly"];
 
+const sortEntries = (list) =>
+  [...list].sort((a, b) => b.total_points - a.total_points);
+
 export default function LeaderboardPage() {
   const [range, setRange] = useState("weekly");
   const [entries, setEntries] = useState([]);
@@ -38,8 +41,80 @@ export default function LeaderboardPage() {
   };
 
   useEffect(() => {
-    loadLeaderboard(range);
     loadFriends();
+
+    // Live updates over Server-Sent Events; fall back to a one-off fetch
+    // where EventSource is unavailable or the stream fails.
+    const token = localStorage.getItem("token");
+    if (typeof EventSource === "undefined" || !token) {
+      loadLeaderboard(range);
+      return undefined;
+    }
+
+    setLoading(true);
+    setError("");
+    // EventSource cannot send headers; open the stream with a short-lived
+    // ticket rather than putting the access token in the URL.
+    let source = null;
+    let cancelled = false;
+
+    const openStream = async () => {
+      let ticket;
+      try {
+        const res = await api.post("/api/leaderboard/stream-ticket");
+        ticket = res.data.ticket;
+      } catch (err) {
+        console.error(err);
+        if (!cancelled) loadLeaderboard(range);
+        return;
+      }
+      if (cancelled) return;
+      const url =
+        `${API_BASE_URL}/api/leaderboard/stream?range=${encodeURIComponent(range)}` +
+        `&ticket=${encodeURIComponent(ticket)}`;
+      source = new EventSource(url);
+
+      source.addEventListener("snapshot", (event) => {
+        const data = JSON.parse(event.data);
+        setEntries(data.entries);
+        setLoading(false);
+      });
+      source.addEventListener("delta", (event) => {
+        const delta = JSON.parse(event.data);
+        setEntries((prev) => {
+          const existing = prev.find((e) => e.user_id === delta.user_id);
+          if (existing) {
+            return sortEntries(
+              prev.map((e) =>
+                e.user_id === delta.user_id
+                  ? { ...e, total_points: delta.total_points }
+                  : e
+              )
+            );
+          }
+          if (!delta.username) return prev;
+          return sortEntries([
+            ...prev,
+            {
+              user_id: delta.user_id,
+              username: delta.username,
+              total_points: delta.total_points,
+            },
+          ]);
+        });
+      });
+      source.onerror = () => {
+        source.close();
+        loadLeaderboard(range);
+      };
+    };
+
+    openStream();
+
+    return () => {
+      cancelled = true;
+      if (source) source.close();
+    };
   }, [range]);
 
   const handleAddFriend = async (e) => {